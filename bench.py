@@ -0,0 +1,466 @@
+"""Offline benchmarks for the ingest, query and broadcast hot paths.
+
+    python bench.py --out bench.json
+    python bench.py --save-baseline bench_baseline.json
+    python bench.py --baseline bench_baseline.json --tolerance 0.2
+    python bench.py --only query --sizes 10k,1m,10m --targets backend
+
+Everything runs in a scratch directory against a fresh sensor_data.db, with
+no hardware and no network: serial frames go through a local pty, endpoints
+through Flask test clients and fan-out through SocketIO test clients.
+
+Results are one flat JSON object of metrics, named by suffix: *_per_sec is
+better higher, *_ms, *_us and *_bytes better lower. With --baseline every
+metric is compared against a stored run and the exit status is 1 if any got
+worse by more than --tolerance.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import queue
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from frame_parser import ENCODERS, FrameParser
+from reading_store import DeviceStores, ReadingStore
+from running_stats import RunningStats
+from sensor_app import create_app
+from sensor_db import init_db, save_readings
+from serial_reader import SerialReader
+from simulator import PtyOutput, VirtualDevice
+
+BENCHMARKS = ("query", "fanout", "parse", "insert", "memory")
+# Apps under test, built with sensor_app.create_app; none has devices, the benchmarks feed them directly
+TARGETS = {
+    "backend": {"STORAGE": "sqlite"},
+    "mock": {"STORAGE": "memory"},
+    "columnar": {"STORAGE": "columnar"},
+}
+SUFFIXES = {"_per_sec": 1, "_ms": -1, "_us": -1, "_bytes": -1}  # metric suffix -> +1 higher is better, -1 lower
+WINDOW = 23 * 3600  # Generated readings are spread over this many seconds up to now
+EXPORT_REPEAT = 3  # /export/csv at 10M rows takes a while; time it fewer times than the rest
+FANOUT_CLIENTS = (1, 10, 100)
+FANOUT_BATCH = 20  # Readings per flushed frame
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1m' -> 1000000"""
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def size_label(n):
+    for scale, suffix in ((1_000_000, "m"), (1_000, "k")):
+        if n >= scale and n % scale == 0:
+            return f"{n // scale}{suffix}"
+    return str(n)
+
+
+def generate_readings(n, start, span, devices=1, seed=1):
+    """n backend-shaped reading dicts from seeded pico devices, spread evenly over [start, start + span).
+
+    Readings are not run through the anomaly engine (that would dominate the
+    cost of filling 10M rows); anomaly is a simple CO_IN cut-off instead.
+    """
+    sims = [VirtualDevice(f"bench-{i + 1}", "pico", vehicle="bench", seed=seed) for i in range(devices)]
+    step = span / max(n, 1)
+    for i in range(n):
+        sim = sims[i % devices]
+        r = sim.reading()
+        ts = start + i * step
+        anomaly = int(r["co_in"] > 150)
+        r.update({
+            "timestamp": datetime.fromtimestamp(ts).isoformat(),
+            "ts_ms": int(ts * 1000),
+            "anomaly": anomaly,
+            "predicted_efficiency": r["efficiency"],
+            "anomaly_score": 0.0,
+            "recommendation": "High CO levels detected" if anomaly else "System operating normally",
+            "device_id": sim.device_id,
+            "vehicle": sim.vehicle,
+        })
+        yield r
+
+
+def take(items, n):
+    return [item for _, item in zip(range(n), items)]
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def timed(fn, repeat, setup=None):
+    """Milliseconds per call of fn() over `repeat` calls; setup() runs untimed before each"""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def latency(prefix, samples):
+    return {
+        f"{prefix}.p50_ms": round(percentile(samples, 0.5), 3),
+        f"{prefix}.p95_ms": round(percentile(samples, 0.95), 3),
+    }
+
+
+def get(client, url):
+    """GET through a Flask test client, reading the whole (possibly streamed) body"""
+    response = client.get(url)
+    try:
+        body = response.get_data()
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} -> {response.status_code}: {body[:200]!r}")
+        return body
+    finally:
+        response.close()
+
+
+# Benchmarks ------------------------------------------------------------------
+
+def bench_query(apps, sizes, targets, repeat):
+    """Cold (cache invalidated) latency of the read endpoints as the data grows"""
+    results = {}
+    now = time.time()
+    start = now - WINDOW
+    hour = f"from={now - 3600:.0f}&to={now:.0f}&points=300"
+    day = f"from={now - 86400:.0f}&to={now:.0f}&points=300"
+    endpoints = {
+        "stats_daily": "/stats/daily",
+        "history": "/history",
+        "history_1h": f"/history?{hour}",
+        "history_24h": f"/history?{day}",
+        "export_csv": "/export/csv",
+    }
+
+    for target in targets:
+        server = apps[target].extensions["sensor"]
+        client = apps[target].test_client()
+        if server.storage.name == "sqlite":
+            # Rows go straight to SQLite; the in-memory tail stays empty, so every endpoint reads the database
+            target_sizes = sizes
+            rows = generate_readings(max(sizes), start, WINDOW)
+            server.storage.open()
+            conn = sqlite3.connect(server.config["DB_PATH"])
+        elif server.storage.name == "columnar":
+            # Straight into the column files, bypassing the in-memory tail like the SQLite target
+            target_sizes = sizes
+            rows = generate_readings(max(sizes), start, WINDOW)
+            server.storage.open()
+        else:
+            # Memory storage only keeps STORE_CAPACITY readings, so larger sizes would measure the same store
+            target_sizes = sorted({min(n, server.config["STORE_CAPACITY"]) for n in sizes})
+            rows = generate_readings(max(target_sizes), start, WINDOW, devices=2)
+
+        filled = 0
+        for n in target_sizes:
+            print(f"⏱ {target}: filling to {n:,} readings...")
+            while filled < n:
+                batch = take(rows, min(50_000, n - filled))
+                if server.storage.name == "sqlite":
+                    with conn:
+                        save_readings(conn, batch)
+                elif server.storage.name == "columnar":
+                    for r in batch:
+                        server.storage.store.append(r)
+                else:
+                    for r in batch:
+                        server.storage.append(r)
+                filled += len(batch)
+
+            for name, url in endpoints.items():
+                runs = EXPORT_REPEAT if name == "export_csv" else repeat
+                samples = timed(lambda: get(client, url), runs, setup=server.response_cache.bump)
+                results.update(latency(f"query.{target}.{size_label(n)}.{name}", samples))
+            # Served from the response cache: what every poller after the first one pays
+            get(client, "/stats/daily")
+            samples = timed(lambda: get(client, "/stats/daily"), repeat)
+            results.update(latency(f"query.{target}.{size_label(n)}.stats_daily_cached", samples))
+
+        if server.storage.name == "sqlite":
+            conn.close()
+    return results
+
+
+def bench_fanout(app, repeat):
+    """Cost of one coalesced sensor_frame flush as connected dashboards are added"""
+    results = {}
+    server = app.extensions["sensor"]
+    socketio, broadcaster = server.socketio, server.broadcaster
+    batch = take(generate_readings(FANOUT_BATCH, time.time() - FANOUT_BATCH, FANOUT_BATCH), FANOUT_BATCH)
+
+    for wire in ("json", "binary"):
+        clients = []
+        p50 = {}
+        for count in FANOUT_CLIENTS:
+            while len(clients) < count:
+                clients.append(socketio.test_client(app, query_string=f"wire={wire}"))
+
+            def publish():
+                for client in clients:
+                    client.get_received()
+                for r in batch:
+                    broadcaster.publish(r)
+
+            samples = timed(broadcaster.flush, repeat, setup=publish)
+            results.update(latency(f"fanout.{wire}.c{count}.flush", samples))
+            p50[count] = percentile(samples, 0.5)
+        lo, hi = FANOUT_CLIENTS[0], FANOUT_CLIENTS[-1]
+        results[f"fanout.{wire}.per_client_us"] = round((p50[hi] - p50[lo]) / (hi - lo) * 1000, 3)
+        for client in clients:
+            client.disconnect()
+    return results
+
+
+def bench_parse(app, lines):
+    """Serial frames per second through a pty, parser throughput per wire format, and process_frame() throughput"""
+    from devices import Device
+
+    results = {}
+    sim = VirtualDevice("bench-pty", "pico", seed=1)
+    payload = [sim.pico_line().encode() for _ in range(lines)]
+
+    # Framing on the I/O thread + JSON decode on the worker, fed by a writer on the pty's other end
+    pty = PtyOutput()
+    master, port = pty.port("bench-pty")
+    handled = []
+    done = threading.Event()
+
+    def handle(frame):
+        json.loads(frame)
+        handled.append(1)
+        if len(handled) + reader.lines.dropped >= lines:
+            done.set()
+
+    reader = SerialReader(port, 115200, handle, max_queue=lines)
+    reader.start()
+    while not reader.connected:
+        time.sleep(0.01)
+    started = time.perf_counter()
+    for i in range(0, lines, 100):
+        os.write(master, b"".join(payload[i:i + 100]))
+    done.wait(timeout=120)
+    elapsed = time.perf_counter() - started
+    reader.stop()
+    os.close(master)
+    results["parse.pty_frames_per_sec"] = round(reader.frames / elapsed, 1)
+    results["parse.pty_dropped"] = reader.lines.dropped
+
+    readings = [sim.reading() for _ in range(lines)]
+    for fmt, encode in ENCODERS.items():
+        frames = [encode(r) for r in readings]
+        parser = FrameParser()
+        started = time.perf_counter()
+        for frame in frames:
+            parser.parse(frame)
+        results[f"parse.frame_{fmt}_per_sec"] = round(lines / (time.perf_counter() - started), 1)
+
+    # The backend's per-frame work: decode, score, spool (or queue) for the writer, append to the store, publish.
+    # The (unstarted) writer's spool or queue is emptied between chunks, outside the timing, so nothing is dropped.
+    server = app.extensions["sensor"]
+    writer = server.storage.writer
+    if writer.spool is not None:
+        writer.spool.open(0)
+    device = Device("bench-parse", source="simulated", vehicle="bench")
+    chunk = writer.queue.maxsize // 2
+    elapsed = 0.0
+    for i in range(0, lines, chunk):
+        started = time.perf_counter()
+        for frame in payload[i:i + chunk]:
+            server.process_frame(device, frame)
+        elapsed += time.perf_counter() - started
+        if writer.spool is not None:
+            writer.spool.commit(writer.spool.appended)
+        with contextlib.suppress(queue.Empty):
+            while True:
+                writer.queue.get_nowait()
+    results["parse.process_frame_per_sec"] = round(lines / elapsed, 1)
+    if writer.spool is not None:
+        writer.spool.close()
+    return results
+
+
+def bench_insert(workdir, lines, batch_rows):
+    """SQLite rows per second, one transaction per reading vs one per batch"""
+    results = {}
+    rows = take(generate_readings(lines, time.time() - WINDOW, WINDOW), lines)
+    per_row = min(lines, 2_000)  # A commit per row is slow enough that fewer rows tell the story
+
+    for mode in ("per_row", "batched"):
+        path = os.path.join(workdir, f"insert_{mode}.db")
+        conn = sqlite3.connect(path)
+        init_db(conn)
+        started = time.perf_counter()
+        if mode == "per_row":
+            for r in rows[:per_row]:
+                with conn:
+                    save_readings(conn, [r])
+            count = per_row
+        else:
+            for i in range(0, lines, batch_rows):
+                with conn:
+                    save_readings(conn, rows[i:i + batch_rows])
+            count = lines
+        results[f"insert.{mode}_rows_per_sec"] = round(count / (time.perf_counter() - started), 1)
+        conn.close()
+    return results
+
+
+def bench_memory(capacity):
+    """Traced memory of the in-memory reading stores as readings keep arriving, up to twice their capacity"""
+    results = {}
+    stores = {
+        "mock_store": lambda: ReadingStore(capacity, stats=RunningStats(health_window=10)),
+        "device_stores": lambda: DeviceStores(capacity),
+    }
+    checkpoints = {"quarter": capacity // 4, "full": capacity, "double": 2 * capacity}
+
+    for name, make in stores.items():
+        rows = generate_readings(2 * capacity, time.time() - WINDOW, WINDOW, devices=2)
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        store = make()
+        appended = 0
+        sizes = {}
+        for label, count in checkpoints.items():
+            for r in take(rows, count - appended):
+                store.append(r)
+            appended = count
+            sizes[label] = tracemalloc.get_traced_memory()[0] - base
+            results[f"memory.{name}.{label}_bytes"] = sizes[label]
+        tracemalloc.stop()
+        results[f"memory.{name}.growth_after_full_bytes"] = sizes["double"] - sizes["full"]
+    return results
+
+
+# Baselines -------------------------------------------------------------------
+
+def direction(metric):
+    for suffix, sign in SUFFIXES.items():
+        if metric.endswith(suffix):
+            return sign
+    return 0
+
+
+def compare(metrics, baseline, tolerance):
+    """Per-metric change against a baseline run; a metric regressed if it got worse by more than `tolerance`"""
+    comparison = {}
+    for metric, current in metrics.items():
+        before = baseline.get(metric)
+        sign = direction(metric)
+        if before is None or not sign or before == 0:
+            continue
+        change = (current - before) / abs(before)
+        comparison[metric] = {
+            "baseline": before,
+            "current": current,
+            "change": round(change, 4),
+            "regressed": -sign * change > tolerance,
+        }
+    return comparison
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--sizes", default="10k,1m", help="database sizes for the query benchmarks, e.g. 10k,1m,10m")
+    parser.add_argument("--targets", default=",".join(TARGETS), help=f"servers to query: {', '.join(TARGETS)}")
+    parser.add_argument("--repeat", type=int, default=20, help="timed requests per endpoint and size")
+    parser.add_argument("--lines", type=int, default=20_000, help="readings for the parse and insert benchmarks")
+    parser.add_argument("--out", help="also write the results to this file")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before a regression")
+    parser.add_argument("--save-baseline", help="write the results to this file as the new baseline")
+    args = parser.parse_args()
+
+    only = [b.strip() for b in args.only.split(",") if b.strip()]
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    for name, allowed in ((only, BENCHMARKS), (targets, TARGETS)):
+        unknown = [n for n in name if n not in allowed]
+        if unknown:
+            parser.error(f"unknown: {', '.join(unknown)}")
+    sizes = sorted(parse_size(s) for s in args.sizes.split(",") if s.strip())
+    out, baseline, save_baseline = (os.path.abspath(p) if p else None
+                                    for p in (args.out, args.baseline, args.save_baseline))
+
+    workdir = tempfile.mkdtemp(prefix="sensor-bench-")
+    os.chdir(workdir)  # The backend opens sensor_data.db (and its archive directory) relative to the working directory
+    metrics = {}
+    started = time.perf_counter()
+    # The servers print as they go; keep stdout for the JSON results
+    with contextlib.redirect_stdout(sys.stderr):
+        apps = {target: create_app({**config, "DEVICES": []}) for target, config in TARGETS.items()}
+        backend = apps["backend"]
+
+        if "query" in only:
+            metrics.update(bench_query(apps, sizes, targets, args.repeat))
+        if "fanout" in only:
+            metrics.update(bench_fanout(backend, args.repeat))
+        if "parse" in only:
+            metrics.update(bench_parse(backend, args.lines))
+        if "insert" in only:
+            metrics.update(bench_insert(workdir, args.lines, backend.config["INGEST_BATCH_ROWS"]))
+        if "memory" in only:
+            metrics.update(bench_memory(apps["mock"].config["STORE_CAPACITY"]))
+
+    result = {
+        "meta": {
+            "revision": git_revision(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "benchmarks": only,
+            "targets": targets,
+            "sizes": sizes,
+            "seconds": round(time.perf_counter() - started, 1),
+        },
+        "metrics": metrics,
+    }
+
+    regressions = []
+    if baseline:
+        with open(baseline) as f:
+            result["comparison"] = compare(metrics, json.load(f)["metrics"], args.tolerance)
+        regressions = [m for m, c in result["comparison"].items() if c["regressed"]]
+        for metric in regressions:
+            c = result["comparison"][metric]
+            print(f"❌ {metric}: {c['baseline']} -> {c['current']} ({c['change']:+.1%})", file=sys.stderr)
+        print(f"{'❌' if regressions else '✅'} {len(regressions)} of {len(result['comparison'])} metrics regressed "
+              f"beyond {args.tolerance:.0%}", file=sys.stderr)
+
+    text = json.dumps(result, indent=2)
+    for path in (out, save_baseline):
+        if path:
+            with open(path, "w") as f:
+                f.write(text + "\n")
+    print(text)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
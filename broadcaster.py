@@ -0,0 +1,219 @@
+import threading
+import time
+from collections import deque
+
+from flask import request
+from flask_socketio import join_room, leave_room
+
+from wire_format import NUMERIC_FIELDS, encode_readings
+
+ALL = "*"
+WIRE_FORMATS = ("json", "binary")
+METRICS = NUMERIC_FIELDS  # What a subscription can trim frames to; the other fields are always sent
+
+
+def room_name(device=None, metrics=None, wire="json"):
+    """Room for one subscription shape, e.g. 'pico-1|co_in,efficiency', '*|*' or '*|*|binary'"""
+    name = f"{device or ALL}|{','.join(sorted(metrics)) if metrics else ALL}"
+    return name if wire == "json" else f"{name}|{wire}"
+
+
+class Broadcaster:
+    """Coalesces readings into batched `sensor_frame` events, one per subscription room.
+
+    Producers call publish() for every reading, which only appends to a bounded
+    buffer. A flush thread emits at most `max_hz` frames per second to each
+    room; a frame carries the room's readings (trimmed to its metrics) plus a
+    daily stats delta, so dashboards don't refetch /stats/daily per reading.
+    Clients start in the all-devices/all-metrics room and can switch with a
+    `subscribe` event: {"device": "pico-1", "metrics": ["co_in", "efficiency"]}.
+    Connecting with ?wire=binary (or subscribing with "wire": "binary") gets
+    frames whose `readings` are a wire_format binary attachment instead of JSON.
+    A reconnecting client can first be sent the readings it missed, as one
+    `resume` frame (see join()).
+    `timer(stage, seconds)`, if given, is told how long each flush took ("emit").
+    """
+
+    def __init__(self, socketio, event="sensor_frame", max_hz=2.0, max_pending=5000, timer=None):
+        self.socketio = socketio
+        self.event = event
+        self.max_hz = max_hz
+        self.timer = timer
+        self.pending = deque(maxlen=max_pending)  # Oldest readings are shed if flushing falls behind
+
+        self._lock = threading.Lock()
+        self._emitting = threading.Lock()  # Held while a flush emits, so a joining client can't fall in between
+        self._rooms = {}    # room -> (device, metrics, wire)
+        self._members = {}  # sid -> room
+        self._thread = None
+        self._running = False
+
+        self.published = 0
+        self.shed = 0
+        self.frames = 0
+        self.flushes = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="broadcaster")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def publish(self, reading):
+        if len(self.pending) == self.pending.maxlen:
+            self.shed += 1
+        self.pending.append(reading)
+        self.published += 1
+
+    def stats(self):
+        with self._lock:
+            rooms = {room: sum(1 for r in self._members.values() if r == room) for room in self._rooms}
+        return {
+            "pending": len(self.pending),
+            "published": self.published,
+            "shed": self.shed,
+            "flushes": self.flushes,
+            "frames": self.frames,
+            "clients": sum(rooms.values()),
+            "rooms": rooms,
+        }
+
+    # SocketIO handlers -------------------------------------------------------
+
+    def register(self):
+        """Install the subscribe/disconnect handlers; call join() from the server's connect handler"""
+
+        @self.socketio.on("subscribe")
+        def on_subscribe(message=None):
+            message = message or {}
+            if not isinstance(message, dict):
+                return {"error": 'subscribe takes an object like {"device": "pico-1", "metrics": ["co_in"]}'}
+            try:
+                room = self._join(request.sid, message.get("device"), message.get("metrics"), message.get("wire"))
+            except ValueError as e:
+                return {"error": str(e)}
+            return {"room": room}
+
+        @self.socketio.on("disconnect")
+        def on_disconnect(*args):
+            self._leave(request.sid)
+
+    def join(self, replay=None):
+        """Put the connecting client in the all-devices/all-metrics room, in the wire format it asked for.
+
+        `replay()`, if given, returns (readings, missed devices) for a client
+        resuming a session; they are emitted as a `resume` frame before the
+        client joins, with no flush in between. Readings still pending then
+        may arrive twice, in the resume frame and the next sensor_frame, but
+        never not at all; clients drop the repeats by their `seq`.
+        """
+        wire = request.args.get("wire")
+        wire = wire if wire in WIRE_FORMATS else None
+        with self._emitting:
+            if replay is not None:
+                readings, missed = replay()
+                frame = build_frame(readings) if readings else {"device": ALL, "readings": [], "stats_delta": None}
+                if wire == "binary":
+                    frame["readings"] = encode_readings(frame["readings"])
+                self.socketio.emit("resume", {**frame, "missed": missed}, to=request.sid)
+            self._join(request.sid, wire=wire)
+
+    def _join(self, sid, device=None, metrics=None, wire=None):
+        with self._lock:
+            previous = self._members.get(sid)
+            current_wire = self._rooms[previous][2] if previous in self._rooms else "json"
+        # Keep the format negotiated on connect when only device/metrics change
+        wire = wire or current_wire
+        if wire not in WIRE_FORMATS:
+            raise ValueError(f"Unknown wire format '{wire}', use one of: {', '.join(WIRE_FORMATS)}")
+        if metrics is not None and (not isinstance(metrics, list) or
+                                    not all(isinstance(m, str) and m in METRICS for m in metrics)):
+            raise ValueError(f"metrics must be a list of reading fields: {', '.join(METRICS)}")
+        metrics = tuple(sorted(set(metrics))) if metrics else None
+        room = room_name(device, metrics, wire)
+        with self._lock:
+            self._members[sid] = room
+            self._rooms[room] = (device, metrics, wire)
+        if previous and previous != room:
+            leave_room(previous)
+            self._prune(previous)
+        join_room(room)
+        return room
+
+    def _leave(self, sid):
+        with self._lock:
+            room = self._members.pop(sid, None)
+        if room:
+            self._prune(room)
+
+    def _prune(self, room):
+        with self._lock:
+            if room not in self._members.values():
+                self._rooms.pop(room, None)
+
+    # Flushing ----------------------------------------------------------------
+
+    def _run(self):
+        interval = 1.0 / self.max_hz
+        while self._running:
+            started = time.monotonic()
+            self.flush()
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    def flush(self):
+        batch = []
+        while self.pending:
+            batch.append(self.pending.popleft())
+        if not batch:
+            return
+        started = time.perf_counter()
+        self.flushes += 1
+        with self._emitting:
+            self._emit(batch)
+        if self.timer is not None:
+            self.timer("emit", time.perf_counter() - started)
+
+    def _emit(self, batch):
+        with self._lock:
+            rooms = list(self._rooms.items())
+        for room, (device, metrics, wire) in rooms:
+            selected = batch if device is None else [r for r in batch if r.get("device_id") == device]
+            if not selected:
+                continue
+            frame = build_frame(selected, device, metrics)
+            if wire == "binary":
+                frame["readings"] = encode_readings(frame["readings"])
+            self.socketio.emit(self.event, frame, to=room)
+            self.frames += 1
+
+
+def build_frame(readings, device=None, metrics=None):
+    """Frame payload for a batch of readings: the readings (only `metrics`, if given) and a stats delta"""
+    if metrics:
+        keep = set(metrics) | {"timestamp", "device_id", "vehicle", "anomaly", "recommendation", "seq"}
+        rows = [{k: v for k, v in r.items() if k in keep} for r in readings]
+    else:
+        rows = readings
+    return {"device": device or ALL, "readings": rows, "stats_delta": stats_delta(readings)}
+
+
+def stats_delta(readings):
+    """What these readings add to the daily stats of the last reading's day"""
+    day = readings[-1]["timestamp"][:10]
+    today = [r for r in readings if r["timestamp"].startswith(day)]
+    return {
+        "day": day,
+        "count": len(today),
+        "max_co_in": max(r["co_in"] for r in today),
+        "sum_efficiency": sum(r["efficiency"] for r in today),
+        "sum_power": sum(r["power"] for r in today),
+        "anomaly_count": sum(int(r["anomaly"]) for r in today),
+    }
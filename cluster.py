@@ -0,0 +1,111 @@
+"""Run a sensor server as one ingest process plus N worker processes behind one port.
+
+The ingest process owns the devices, the database writer and retention, and
+publishes every reading on the event bus (event_bus.py); it serves the full
+API on 127.0.0.1:INGEST_PORT for admin use, including the write endpoints
+(/retention/run, /anomaly/rescore) that workers don't serve. Each worker subscribes to the bus,
+fans readings out to its own SocketIO clients and answers reads from the
+shared SQLite file, so HTTP and WebSocket load spreads over N cores instead
+of one GIL. Workers accept() on one listening socket created here and
+inherited by every process, so the kernel spreads connections between them.
+
+Without sticky sessions a long-polling client could land on a different
+worker per request, so the cluster only allows the websocket transport.
+
+    run_cluster(config, workers=4, port=5001)
+"""
+
+import multiprocessing
+import socket
+import time
+
+from werkzeug.serving import make_server
+
+from metrics import configure_logging
+
+INGEST_PORT = 5002  # Admin API of the ingest process (/serial/stats, /ingest/stats, /metrics...), localhost only
+RESTART_DELAY = 1.0  # Seconds before a crashed process is started again
+STARTUP_TIMEOUT = 60  # Seconds to wait for the ingest process before starting the workers anyway
+
+
+def serve(app, sock):
+    """Serve `app` (HTTP + SocketIO websockets, threaded) on an already listening socket"""
+    host, port = sock.getsockname()[:2]
+    make_server(host, port, app, threaded=True, fd=sock.fileno()).serve_forever()
+
+
+def _ingest(config, port):
+    from sensor_app import create_app
+
+    configure_logging()
+    app = create_app({**config, "ROLE": "ingest"})
+    app.extensions["sensor"].start()  # Creates or migrates the schema before any worker opens the file
+    print(f"🚀 Ingest process on http://127.0.0.1:{port}")
+    serve(app, listen("127.0.0.1", port))
+
+
+def _worker(config, sock, index):
+    from sensor_app import create_app
+
+    configure_logging()
+    app = create_app({**config, "ROLE": "worker", "SOCKET_TRANSPORTS": ["websocket"]})
+    app.extensions["sensor"].start()
+    print(f"👷 Worker {index} serving")
+    serve(app, sock)
+
+
+def listen(host, port, backlog=1024):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def wait_for_port(port, timeout=STARTUP_TIMEOUT):
+    """True once something accepts connections on localhost:`port`"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def run_cluster(config, workers=None, host="0.0.0.0", port=5001, ingest_port=INGEST_PORT):
+    """Start the ingest process and `workers` workers (default: one per CPU) and restart any that exit"""
+    workers = workers or multiprocessing.cpu_count()
+    # Spawned (not forked) so no process inherits another's threads or open database connections
+    context = multiprocessing.get_context("spawn")
+    sock = listen(host, port)
+
+    def start(name, target, args):
+        process = context.Process(target=target, args=args, name=name, daemon=True)
+        process.start()
+        return process
+
+    specs = {"ingest": (_ingest, (config, ingest_port))}
+    specs.update({f"worker-{i}": (_worker, (config, sock, i)) for i in range(workers)})
+    processes = {"ingest": start("ingest", *specs["ingest"])}
+    if not wait_for_port(ingest_port):
+        print(f"⚠️ Ingest process not serving after {STARTUP_TIMEOUT}s, starting workers anyway")
+    processes.update({name: start(name, *spec) for name, spec in specs.items() if name != "ingest"})
+    print(f"🚀 Cluster of {workers} workers on http://{host}:{port} (ingest admin on 127.0.0.1:{ingest_port})")
+    try:
+        while True:
+            time.sleep(RESTART_DELAY)
+            for name, process in processes.items():
+                if not process.is_alive():
+                    print(f"⚠️ {name} exited with code {process.exitcode}, restarting")
+                    processes[name] = start(name, *specs[name])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join(5)
+        sock.close()
@@ -0,0 +1,377 @@
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import quote, unquote
+
+try:
+    import numpy as np
+except ImportError:  # The column store is NumPy memmaps throughout
+    np = None
+
+# Readings as memory-mapped column files, one directory per device and time chunk:
+#   <directory>/<device_id>/<first timestamp, epoch us>/timestamp.i8 co_in.f4 ... anomaly.bits rows.i8
+# timestamp is int64 epoch microseconds, the measurements float32, anomaly one bit per reading and
+# rows the number of readings written so far. Files are preallocated (sparse) for `capacity` readings.
+FLOAT_COLUMNS = ("co_in", "co_out", "efficiency", "voltage", "current", "power", "predicted_efficiency",
+                 "anomaly_score")
+COLUMNS = ("timestamp",) + FLOAT_COLUMNS + ("anomaly",)
+_FILES = {"timestamp": ("timestamp.i8", "<i8"), "anomaly": ("anomaly.bits", "u1"), "rows": ("rows.i8", "<i8")}
+MAPPED_CHUNKS = 256  # Sealed chunks whose read-only maps are kept (~11 maps each, well under vm.max_map_count)
+
+
+def _file(column):
+    return _FILES.get(column, (f"{column}.f4", "<f4"))
+
+
+def epoch_us(timestamp):
+    """Epoch microseconds of a reading's local ISO timestamp"""
+    return round(datetime.fromisoformat(timestamp).timestamp() * 1_000_000)
+
+
+def _utc_offset_us(us):
+    moment = datetime.fromtimestamp(us / 1_000_000).astimezone()
+    return int(moment.utcoffset().total_seconds() * 1_000_000)
+
+
+def iso_timestamps(seconds):
+    """Local ISO timestamps of epoch seconds, formatted by NumPy unless a DST change falls in between"""
+    ts_us = np.rint(np.asarray(seconds, dtype=np.float64) * 1_000_000).astype(np.int64)
+    if not len(ts_us):
+        return []
+    offset = _utc_offset_us(int(ts_us[0]))
+    if offset != _utc_offset_us(int(ts_us[-1])):
+        return [datetime.fromtimestamp(us / 1_000_000).isoformat() for us in ts_us.tolist()]
+    local = ts_us + offset
+    strings = np.datetime_as_string(local.astype("datetime64[us]"))
+    whole = local % 1_000_000 == 0
+    if whole.any():  # isoformat() leaves out zero microseconds
+        strings[whole] = np.datetime_as_string((local[whole] // 1_000_000).astype("datetime64[s]"))
+    return strings.tolist()
+
+
+def widen(values):
+    """float32 values as float64, rounded to the 7 significant digits float32 holds (61.2, not 61.20000076293945)"""
+    values = values.astype(np.float64)
+    magnitude = np.floor(np.log10(np.abs(values), out=np.zeros_like(values), where=values != 0))
+    scale = 10.0 ** (6 - magnitude)
+    return np.round(values * scale) / scale
+
+
+class Chunk:
+    """One device's readings in one time partition, as column files of `capacity` readings.
+
+    Without a `capacity` (reopening a chunk) it is taken from the size of the
+    timestamp file, so chunks outlive changes to the configured chunk size.
+    """
+
+    def __init__(self, path, capacity=None):
+        self.path = path
+        self.capacity = capacity if capacity is not None else os.path.getsize(self._path("timestamp")) // 8
+        self.rows = int(self._read("rows", 0, 1)[0]) if os.path.exists(self._path("rows")) else 0
+        self.first_us = int(self._read("timestamp", 0, 1)[0]) if self.rows else int(os.path.basename(path))
+        self.last_us = int(self._read("timestamp", self.rows - 1, self.rows)[0]) if self.rows else self.first_us
+        self._maps = None  # Writable maps of every column while this is a device's active chunk
+        self._readers = {}  # Read-only maps once sealed, kept while the store's MAPPED_CHUNKS cache holds it
+
+    @classmethod
+    def create(cls, path, capacity):
+        os.makedirs(path)
+        for column in COLUMNS + ("rows",):
+            name, dtype = _file(column)
+            with open(os.path.join(path, name), "wb") as f:
+                f.truncate(cls._length(column, capacity) * np.dtype(dtype).itemsize)
+        return cls(path, capacity)
+
+    @staticmethod
+    def _length(column, capacity):
+        if column == "rows":
+            return 1
+        return (capacity + 7) // 8 if column == "anomaly" else capacity
+
+    def _path(self, column):
+        return os.path.join(self.path, _file(column)[0])
+
+    def _read(self, column, start, stop):
+        """A few values read straight from the file, without mapping it"""
+        dtype = np.dtype(_file(column)[1])
+        with open(self._path(column), "rb") as f:
+            f.seek(start * dtype.itemsize)
+            return np.frombuffer(f.read((stop - start) * dtype.itemsize), dtype=dtype)
+
+    def map(self, column, mode="r"):
+        if self._maps is not None:
+            return self._maps[column]
+        if mode == "r":
+            readers = self._readers
+            if column not in readers:
+                readers[column] = self._memmap(column, mode)
+            return readers[column]
+        return self._memmap(column, mode)
+
+    def _memmap(self, column, mode):
+        return np.memmap(self._path(column), dtype=_file(column)[1], mode=mode,
+                         shape=(self._length(column, self.capacity),))
+
+    def release(self):
+        """Drop the cached read-only maps; views handed out keep their own reference until released"""
+        self._readers = {}
+
+    def activate(self):
+        """Keep writable maps of the columns for append()"""
+        if self._maps is None:
+            self._maps = {c: self.map(c, "r+") for c in COLUMNS + ("rows",)}
+
+    def seal(self):
+        """Drop the writable maps; views handed out keep their own reference until released"""
+        if self._maps is not None:
+            for m in self._maps.values():
+                m.flush()
+            self._maps = None
+
+    def full(self):
+        return self.rows >= self.capacity
+
+    def append(self, ts_us, reading):
+        maps, i = self._maps, self.rows
+        maps["timestamp"][i] = ts_us
+        for column in FLOAT_COLUMNS:
+            maps[column][i] = reading[column]
+        if reading["anomaly"]:
+            maps["anomaly"][i >> 3] |= 1 << (i & 7)
+        maps["rows"][0] = i + 1  # Written last: a reading only exists once all its columns do
+        self.rows = i + 1
+        self.last_us = ts_us
+
+    def bounds(self, from_us, to_us):
+        """[start, stop) of the readings in [from_us, to_us), by binary search of the mapped timestamps"""
+        ts = self.map("timestamp")[:self.rows]
+        return int(np.searchsorted(ts, from_us)), int(np.searchsorted(ts, to_us))
+
+    def view(self, column, start, stop):
+        """Zero-copy view of a column (anomaly is unpacked to one int8 per reading, which copies)"""
+        if column != "anomaly":
+            return self.map(column)[start:stop]
+        bits = self.map("anomaly")[start >> 3:(stop + 7) >> 3]
+        offset = start & 7
+        return np.unpackbits(bits, bitorder="little")[offset:offset + stop - start].view(np.int8)
+
+    def write(self, column, start, values):
+        """Overwrite a column from `start` (the chunk must be active or opened for rescoring)"""
+        target = self.map(column, "r+")
+        stop = start + len(values)
+        if column != "anomaly":
+            target[start:stop] = values
+        else:
+            lo, hi = start >> 3, (stop + 7) >> 3
+            bits = np.unpackbits(target[lo:hi], bitorder="little")
+            bits[start - lo * 8:stop - lo * 8] = np.asarray(values) != 0
+            target[lo:hi] = np.packbits(bits, bitorder="little")
+        if self._maps is None:
+            target.flush()
+
+
+class _Partition:
+    """A device's chunks ordered by first timestamp; `firsts` is the sparse time index bisected by range reads"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.chunks = []
+        self.firsts = []
+        self.active = None
+        self.lock = threading.Lock()
+
+    def add(self, chunk):
+        i = bisect_right(self.firsts, chunk.first_us)
+        self.firsts.insert(i, chunk.first_us)
+        self.chunks.insert(i, chunk)
+
+
+class ColumnStore:
+    """Append-only columnar time series on memory-mapped files, partitioned by device and time.
+
+    append() writes one value per column into the device's active chunk; a
+    new chunk starts every `chunk_seconds` (aligned), when the active one is
+    full, or when the clock steps back. Range reads bisect the chunk index for
+    the chunks that overlap and binary-search their mapped timestamps, so
+    they cost time in proportion to the readings in range, whatever the total.
+    """
+
+    def __init__(self, directory, chunk_seconds=3600, chunk_rows=65536, mapped_chunks=MAPPED_CHUNKS):
+        if np is None:
+            raise ValueError("The column store needs NumPy")
+        self.directory = directory
+        self.chunk_us = chunk_seconds * 1_000_000
+        self.chunk_rows = chunk_rows  # Capacity of new chunks; existing ones keep theirs
+        self.mapped_chunks = mapped_chunks
+        self._partitions = {}
+        self._mapped = OrderedDict()  # Sealed chunks holding read-only maps, least recently read first
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Index the chunks already on disk; the newest chunk of each device takes further appends"""
+        os.makedirs(self.directory, exist_ok=True)
+        for device_dir in sorted(os.listdir(self.directory)):
+            partition = self._partition(unquote(device_dir))
+            for name in os.listdir(partition.directory):
+                if name.isdigit():
+                    partition.add(Chunk(os.path.join(partition.directory, name)))
+            if partition.chunks:
+                partition.active = max(partition.chunks, key=lambda c: c.last_us)
+                partition.active.activate()
+
+    def close(self):
+        for partition in list(self._partitions.values()):
+            with partition.lock:
+                if partition.active is not None:
+                    partition.active.seal()
+                    partition.active = None
+        with self._lock:
+            for chunk in self._mapped:
+                chunk.release()
+            self._mapped.clear()
+
+    def devices(self):
+        return list(self._partitions)
+
+    def _partition(self, device_id):
+        partition = self._partitions.get(device_id)
+        if partition is None:
+            with self._lock:
+                partition = self._partitions.get(device_id)
+                if partition is None:
+                    directory = os.path.join(self.directory, quote(device_id, safe=""))
+                    os.makedirs(directory, exist_ok=True)
+                    partition = self._partitions[device_id] = _Partition(directory)
+        return partition
+
+    def _selected(self, device_id):
+        if device_id is None:
+            return list(self._partitions.items())
+        partition = self._partitions.get(device_id)
+        return [(device_id, partition)] if partition is not None else []
+
+    def append(self, reading):
+        ts_us = epoch_us(reading["timestamp"])
+        partition = self._partition(reading["device_id"])
+        with partition.lock:
+            active = partition.active
+            if active is None or active.full() or ts_us < active.last_us or \
+                    ts_us // self.chunk_us != active.first_us // self.chunk_us:
+                if active is not None:
+                    active.seal()
+                path = os.path.join(partition.directory, str(ts_us))
+                while os.path.exists(path):  # Only after the clock stepped back onto an old chunk's name
+                    path += "0"
+                active = partition.active = Chunk.create(path, self.chunk_rows)
+                active.first_us = active.last_us = ts_us
+                active.activate()
+                partition.add(active)
+            active.append(ts_us, reading)
+
+    def _ranges(self, partition, from_us, to_us):
+        """(chunk, start, stop) of every chunk of a partition with readings in [from_us, to_us)"""
+        with partition.lock:
+            chunks = partition.chunks
+            start = max(bisect_right(partition.firsts, from_us) - 1, 0)
+            while start > 0 and chunks[start - 1].last_us >= from_us:  # Chunks overlap after a clock step
+                start -= 1
+            selected = chunks[start:bisect_left(partition.firsts, to_us)]
+        ranges = []
+        for chunk in selected:
+            if chunk.last_us < from_us:
+                continue
+            self._touch(chunk)
+            lo, hi = chunk.bounds(from_us, to_us)
+            if hi > lo:
+                ranges.append((chunk, lo, hi))
+        return ranges
+
+    def _touch(self, chunk):
+        """Mark a chunk's maps recently used; the least recently read sealed chunks give theirs up"""
+        with self._lock:
+            self._mapped[chunk] = None
+            self._mapped.move_to_end(chunk)
+            while len(self._mapped) > self.mapped_chunks:
+                self._mapped.popitem(last=False)[0].release()
+
+    def views(self, column, from_us, to_us, device_id=None):
+        """{device_id: [view per chunk]} of one column over [from_us, to_us), without copying"""
+        return {d: [chunk.view(column, lo, hi) for chunk, lo, hi in self._ranges(p, from_us, to_us)]
+                for d, p in self._selected(device_id)}
+
+    def arrays(self, columns, from_us, to_us, device_id=None, labels=None):
+        """Contiguous arrays of [from_us, to_us), devices merged by time: timestamp as float64 epoch seconds,
+        floats widen()ed to float64, anomaly int8, device_id uint16 codes into `labels["device_id"]`"""
+        stored = set(columns) - {"device_id"} | {"timestamp"}
+        devices = labels.setdefault("device_id", []) if labels is not None else []
+        parts = []
+        for device, partition in self._selected(device_id):
+            ranges = self._ranges(partition, from_us, to_us)
+            if ranges:
+                part = {c: np.concatenate([chunk.view(c, lo, hi) for chunk, lo, hi in ranges]) for c in stored}
+                if "device_id" in columns:
+                    part["device_id"] = np.full(len(part["timestamp"]), len(devices), dtype=np.uint16)
+                    devices.append(device)
+                parts.append(part)
+        if not parts:
+            merged = {c: np.empty(0, dtype=np.int64 if c == "timestamp" else np.int8 if c == "anomaly" else
+                                  np.uint16 if c == "device_id" else np.float32)
+                      for c in stored | set(columns)}
+        elif len(parts) == 1:
+            merged = parts[0]
+        else:
+            merged = {c: np.concatenate([p[c] for p in parts]) for c in parts[0]}
+            order = np.argsort(merged["timestamp"], kind="stable")
+            merged = {c: values[order] for c, values in merged.items()}
+        return {c: (merged[c] / 1_000_000 if c == "timestamp" else
+                    merged[c] if c in ("anomaly", "device_id") else widen(merged[c])) for c in columns}
+
+    def tail(self, n, device_id=None):
+        """Column arrays of the last `n` readings (of one device, or merged), like arrays()"""
+        latest = [p.active.last_us for _, p in self._selected(device_id) if p.active is not None]
+        if not latest:
+            return None
+        to_us = max(latest) + 1
+        # Widen the window until it holds n readings; cheap, since each read is proportional to its range
+        span = 60_000_000
+        while True:
+            arrays = self.arrays(COLUMNS, to_us - span, to_us, device_id)
+            if len(arrays["timestamp"]) >= n or span > to_us:
+                return {c: values[-n:] for c, values in arrays.items()}
+            span *= 8
+
+    def rescore(self, device_id, from_us, to_us, columns, score):
+        """Recompute columns of one device's readings in [from_us, to_us) in place; returns (count, results)"""
+        partition = self._partitions.get(device_id)
+        if partition is None:
+            return 0, None
+        ranges = self._ranges(partition, from_us, to_us)
+        if not ranges:
+            return 0, None
+        arrays = {c: np.concatenate([chunk.view(c, lo, hi) for chunk, lo, hi in ranges]).astype(np.float64)
+                  for c in columns}
+        results = score(arrays)
+        with partition.lock:  # Anomaly bits share bytes with readings being appended
+            pos = 0
+            for chunk, lo, hi in ranges:
+                for column, values in results.items():
+                    chunk.write(column, lo, values[pos:pos + hi - lo])
+                pos += hi - lo
+        return pos, results
+
+    def stats(self):
+        devices = {}
+        for device_id, partition in self._selected(None):
+            with partition.lock:
+                chunks = list(partition.chunks)
+            devices[device_id] = {
+                "chunks": len(chunks),
+                "readings": sum(c.rows for c in chunks),
+                "first": datetime.fromtimestamp(chunks[0].first_us / 1_000_000).isoformat() if chunks else None,
+                "last": datetime.fromtimestamp(max(c.last_us for c in chunks) / 1_000_000).isoformat()
+                if chunks else None,
+            }
+        return {"directory": self.directory, "chunk_rows": self.chunk_rows,
+                "chunk_seconds": self.chunk_us // 1_000_000, "devices": devices}
@@ -0,0 +1,138 @@
+import io
+from array import array
+
+from csv_export import CHUNK_ROWS, cursor_chunks
+
+try:
+    import numpy as np
+except ImportError:  # npz export needs NumPy
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet / Arrow IPC export need pyarrow
+    pa = None
+
+# format -> (allowed compression values, default compression, mimetype, file extension)
+FORMATS = {
+    "parquet": (("zstd", "gzip", "snappy", "none"), "zstd", "application/vnd.apache.parquet", "parquet"),
+    "arrow": (("zstd", "lz4", "none"), "zstd", "application/vnd.apache.arrow.file", "arrow"),
+    "npz": (("gzip", "none"), "gzip", "application/octet-stream", "npz"),
+}
+
+
+def available_formats():
+    formats = []
+    if pa is not None:
+        formats += ["parquet", "arrow"]
+    if np is not None:
+        formats.append("npz")
+    return formats
+
+
+def default_format():
+    formats = available_formats()
+    return formats[0] if formats else "csv"
+
+
+LABEL_COLUMNS = ("device_id",)
+
+
+def label_codes(labels):
+    """code(label) -> index of label in `labels`, appending labels not seen yet"""
+    index = {label: i for i, label in enumerate(labels)}
+
+    def code(label):
+        if label not in index:
+            index[label] = len(labels)
+            labels.append(label)
+        return index[label]
+    return code
+
+
+def sqlite_column_arrays(db, columns, from_ms, to_ms, device_id=None, labels=None):
+    """Read a ts_ms range (optionally of one device) from the readings table into one typed array per column.
+
+    Label columns (device_id) come back as uint16 codes into `labels[column]`,
+    a list that new labels are appended to.
+    """
+    labels = {} if labels is None else labels
+    select = ["ts_ms / 1000.0" if c == "timestamp" else c for c in columns]
+    arrays = {c: array('H' if c in LABEL_COLUMNS else 'b' if c == "anomaly" else 'd') for c in columns}
+    codes = {c: label_codes(labels.setdefault(c, [])) for c in columns if c in LABEL_COLUMNS}
+    device_filter = "AND device_id = ?" if device_id is not None else ""
+    rows = db.execute(f"""
+        SELECT {", ".join(select)}
+        FROM readings
+        WHERE ts_ms >= ? AND ts_ms < ? {device_filter}
+        ORDER BY ts_ms
+    """, (from_ms, to_ms) + ((device_id,) if device_id is not None else ()))
+    targets = [(i, arrays[c], codes.get(c)) for i, c in enumerate(columns)]
+    for chunk in cursor_chunks(rows, CHUNK_ROWS):
+        for i, target, code in targets:
+            if code is not None:
+                target.extend(code(row[i]) for row in chunk)
+            else:
+                target.extend(row[i] or 0 for row in chunk)
+    return arrays
+
+
+def _arrow_table(arrays, labels):
+    fields = {}
+    for name, values in arrays.items():
+        if name == "timestamp":
+            ms = np.round(np.frombuffer(values, dtype=np.float64) * 1000).astype(np.int64)
+            fields[name] = pa.array(ms, type=pa.timestamp("ms"))
+        elif name == "anomaly":
+            fields[name] = pa.array(np.frombuffer(values, dtype=np.int8).astype(bool))
+        elif name in labels:
+            # Parquet can't write a null inside the dictionary, so a None label becomes a null code instead
+            codes = np.frombuffer(values, dtype=np.uint16)
+            missing = np.array([label is None for label in labels[name]], dtype=bool)
+            dictionary = pa.array(["" if label is None else label for label in labels[name]], type=pa.string())
+            mask = missing[codes] if missing.any() else None
+            fields[name] = pa.DictionaryArray.from_arrays(pa.array(codes, mask=mask), dictionary)
+        else:
+            fields[name] = pa.array(np.frombuffer(values, dtype=np.float64))
+    return pa.table(fields)
+
+
+def _npz_arrays(arrays, labels):
+    out = {}
+    for name, values in arrays.items():
+        if name == "timestamp":
+            out["timestamp_ms"] = np.round(np.frombuffer(values, dtype=np.float64) * 1000).astype(np.int64)
+        elif name == "anomaly":
+            out[name] = np.frombuffer(values, dtype=np.int8).astype(bool)
+        elif name in labels:
+            # Codes plus a lookup table, e.g. recommendation_labels[recommendation]
+            out[name] = np.frombuffer(values, dtype=np.uint16).copy()
+            out[name + "_labels"] = np.array(labels[name], dtype=str)
+        else:
+            out[name] = np.frombuffer(values, dtype=np.float64).copy()
+    return out
+
+
+def write_columns(arrays, labels, fmt, compression=None):
+    """Serialize column arrays to `fmt`; returns (payload bytes, mimetype, file extension)"""
+    if fmt not in FORMATS or fmt not in available_formats():
+        raise ValueError(f"Unsupported format '{fmt}', available: {', '.join(available_formats() + ['csv'])}")
+    allowed, default, mimetype, ext = FORMATS[fmt]
+    compression = compression or default
+    if compression not in allowed:
+        raise ValueError(f"Compression '{compression}' not supported for {fmt}, use one of: {', '.join(allowed)}")
+
+    buf = io.BytesIO()
+    if fmt == "parquet":
+        pq.write_table(_arrow_table(arrays, labels), buf, compression=compression)
+    elif fmt == "arrow":
+        table = _arrow_table(arrays, labels)
+        options = pa.ipc.IpcWriteOptions(compression=None if compression == "none" else compression)
+        with pa.ipc.new_file(buf, table.schema, options=options) as writer:
+            writer.write_table(table)
+    else:
+        save = np.savez_compressed if compression == "gzip" else np.savez
+        save(buf, **_npz_arrays(arrays, labels))
+    return buf.getvalue(), mimetype, ext
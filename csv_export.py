@@ -0,0 +1,69 @@
+import csv
+import io
+import math
+from datetime import datetime
+
+CHUNK_ROWS = 1000  # Rows per fetchmany / per yielded chunk
+MAX_TIME = 2 ** 50 / 1000  # Latest epoch second a range may name (the open end of an export range)
+
+
+def parse_time(value):
+    """Epoch seconds from a query parameter given as epoch seconds or an ISO timestamp"""
+    if value is None or value == "":
+        return None
+    try:
+        try:
+            ts = float(value)
+        except ValueError:
+            ts = datetime.fromisoformat(value).timestamp()
+    except (ValueError, OverflowError):
+        raise ValueError(f"Invalid time '{value}': use epoch seconds or an ISO timestamp") from None
+    if not math.isfinite(ts) or abs(ts) > MAX_TIME:  # inf/nan would only fail later, as a 500
+        raise ValueError(f"Time out of range: '{value}'")
+    return ts
+
+
+def parse_range(args, default_from=None):
+    """(from_ts, to_ts) in epoch seconds from the `from`/`to` query parameters"""
+    from_ts = parse_time(args.get("from"))
+    to_ts = parse_time(args.get("to"))
+    return (default_from if from_ts is None else from_ts), to_ts
+
+
+def parse_columns(args, available):
+    """Columns requested via `columns=a,b,c`, validated against `available` (all by default)"""
+    requested = args.get("columns")
+    if not requested:
+        return list(available)
+    columns = [c.strip() for c in requested.split(",") if c.strip()]
+    unknown = [c for c in columns if c not in available]
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+    return columns
+
+
+def cursor_chunks(cursor, size=CHUNK_ROWS):
+    """Yield lists of rows from an executed cursor using fetchmany"""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def stream_csv(columns, chunks):
+    """Yield CSV text: the header first, then one string per chunk of row tuples"""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(columns)
+    yield buf.getvalue()
+    for rows in chunks:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(rows)
+        yield buf.getvalue()
+
+
+def download_headers(filename):
+    """Headers that make the browser save the response as `filename`"""
+    return {'Content-Disposition': f'attachment; filename={filename}'}
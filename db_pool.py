@@ -0,0 +1,115 @@
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """No read connection became free in time"""
+
+
+class ReadPool:
+    """Bounded pool of read-only SQLite connections for request handlers.
+
+    Every handler borrows a connection of its own, so concurrent requests never
+    share cursor state, and with WAL they read alongside the ingest writer
+    instead of queueing behind it. Connections are created lazily up to
+    `size`, refuse writes (PRAGMA query_only) and keep a cache of prepared
+    statements. Each use is timed under a label, reported by stats().
+    """
+
+    def __init__(self, db_path, size=8, timeout=5.0, cached_statements=256):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()  # Most recently used first, so idle extras stay cold
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+
+        self.waits = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self._timings = {}  # label -> [count, total_ms, max_ms]
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=self.cached_statements)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self._connect()
+            except sqlite3.Error:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"No read connection free after {self.timeout}s")
+        with self._lock:
+            self.waits += 1
+            self.total_wait_ms += (time.perf_counter() - started) * 1000
+        return conn
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()  # Don't pin an old WAL snapshot while idle
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self, label="query"):
+        """Borrow a read-only connection for the duration of the block, timed under `label`"""
+        conn = self._acquire()
+        with self._lock:
+            self._in_use += 1
+        started = time.perf_counter()
+        try:
+            yield conn
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._in_use -= 1
+                timing = self._timings.setdefault(label, [0, 0.0, 0.0])
+                timing[0] += 1
+                timing[1] += elapsed_ms
+                timing[2] = max(timing[2], elapsed_ms)
+            self._release(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "in_use": self._in_use,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait_ms / self.waits, 3) if self.waits else 0,
+                "queries": {
+                    label: {"count": count, "avg_ms": round(total / count, 3), "max_ms": round(worst, 3)}
+                    for label, (count, total, worst) in sorted(self._timings.items())
+                },
+            }
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,290 @@
+import math
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:  # Batch rescoring needs NumPy; the per-reading path does not
+    np = None
+
+# Streaming anomaly detectors and an efficiency forecaster.
+#
+# Every detector keeps O(1) state and turns one value into a normalised score
+# per reading (score >= 1 means "anomalous"). Each also has a NumPy `batch()`
+# that computes the same scores for a whole historical series at once, so a
+# range can be re-scored after tuning without replaying it reading by reading.
+
+
+def _recurrence(u, decay, y0=0.0):
+    """y[t] = decay * y[t-1] + u[t] for a whole array, vectorised block by block.
+
+    Within a block the recurrence is a scaled cumulative sum; blocks are kept
+    short enough that decay ** -len(block) stays well inside float64 precision.
+    """
+    u = np.asarray(u, dtype=np.float64)
+    y = np.empty_like(u)
+    if decay <= 0:
+        y[:] = u
+        return y
+    block = max(1, min(1024, int(6 / -math.log10(decay)))) if decay < 1 else 1024
+    powers = decay ** np.arange(block, dtype=np.float64)
+    prev = y0
+    for start in range(0, len(u), block):
+        chunk = u[start:start + block]
+        p = powers[:len(chunk)]
+        y[start:start + len(chunk)] = p * (decay * prev + np.cumsum(chunk / p))
+        prev = y[start + len(chunk) - 1]
+    return y
+
+
+def _ewma_series(x, alpha):
+    """EWMA after each value, starting from the first value"""
+    x = np.asarray(x, dtype=np.float64)
+    if len(x) < 2:
+        return x.copy()
+    return np.concatenate(([x[0]], _recurrence(alpha * x[1:], 1 - alpha, x[0])))
+
+
+def _ewma_batch(x, alpha):
+    """Running EWMA mean and variance *before* each value, as the streaming Ewma sees them"""
+    x = np.asarray(x, dtype=np.float64)
+    if not len(x):
+        return x, x
+    mean = _ewma_series(x, alpha)
+    diff = x[1:] - mean[:-1]
+    var = np.concatenate(([0.0], _recurrence((1 - alpha) * alpha * diff * diff, 1 - alpha)))
+    return np.concatenate(([x[0]], mean[:-1])), np.concatenate(([0.0], var[:-1]))
+
+
+def _std(var, mean, rel_floor):
+    """Standard deviation floored at a fraction of the mean, so a flat signal doesn't turn noise into huge scores"""
+    return max(math.sqrt(var), rel_floor * abs(mean))
+
+
+class Ewma:
+    """Exponentially weighted running mean and variance"""
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.n = 0
+        self.mean = 0.0
+        self.var = 0.0
+
+    def update(self, x):
+        if self.n == 0:
+            self.mean = x
+        else:
+            diff = x - self.mean
+            incr = self.alpha * diff
+            self.mean += incr
+            self.var = (1 - self.alpha) * (self.var + diff * incr)
+        self.n += 1
+
+
+class EwmaDetector:
+    """Distance of a value from its EWMA mean, in EWMA standard deviations"""
+
+    def __init__(self, field, alpha=0.1, threshold=4.0, warmup=10, rel_floor=0.01):
+        self.field = field
+        self.threshold = threshold
+        self.warmup = warmup
+        self.rel_floor = rel_floor
+        self.ewma = Ewma(alpha)
+
+    def update(self, x):
+        e = self.ewma
+        score = 0.0
+        if e.n >= self.warmup:
+            std = _std(e.var, e.mean, self.rel_floor)
+            if std > 0:
+                score = abs(x - e.mean) / std / self.threshold
+        e.update(x)
+        return score
+
+    @staticmethod
+    def batch(x, alpha=0.1, threshold=4.0, warmup=10, rel_floor=0.01):
+        x = np.asarray(x, dtype=np.float64)
+        mean, var = _ewma_batch(x, alpha)
+        std = np.maximum(np.sqrt(var), rel_floor * np.abs(mean))
+        score = np.divide(np.abs(x - mean), std * threshold, out=np.zeros_like(x), where=std > 0)
+        score[:warmup] = 0.0
+        return score
+
+
+class ZScoreDetector:
+    """Distance of a value from the mean of the previous `window` values, in standard deviations"""
+
+    def __init__(self, field, window=60, threshold=3.0, rel_floor=0.01):
+        self.field = field
+        self.window = window
+        self.threshold = threshold
+        self.rel_floor = rel_floor
+        self.values = deque()
+        self.sum = 0.0
+        self.sum_sq = 0.0
+
+    def update(self, x):
+        score = 0.0
+        n = len(self.values)
+        if n == self.window:
+            mean = self.sum / n
+            std = _std(max(self.sum_sq / n - mean * mean, 0.0), mean, self.rel_floor)
+            if std > 0:
+                score = abs(x - mean) / std / self.threshold
+            old = self.values.popleft()
+            self.sum -= old
+            self.sum_sq -= old * old
+        self.values.append(x)
+        self.sum += x
+        self.sum_sq += x * x
+        return score
+
+    @staticmethod
+    def batch(x, window=60, threshold=3.0, rel_floor=0.01):
+        x = np.asarray(x, dtype=np.float64)
+        score = np.zeros_like(x)
+        if len(x) <= window:
+            return score
+        c = np.concatenate(([0.0], np.cumsum(x)))
+        c2 = np.concatenate(([0.0], np.cumsum(x * x)))
+        t = np.arange(window, len(x))
+        mean = (c[t] - c[t - window]) / window
+        var = np.maximum((c2[t] - c2[t - window]) / window - mean * mean, 0.0)
+        std = np.maximum(np.sqrt(var), rel_floor * np.abs(mean))
+        score[window:] = np.divide(np.abs(x[window:] - mean), std * threshold,
+                                   out=np.zeros_like(mean), where=std > 0)
+        return score
+
+
+class CusumDetector:
+    """One-sided CUSUM of standardised deviations from a slow EWMA baseline.
+
+    Catches a sustained drift (e.g. efficiency sagging as the CuO mesh
+    degrades) long before any single reading looks abnormal. `direction` is
+    "down" or "up"; the score is the cumulative sum over the alarm level `h`.
+    """
+
+    def __init__(self, field, alpha=0.01, k=0.5, h=8.0, warmup=30, direction="down", rel_floor=0.005):
+        if direction not in ("down", "up"):
+            raise ValueError(f"CUSUM direction must be 'down' or 'up', not '{direction}'")
+        self.field = field
+        self.k = k
+        self.h = h
+        self.warmup = warmup
+        self.rel_floor = rel_floor
+        self.sign = -1.0 if direction == "down" else 1.0
+        self.ewma = Ewma(alpha)
+        self.s = 0.0
+
+    def update(self, x):
+        e = self.ewma
+        z = 0.0
+        if e.n >= self.warmup:
+            std = _std(e.var, e.mean, self.rel_floor)
+            if std > 0:
+                z = self.sign * (x - e.mean) / std
+        self.s = max(0.0, self.s + z - self.k)
+        e.update(x)
+        return self.s / self.h
+
+    @staticmethod
+    def batch(x, alpha=0.01, k=0.5, h=8.0, warmup=30, direction="down", rel_floor=0.005):
+        x = np.asarray(x, dtype=np.float64)
+        mean, var = _ewma_batch(x, alpha)
+        std = np.maximum(np.sqrt(var), rel_floor * np.abs(mean))
+        sign = -1.0 if direction == "down" else 1.0
+        z = np.divide(sign * (x - mean), std, out=np.zeros_like(x), where=std > 0)
+        z[:warmup] = 0.0
+        # S[t] = max(0, S[t-1] + d[t]) is the cumulative sum reflected at zero
+        c = np.cumsum(z - k)
+        return (c - np.minimum(np.minimum.accumulate(c), 0.0)) / h
+
+
+class EfficiencyForecaster:
+    """Brown's double exponential smoothing: efficiency `horizon` readings ahead"""
+
+    def __init__(self, alpha=0.2, horizon=5):
+        self.alpha = alpha
+        self.horizon = horizon
+        self.s1 = self.s2 = None
+
+    def update(self, x):
+        a = self.alpha
+        if self.s1 is None:
+            self.s1 = self.s2 = x
+        else:
+            self.s1 = a * x + (1 - a) * self.s1
+            self.s2 = a * self.s1 + (1 - a) * self.s2
+        return self._forecast(self.s1, self.s2)
+
+    def _forecast(self, s1, s2):
+        return 2 * s1 - s2 + self.horizon * self.alpha / (1 - self.alpha) * (s1 - s2)
+
+    def batch(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        if not len(x):
+            return x
+        s1 = _ewma_series(x, self.alpha)
+        return self._forecast(s1, _ewma_series(s1, self.alpha))
+
+
+DETECTORS = {"ewma": EwmaDetector, "zscore": ZScoreDetector, "cusum": CusumDetector}
+
+# (detector kind, reading field, parameters)
+DEFAULT_DETECTORS = (
+    ("ewma", "co_in", {}),
+    ("zscore", "co_out", {}),
+    ("cusum", "efficiency", {"direction": "down"}),
+)
+
+
+class AnomalyEngine:
+    """Runs a set of detectors and the efficiency forecaster per device.
+
+    score() annotates one reading in O(1) with `anomaly`, `anomaly_score` (the
+    highest detector score), `predicted_efficiency` and the names of the
+    detectors that fired. rescore() does the same for column arrays with NumPy.
+    """
+
+    def __init__(self, specs=DEFAULT_DETECTORS, forecast_alpha=0.2, horizon=5):
+        for kind, _, _ in specs:
+            if kind not in DETECTORS:
+                raise ValueError(f"Unknown detector '{kind}', use one of: {', '.join(DETECTORS)}")
+        self.specs = tuple(specs)
+        self.forecast_alpha = forecast_alpha
+        self.horizon = horizon
+        self._state = {}  # device_id -> (detectors, forecaster)
+
+    def _device(self, device_id):
+        state = self._state.get(device_id)
+        if state is None:
+            detectors = [DETECTORS[kind](field, **params) for kind, field, params in self.specs]
+            state = self._state[device_id] = (detectors, EfficiencyForecaster(self.forecast_alpha, self.horizon))
+        return state
+
+    def score(self, reading, device_id=None):
+        detectors, forecaster = self._device(device_id)
+        top, reasons = 0.0, []
+        for (kind, field, _), detector in zip(self.specs, detectors):
+            s = detector.update(reading[field])
+            top = max(top, s)
+            if s >= 1:
+                reasons.append(f"{kind}:{field}")
+        return {
+            "anomaly": bool(reasons),
+            "anomaly_score": round(top, 3),
+            "predicted_efficiency": round(forecaster.update(reading["efficiency"]), 2),
+            "reasons": reasons,
+        }
+
+    def rescore(self, arrays):
+        """Score one device's column arrays from a cold start; returns anomaly, anomaly_score, predicted_efficiency"""
+        if np is None:
+            raise ValueError("Batch rescoring needs NumPy")
+        scores = [DETECTORS[kind].batch(arrays[field], **params) for kind, field, params in self.specs]
+        top = np.max(scores, axis=0) if scores else np.zeros(len(arrays["efficiency"]))
+        forecaster = EfficiencyForecaster(self.forecast_alpha, self.horizon)
+        return {
+            "anomaly": (top >= 1).astype(np.int8),
+            "anomaly_score": np.round(top, 3),
+            "predicted_efficiency": np.round(forecaster.batch(arrays["efficiency"]), 2),
+        }
@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+
+from frame_parser import encode_json
+from simulator import REPLAY_DEVICE, VirtualDevice, read_export, replay
+from spool import DEVICE_ID_BYTES
+
+
+class Device:
+    """One entry of the device registry: a data source tagged with a device_id and vehicle.
+
+    `source` names the kind of source (serial, simulated, replay, or one registered
+    with the app); the app checks it when it builds the source.
+    """
+
+    def __init__(self, device_id, source="serial", vehicle=None, port=None, baudrate=9600,
+                 profile=None, interval=1.0, seed=None, path=None, speed=1.0):
+        if not isinstance(device_id, str) or not device_id or len(device_id.encode()) > DEVICE_ID_BYTES:
+            raise ValueError(f"Device {device_id!r}: device_id must be a string of 1 to {DEVICE_ID_BYTES} UTF-8 bytes")
+        if source == "serial" and not port:
+            raise ValueError(f"Device {device_id}: serial devices need a 'port'")
+        if source == "replay" and not path:
+            raise ValueError(f"Device {device_id}: replay devices need the 'path' of a CSV or Parquet export")
+        self.device_id = device_id
+        self.source = source
+        self.vehicle = vehicle
+        self.port = port
+        self.baudrate = baudrate
+        self.profile = profile
+        self.interval = interval
+        self.seed = seed
+        self.path = path
+        self.speed = speed
+
+    def __repr__(self):
+        where = {"serial": self.port, "replay": self.path}.get(self.source, self.profile or "pico")
+        return f"<Device {self.device_id} ({self.vehicle or 'unknown vehicle'}, {self.source}: {where})>"
+
+
+def load_devices(path=None, default=None):
+    """Read the device registry from a JSON file ({"devices": [{...}, ...]}).
+
+    Without a file, `default` (a single Device) is the whole registry.
+    """
+    if not path:
+        return [default] if default else []
+    with open(path) as f:
+        config = json.load(f)
+    devices = [Device(**entry) for entry in config["devices"]]
+    ids = [d.device_id for d in devices]
+    duplicates = sorted({i for i in ids if ids.count(i) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate device_id(s) in {path}: {', '.join(duplicates)}")
+    return devices
+
+
+class SimulatedSource:
+    """Feeds Pico-style JSON lines to `handle_line` on its own thread, in place of a serial port"""
+
+    def __init__(self, device, handle_line):
+        self.device = device
+        self.handle_line = handle_line
+        self.sim = VirtualDevice(device.device_id, device.profile or "pico", device.vehicle, device.seed)
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"sim-{self.device.device_id}")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        return {"source": "simulated", "running": self._running}
+
+    def _run(self):
+        next_at = time.monotonic()
+        while self._running:
+            self.handle_line(self.sim.pico_line().encode())
+            next_at += self.device.interval
+            time.sleep(max(0.0, next_at - time.monotonic()))
+
+
+class ReplaySource:
+    """Replays a CSV or Parquet export as this device's JSON frames, at `speed` times the recorded pace.
+
+    Only the export's rows of this device_id are replayed (all rows of an
+    export without a device_id column), so a multi-device export is replayed
+    by one registry entry per device, each keeping its own detector state.
+    """
+
+    def __init__(self, device, handle_line):
+        self.device = device
+        self.handle_line = handle_line
+        self.replayed = 0
+        self.skipped = 0  # Rows of other devices
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"replay-{self.device.device_id}")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        return {"source": "replay", "running": self._running, "path": self.device.path, "replayed": self.replayed,
+                "skipped": self.skipped}
+
+    def _own_rows(self):
+        for row in read_export(self.device.path):
+            if row[1] in (self.device.device_id, REPLAY_DEVICE):
+                yield row
+            else:
+                self.skipped += 1
+
+    def _run(self):
+        for _, reading in replay(self._own_rows(), self.device.speed):
+            if not self._running:
+                return
+            self.handle_line(encode_json(reading))
+            self.replayed += 1
+        self._running = False
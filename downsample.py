@@ -0,0 +1,82 @@
+import math
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:  # Without NumPy, long ranges fall back to plain striding
+    np = None
+
+MODES = ("lttb", "minmax")
+
+
+def lttb_indices(x, y, points):
+    """Indices kept by Largest-Triangle-Three-Buckets when reducing (x, y) to `points`"""
+    length = len(x)
+    if points >= length:
+        return np.arange(length)
+    if points < 3:
+        return np.array([0, length - 1][:points], dtype=np.int64)
+
+    # First and last points are always kept; the rest is split into points - 2 buckets
+    edges = np.linspace(1, length - 1, points - 1).astype(np.int64)
+    out = np.empty(points, dtype=np.int64)
+    out[0], out[-1] = 0, length - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo = hi
+        next_hi = edges[i + 2] if i + 2 < len(edges) else length
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y, points):
+    """Indices of the first and last point plus the min and max of `y` in each of (points - 2) / 2 equal buckets"""
+    length = len(y)
+    if points >= length:
+        return np.arange(length)
+    if points < 4:
+        return np.array([0, length - 1][:points], dtype=np.int64)
+    width = math.ceil(length / ((points - 2) // 2))
+    buckets = math.ceil(length / width)
+    padded = np.full(buckets * width, np.nan)
+    padded[:length] = y
+    grid = padded.reshape(buckets, width)
+    offsets = np.arange(buckets) * width
+    return np.unique(np.concatenate([[0, length - 1], offsets + np.nanargmin(grid, axis=1),
+                                     offsets + np.nanargmax(grid, axis=1)]))
+
+
+def downsample_indices(x, y, points, mode="lttb"):
+    """Indices of at most `points` (>= 2) points to keep from a series, oldest first, first and last included"""
+    if mode not in MODES:
+        raise ValueError(f"Unknown downsampling mode '{mode}', use one of: {', '.join(MODES)}")
+    if points < 2:
+        raise ValueError("points must be at least 2")
+    length = len(x)
+    if points >= length:
+        return range(length)
+    if np is None:
+        return list(range(0, length - 1, math.ceil((length - 1) / (points - 1)))) + [length - 1]
+
+    x = np.frombuffer(x, dtype=np.float64) if not isinstance(x, np.ndarray) else x
+    y = np.frombuffer(y, dtype=np.float64) if not isinstance(y, np.ndarray) else y
+    if mode == "minmax":
+        return minmax_indices(y, points)
+    return lttb_indices(x, y, points)
+
+
+def select_rows(arrays, indices):
+    """Row dicts for `indices` from column arrays ('timestamp' in epoch seconds)"""
+    rows = []
+    names = [n for n in arrays if n != "timestamp"]
+    for i in indices:
+        row = {"timestamp": datetime.fromtimestamp(arrays["timestamp"][i]).isoformat()}
+        for n in names:
+            row[n] = arrays[n][i]
+        rows.append(row)
+    return rows
@@ -0,0 +1,245 @@
+import json
+import os
+import socket
+import threading
+import time
+
+from metrics import RateLimitedLog
+from serial_reader import DropOldestQueue
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard library encoder
+    orjson = None
+
+# Local event bus between the ingest process and the worker processes of a cluster (see cluster.py).
+# One event per line: {"event": "reading", "data": {...}}. An address is a Unix socket path, or
+# host:port for TCP where Unix sockets are missing (Windows).
+DEFAULT_ADDRESS = "sensor_bus.sock" if hasattr(socket, "AF_UNIX") else "127.0.0.1:5098"
+MAX_LINE_BYTES = 1 << 20
+
+
+def parse_address(address):
+    """(family, sockaddr) for a socket path or host:port"""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    if not hasattr(socket, "AF_UNIX"):
+        raise ValueError(f"Bus address '{address}' is a socket path, use host:port on this platform")
+    return socket.AF_UNIX, address
+
+
+def encode_event(event, data=None):
+    message = {"event": event, "data": data}
+    if orjson is not None:
+        return orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+    return json.dumps(message).encode() + b"\n"
+
+
+def decode_event(line):
+    message = orjson.loads(line) if orjson is not None else json.loads(line)
+    return message["event"], message.get("data")
+
+
+class BusPublisher:
+    """Listens on a local socket and sends every published event to each connected subscriber.
+
+    publish() encodes once and only appends to each subscriber's bounded
+    drop-oldest queue; a sender thread per subscriber writes batches, so a
+    slow or stuck worker loses its oldest events (counted in `dropped`)
+    instead of blocking ingest.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, max_pending=10000, log=None):
+        self.address = address
+        self.max_pending = max_pending
+        self.log = log or RateLimitedLog()
+
+        self._lock = threading.Lock()
+        self._subscribers = {}  # connection -> DropOldestQueue
+        self._sock = None
+        self._thread = None
+        self._running = False
+
+        self.published = 0
+        self.connections = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        family, sockaddr = parse_address(self.address)
+        if family != socket.AF_INET and os.path.exists(sockaddr):
+            os.unlink(sockaddr)  # Left over from a process that didn't shut down
+        self._sock = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(sockaddr)
+        self._sock.listen()
+        self._running = True
+        self._thread = threading.Thread(target=self._accept, name="bus-accept")
+        self._thread.daemon = True
+        self._thread.start()
+        print(f"📣 Event bus listening on {self.address}")
+
+    def stop(self, timeout=5):
+        self._running = False
+        if self._sock is not None:
+            self._sock.close()
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+            self._subscribers.clear()
+        for conn, pending in subscribers:
+            pending.offer(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        family, sockaddr = parse_address(self.address)
+        if family != socket.AF_INET and os.path.exists(sockaddr):
+            os.unlink(sockaddr)
+
+    def publish(self, event, data=None):
+        line = encode_event(event, data)
+        with self._lock:
+            queues = list(self._subscribers.values())
+        for pending in queues:
+            pending.offer(line)
+        self.published += 1
+
+    def stats(self):
+        with self._lock:
+            queues = list(self._subscribers.values())
+        return {
+            "address": self.address,
+            "subscribers": len(queues),
+            "connections": self.connections,
+            "published": self.published,
+            "pending": sum(q.qsize() for q in queues),
+            "dropped": sum(q.dropped for q in queues),
+        }
+
+    def _accept(self):
+        while self._running:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                break  # Closed by stop()
+            pending = DropOldestQueue(self.max_pending)
+            with self._lock:
+                self._subscribers[conn] = pending
+                self.connections += 1
+            sender = threading.Thread(target=self._send, args=(conn, pending), name="bus-send")
+            sender.daemon = True
+            sender.start()
+
+    def _send(self, conn, pending):
+        try:
+            while True:
+                batch = [pending.get()]
+                while not pending.empty() and len(batch) < 1000:
+                    batch.append(pending.get_nowait())
+                if None in batch:
+                    break
+                conn.sendall(b"".join(batch))
+        except OSError as e:
+            self.log.warning("bus_send", "⚠️ Event bus subscriber went away: %s", e)
+        finally:
+            with self._lock:
+                self._subscribers.pop(conn, None)
+            conn.close()
+
+
+class BusSubscriber:
+    """Connects to a BusPublisher and calls `handle(event, data)` for every event, on its own thread.
+
+    Reconnects with exponential backoff, so workers may start before the
+    ingest process and survive its restarts (events sent meanwhile are missed).
+    """
+
+    def __init__(self, address, handle, min_backoff=0.2, max_backoff=5.0, log=None):
+        self.address = address
+        self.handle = handle
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.log = log or RateLimitedLog()
+
+        self._sock = None
+        self._thread = None
+        self._running = False
+
+        self.connected = False
+        self.received = 0
+        self.reconnects = 0
+        self.errors = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="bus-subscriber")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._running = False
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        return {
+            "address": self.address,
+            "connected": self.connected,
+            "received": self.received,
+            "reconnects": self.reconnects,
+            "errors": self.errors,
+        }
+
+    def _run(self):
+        backoff = self.min_backoff
+        while self._running:
+            family, sockaddr = parse_address(self.address)
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                sock.connect(sockaddr)
+            except OSError as e:
+                sock.close()
+                self.log.info("bus_connect", "⏳ Waiting for event bus at %s (%s)", self.address, e)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            self._sock = sock
+            self.connected = True
+            backoff = self.min_backoff
+            print(f"📡 Subscribed to event bus at {self.address}")
+            try:
+                self._read(sock)
+            except OSError as e:
+                self.log.warning("bus_read", "⚠️ Event bus connection lost: %s", e)
+            finally:
+                self.connected = False
+                self._sock = None
+                sock.close()
+            if self._running:
+                self.reconnects += 1
+                time.sleep(backoff)
+
+    def _read(self, sock):
+        with sock.makefile("rb") as stream:
+            while self._running:
+                line = stream.readline(MAX_LINE_BYTES)
+                if not line:
+                    return  # Publisher closed the connection
+                try:
+                    event, data = decode_event(line)
+                    self.handle(event, data)
+                except Exception as e:
+                    self.errors += 1
+                    self.log.error("bus_event", "❌ Error handling bus event: %s", e)
+                    continue
+                self.received += 1
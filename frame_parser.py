@@ -0,0 +1,235 @@
+import binascii
+import json
+import struct
+import threading
+from operator import itemgetter
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard library decoder
+    orjson = None
+
+# Frames the Pico firmware may send. All three can share one port; the first byte tells them apart.
+#   JSON    {"CO_IN": 61.2, "CO_OUT": 40.1, "V_bus": 2.71, "current": 281.4, "power": 762.6}\n
+#   CSV     $R,61.2,40.1,2.71,281.4,762.6*4A\n   (fields in SCHEMA order; *XX = optional XOR checksum)
+#   binary  A5 5A | type 0x01 | 5 x float32 LE in SCHEMA order | CRC-16/CCITT of type + floats, LE
+#
+# SCHEMA: Pico field -> (reading field, lowest plausible value, highest plausible value)
+SCHEMA = {
+    "CO_IN": ("co_in", 0.0, 20_000.0),
+    "CO_OUT": ("co_out", 0.0, 20_000.0),
+    "V_bus": ("voltage", -1.0, 40.0),
+    "current": ("current", -10_000.0, 10_000.0),
+    "power": ("power", -400_000.0, 400_000.0),
+}
+
+CSV_PREFIX = b"$R,"
+SYNC = b"\xa5\x5a"
+BINARY_READING = 0x01
+BINARY_FRAME = struct.Struct("<2sB5fH")
+REJECT_REASONS = ("not_a_frame", "bad_json", "bad_checksum", "bad_crc", "missing_field", "bad_type",
+                  "out_of_range")
+
+
+def _xor(data):
+    checksum = 0
+    for byte in data:
+        checksum ^= byte
+    return checksum
+
+
+def _crc(body):
+    return binascii.crc_hqx(body, 0xFFFF)
+
+
+def binary_frame_ok(frame):
+    """True if `frame` is a complete binary frame whose CRC matches"""
+    return (len(frame) == BINARY_FRAME.size and frame[:2] == SYNC
+            and _crc(frame[2:-2]) == int.from_bytes(frame[-2:], "little"))
+
+
+class FrameSplitter:
+    """Splits a serial byte stream into frames: newline-terminated text lines and fixed-size binary frames.
+
+    Bytes that can't belong to a frame (noise before a binary sync, a binary
+    sync whose CRC fails) are skipped one at a time until the stream lines up
+    again, and counted in `resync_bytes`. A line longer than `max_frame` is
+    dropped and counted in `oversized`.
+    """
+
+    def __init__(self, max_frame=1024):
+        self.max_frame = max_frame
+        self._buf = bytearray()
+        self.oversized = 0
+        self.resync_bytes = 0
+
+    def clear(self):
+        self._buf.clear()
+
+    def feed(self, chunk):
+        """Add received bytes; returns the frames completed by them"""
+        buf = self._buf
+        buf += chunk
+        frames = []
+        pos = 0
+        sync = buf.find(SYNC)
+        while True:
+            if 0 <= sync < pos:
+                sync = buf.find(SYNC, pos)
+            end = buf.find(b"\n", pos)
+            if sync >= 0 and (end < 0 or sync < end):
+                if len(buf) - sync < BINARY_FRAME.size:
+                    self.resync_bytes += sync - pos
+                    pos = sync
+                    break  # Wait for the rest of the binary frame
+                frame = bytes(buf[sync:sync + BINARY_FRAME.size])
+                if binary_frame_ok(frame):
+                    self.resync_bytes += sync - pos
+                    frames.append(frame)
+                    pos = sync + BINARY_FRAME.size
+                else:
+                    self.resync_bytes += sync + 1 - pos
+                    pos = sync + 1
+                continue
+            if end < 0:
+                break
+            if end - pos > self.max_frame:
+                self.oversized += 1
+            elif end > pos:
+                frames.append(bytes(buf[pos:end]))
+            pos = end + 1
+        del buf[:pos]
+        if len(buf) > self.max_frame:
+            self.oversized += 1
+            buf.clear()
+        return frames
+
+
+class FrameParser:
+    """Turns frames into reading dicts, validated against SCHEMA.
+
+    parse() never raises: a frame is either a reading or rejected with a
+    reason, and every outcome is counted (see stats()). Text frames with
+    noise in front of the first '{' or '$' are resynchronised onto it.
+    One parser is shared by every device's reader thread, so the counters
+    are only updated under a lock.
+    """
+
+    def __init__(self, schema=SCHEMA):
+        self.keys = tuple(schema)
+        self.fields = tuple(field for field, _, _ in schema.values())
+        self.bounds = tuple((low, high) for _, low, high in schema.values())
+        self._pick = itemgetter(*self.keys)
+        self._loads = orjson.loads if orjson is not None else json.loads
+
+        self._lock = threading.Lock()
+        self.parsed = {"json": 0, "csv": 0, "binary": 0}
+        self.rejected = dict.fromkeys(REJECT_REASONS, 0)
+        self.resynced = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "decoder": "orjson" if orjson is not None else "json",
+                "parsed": dict(self.parsed),
+                "rejected": dict(self.rejected),
+                "resynced": self.resynced,
+            }
+
+    def _reject(self, reason):
+        with self._lock:
+            self.rejected[reason] += 1
+        return None, reason
+
+    def parse(self, frame):
+        """(reading, None) for a valid frame, (None, reason) otherwise"""
+        if frame[:2] == SYNC:
+            return self._binary(frame)
+        frame = frame.strip()
+        first = frame[:1]
+        if first != b"{" and first != b"$":
+            starts = [i for i in (frame.find(b"{"), frame.find(b"$")) if i > 0]
+            if not starts:
+                return self._reject("not_a_frame")
+            with self._lock:
+                self.resynced += 1
+            frame = frame[min(starts):]
+            first = frame[:1]
+        if first == b"{":
+            return self._json(frame)
+        return self._csv(frame)
+
+    def _validated(self, values, kind):
+        for value, (low, high) in zip(values, self.bounds):
+            if not low <= value <= high:  # NaN fails too
+                return self._reject("out_of_range")
+        with self._lock:
+            self.parsed[kind] += 1
+        return dict(zip(self.fields, values)), None
+
+    def _json(self, frame):
+        try:
+            data = self._loads(frame)
+        except ValueError:  # Includes invalid UTF-8 and orjson.JSONDecodeError
+            return self._reject("bad_json")
+        if type(data) is not dict:
+            return self._reject("bad_json")
+        try:
+            values = self._pick(data)
+        except KeyError:
+            return self._reject("missing_field")
+        for value in values:
+            if type(value) is not float and type(value) is not int:
+                return self._reject("bad_type")
+        return self._validated(values, "json")
+
+    def _csv(self, frame):
+        body, star, checksum = frame.partition(b"*")
+        if star:
+            try:
+                if int(checksum, 16) != _xor(body[1:]):
+                    return self._reject("bad_checksum")
+            except ValueError:
+                return self._reject("bad_checksum")
+        if not body.startswith(CSV_PREFIX):
+            return self._reject("not_a_frame")
+        parts = body[len(CSV_PREFIX):].split(b",")
+        if len(parts) != len(self.keys):
+            return self._reject("missing_field")
+        try:
+            values = tuple(float(p) for p in parts)
+        except ValueError:
+            return self._reject("bad_type")
+        return self._validated(values, "csv")
+
+    def _binary(self, frame):
+        if not binary_frame_ok(frame):
+            return self._reject("bad_crc")
+        _, kind, *values = BINARY_FRAME.unpack(frame)[:-1]
+        if kind != BINARY_READING:
+            return self._reject("not_a_frame")
+        return self._validated(tuple(values), "binary")
+
+
+# Encoders, for the simulator and as the reference for firmware -------------------
+
+def _values(reading, schema=SCHEMA):
+    return [reading[field] for field, _, _ in schema.values()]
+
+
+def encode_json(reading):
+    return json.dumps(dict(zip(SCHEMA, _values(reading)))).encode() + b"\n"
+
+
+def encode_csv(reading):
+    body = CSV_PREFIX + b",".join(str(v).encode() for v in _values(reading))
+    return body + b"*%02X\n" % _xor(body[1:])
+
+
+def encode_binary(reading):
+    values = _values(reading)
+    body = struct.pack("<B5f", BINARY_READING, *values)
+    return SYNC + body + _crc(body).to_bytes(2, "little")
+
+
+ENCODERS = {"json": encode_json, "csv": encode_csv, "binary": encode_binary}
@@ -0,0 +1,240 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import RateLimitedLog
+from sensor_db import load_spool_position, save_spool_position
+
+_WAKE = object()  # Queued by call() so a pending job doesn't wait for the next reading
+
+
+class IngestWriter:
+    """Queue parsed readings and write them to SQLite in batched transactions.
+
+    The writer owns its own connection and runs on its own thread, so callers
+    only pay for a queue put. A batch is flushed with one executemany + commit
+    as soon as either `batch_rows` readings are queued or `batch_ms`
+    milliseconds have passed since the first queued reading.
+
+    It is the process's only writer: other writes go through call(), which
+    runs them on the writer thread between batches. `timer(stage, seconds)`,
+    if given, is told how long each batch took to commit ("db_write").
+
+    With a `spool`, rows are appended to it instead of the in-memory queue and
+    batches are read back from it; each commit also stores the spool position,
+    so a batch that fails (or is cut short by a crash) is retried every
+    `retry_ms` until the database takes it, rather than dropped.
+    """
+
+    def __init__(self, db_path, write_batch, batch_rows=200, batch_ms=250, max_queue=10000, on_flush=None,
+                 timer=None, log=None, spool=None, retry_ms=1000):
+        self.db_path = db_path
+        self.write_batch = write_batch  # write_batch(conn, rows) -> None
+        self.on_flush = on_flush  # on_flush(rows) after each committed batch
+        self.timer = timer
+        self.log = log or RateLimitedLog()
+        self.batch_rows = batch_rows
+        self.batch_ms = batch_ms
+        self.spool = spool
+        self.retry_ms = retry_ms
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.jobs = queue.Queue()
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self._started_at = None
+
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.rows_failed = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        if self.spool is not None:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                self.spool.open(load_spool_position(conn))  # Uncommitted records are written first
+            finally:
+                conn.close()
+        self._running = True
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="ingest-writer")
+        self._thread.daemon = True
+        self._thread.start()
+        print(f"💾 Ingest writer started (batch={self.batch_rows} rows / {self.batch_ms} ms)")
+
+    def stop(self, timeout=5):
+        """Flush whatever is queued and stop the writer thread"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, row):
+        """Queue (or spool) one row for writing. Never blocks; returns False if the row was dropped."""
+        if self.spool is not None:
+            if self.spool.append(row):
+                return True
+            with self._lock:
+                self.rows_dropped += 1
+            return False
+        try:
+            self.queue.put_nowait(row)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.rows_dropped += 1
+            return False
+
+    def call(self, fn):
+        """Run fn(conn) in its own transaction on the writer thread; returns a Future of its result"""
+        future = Future()
+        self.jobs.put((fn, future))
+        if self.spool is not None:
+            self.spool.wake()
+            return future
+        try:
+            self.queue.put_nowait(_WAKE)
+        except queue.Full:
+            pass  # The writer is busy with readings and will get to the job after this batch
+        return future
+
+    def stats(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0
+            return {
+                "queue_depth": self.spool.pending() if self.spool is not None else self.queue.qsize(),
+                "pending_jobs": self.jobs.qsize(),
+                "rows_written": self.rows_written,
+                "rows_dropped": self.rows_dropped,
+                "rows_failed": self.rows_failed,
+                "flushes": self.flushes,
+                "flush_errors": self.flush_errors,
+                "last_flush_ms": round(self.last_flush_ms, 3),
+                "max_flush_ms": round(self.max_flush_ms, 3),
+                "avg_flush_ms": round(self.total_flush_ms / self.flushes, 3) if self.flushes else 0,
+                "avg_batch_rows": round(self.rows_written / self.flushes, 1) if self.flushes else 0,
+                "rows_per_sec": round(self.rows_written / elapsed, 2) if elapsed else 0,
+                "spool": self.spool.stats() if self.spool is not None else None,
+            }
+
+    def _next_batch(self):
+        """Block for the first row, then collect until the batch is full or its deadline passes"""
+        if self.spool is not None:
+            return self._next_spool_batch()
+        try:
+            first = self.queue.get(timeout=0.5)
+        except queue.Empty:
+            return [], None
+        if first is _WAKE:
+            return [], None
+
+        batch = [first]
+        deadline = time.monotonic() + self.batch_ms / 1000
+        while len(batch) < self.batch_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                row = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if row is _WAKE:
+                break  # Commit what we have and run the job
+            batch.append(row)
+        return batch, None
+
+    def _next_spool_batch(self):
+        """The same from the spool: (rows, spool position after them)"""
+        self.spool.wait(1, 0.5)
+        if not self.spool.pending() or not self.jobs.empty():
+            return [], None
+        self.spool.wait(self.batch_rows, self.batch_ms / 1000)
+        return self.spool.read(self.batch_rows)
+
+    def _flush(self, conn, batch, end=None):
+        """Commit a batch; returns False if it failed"""
+        started = time.perf_counter()
+        try:
+            with conn:  # one transaction per batch
+                self.write_batch(conn, batch)
+                if end is not None:
+                    save_spool_position(conn, end)
+        except Exception as e:  # Not only sqlite3.Error: anything write_batch raises must not kill the thread
+            with self._lock:
+                self.flush_errors += 1
+                if end is None:
+                    self.rows_failed += len(batch)
+            if end is None:
+                self.log.error("write", "❌ Ingest writer failed to save %d readings: %s", len(batch), e)
+            else:
+                self.log.error("write", "❌ Ingest writer failed to save %d readings, retrying from the spool: %s",
+                               len(batch), e)
+            return False
+        if end is not None:
+            self.spool.commit(end)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.rows_written += len(batch)
+            self.flushes += 1
+            self.last_flush_ms = elapsed_ms
+            self.total_flush_ms += elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        if self.timer is not None:
+            self.timer("db_write", elapsed_ms / 1000)
+        if self.on_flush is not None:
+            try:
+                self.on_flush(batch)
+            except Exception as e:  # The batch is committed either way
+                self.log.error("on_flush", "❌ Ingest writer flush callback failed: %s", e)
+        return True
+
+    def _run_jobs(self, conn):
+        while True:
+            try:
+                fn, future = self.jobs.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with conn:
+                    result = fn(conn)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)  # Only once committed, so callers can read what the job wrote
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            while self._running or not self.queue.empty() or not self.jobs.empty() or (
+                    self.spool is not None and self.spool.pending()):
+                try:
+                    batch, end = self._next_batch()
+                except Exception as e:  # A spool read that fails must not stop persistence for good
+                    self.log.error("read", "❌ Ingest writer failed to read the next batch: %s", e)
+                    time.sleep(self.retry_ms / 1000)
+                    continue
+                if batch or end is not None:
+                    if not self._flush(conn, batch, end) and end is not None:
+                        if not self._running:
+                            break  # Still failing at shutdown; the spool keeps the rest for the next start
+                        time.sleep(self.retry_ms / 1000)
+                if self.spool is not None:
+                    self.spool.sync()
+                self._run_jobs(conn)
+        finally:
+            conn.close()
+            if self.spool is not None:
+                self.spool.close()
@@ -0,0 +1,182 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, request
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"  # Prometheus text exposition format
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                 0.1, 0.25, 1.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values (seconds) per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labelvalues -> [per-bucket counts (last one +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = [(labelvalues, list(counts), total) for labelvalues, (counts, total) in self._series.items()]
+        for labelvalues, counts, total in series:
+            labels = dict(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for le, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _number(le)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+    """Histograms updated on the hot paths, plus collectors read at scrape time.
+
+    Counters, queue depths and client counts already live in the components'
+    stats() methods; collectors turn those into metric families when /metrics
+    is scraped instead of duplicating them on every reading.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """Register fn() -> iterable of (name, kind, help, [(labels, value), ...]); usable as a decorator"""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{_labels(labels)} {_number(value)}" for name, labels, value in metric.samples())
+        for collect in self._collectors:
+            for name, kind, help, samples in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+    def instrument(self, app, path="/metrics"):
+        """Time every Flask request by route, method and status, and serve the registry at `path`"""
+        latency = self.histogram("http_request_duration_seconds", "Flask request latency by route",
+                                 ("route", "method", "status"))
+
+        @app.before_request
+        def start_timer():
+            g.metrics_started = time.perf_counter()
+
+        @app.after_request
+        def observe_request(response):
+            started = g.pop("metrics_started", None)
+            if started is not None:
+                # Streamed responses (CSV exports) are timed up to their first byte
+                route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+                latency.observe(time.perf_counter() - started, route, request.method, str(response.status_code))
+            return response
+
+        app.add_url_rule(path, "metrics", lambda: Response(self.render(), content_type=CONTENT_TYPE))
+        return latency
+
+
+def stats_families(prefix, stats, counters=(), gauges=(), label=None):
+    """Metric families from a component's stats() dict, or from {label value: stats dict} when `label` is given"""
+    rows = list(stats.items()) if label else [(None, stats)]
+    for kind, fields in (("counter", counters), ("gauge", gauges)):
+        for field in fields:
+            samples = [({label: key} if label else {}, s[field]) for key, s in rows if field in s]
+            if samples:
+                name = f"{prefix}_{field}_total" if kind == "counter" else f"{prefix}_{field}"
+                yield name, kind, f"{field.replace('_', ' ').capitalize()} ({prefix})", samples
+
+
+class RateLimitedLog:
+    """Levelled logging through `logger`, at most once per `interval` seconds per key.
+
+    Hot paths log per reading or per bad frame; sampling those here keeps a
+    slow console from throttling ingest. Calls below the logger's level return
+    before the message is formatted, and suppressed calls are counted and
+    reported with the next line that gets through.
+    """
+
+    def __init__(self, interval=5.0, logger=None):
+        self.interval = interval
+        self.logger = logger or logging.getLogger("sensor")
+        self._last = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, key, message, *args, level=logging.INFO):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last.get(key, float("-inf")) < self.interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            message, args = message + " (+%d similar)", args + (suppressed,)
+        self.logger.log(level, message, *args)
+
+    def debug(self, key, message, *args):
+        self(key, message, *args, level=logging.DEBUG)
+
+    def info(self, key, message, *args):
+        self(key, message, *args, level=logging.INFO)
+
+    def warning(self, key, message, *args):
+        self(key, message, *args, level=logging.WARNING)
+
+    def error(self, key, message, *args):
+        self(key, message, *args, level=logging.ERROR)
+
+
+def configure_logging(level=None):
+    """Log to stderr at `level`, or LOG_LEVEL (INFO by default); DEBUG shows sampled per-reading lines"""
+    logging.basicConfig(level=(level or os.environ.get("LOG_LEVEL", "INFO")).upper(),
+                        format="%(asctime)s %(levelname)s %(message)s")
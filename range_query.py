@@ -0,0 +1,133 @@
+import re
+
+try:
+    import numpy as np
+except ImportError:  # In-memory aggregation needs NumPy; the SQL path does not
+    np = None
+
+# Bucketed aggregates over a time range, for /query:
+#   ?from=&to=&bucket=1m&metrics=co_in,efficiency&agg=avg,p95
+# Buckets are aligned to the epoch (whole UTC seconds/minutes/hours/days) and only non-empty ones
+# are returned. The result is columnar: one list per metric and aggregate, index-aligned with ts_ms.
+QUERY_METRICS = ("co_in", "co_out", "efficiency", "voltage", "current", "power", "anomaly_score", "anomaly")
+AGGREGATES = ("min", "max", "avg", "sum", "p95", "count")
+BUCKET_UNITS = {"ms": 1, "s": 1000, "m": 60_000, "h": 3_600_000, "d": 86_400_000}
+MAX_BUCKETS = 10_000  # Past this, ask for a wider bucket rather than ship a raw dump
+SQL_AGGREGATES = {"min": "MIN({})", "max": "MAX({})", "avg": "AVG({})", "sum": "SUM({})", "p95": "p95({})"}
+
+
+def parse_bucket(text):
+    """Bucket width in ms from e.g. '1s', '15m', '1h'"""
+    match = re.fullmatch(r"(\d+)(ms|s|m|h|d)", text.strip())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid bucket '{text}', use e.g. 1s, 1m, 15m, 1h or 1d")
+    return int(match.group(1)) * BUCKET_UNITS[match.group(2)]
+
+
+def _parse_list(args, name, available, default):
+    requested = [v.strip() for v in args.get(name, default).split(",") if v.strip()]
+    unknown = [v for v in requested if v not in available]
+    if unknown or not requested:
+        raise ValueError(f"Unknown {name}: {', '.join(unknown) or '(none)'}; use {', '.join(available)}")
+    return list(dict.fromkeys(requested))
+
+
+def parse_query(args):
+    """(bucket_ms, metrics, aggregates) from the bucket/metrics/agg query parameters"""
+    bucket_ms = parse_bucket(args.get("bucket", "1m"))
+    metrics = _parse_list(args, "metrics", QUERY_METRICS, "co_in,co_out,efficiency,power")
+    aggregates = _parse_list(args, "agg", AGGREGATES, "avg")
+    return bucket_ms, metrics, aggregates
+
+
+def check_buckets(from_ms, to_ms, bucket_ms):
+    buckets = (to_ms - from_ms) // bucket_ms + 1
+    if buckets > MAX_BUCKETS:
+        raise ValueError(f"{buckets} buckets of {bucket_ms} ms in range (max {MAX_BUCKETS}), use a wider bucket")
+
+
+def _p95_sorted(values):
+    """95th percentile of a sorted list, interpolated linearly between ranks like numpy.percentile"""
+    rank = 0.95 * (len(values) - 1)
+    lo = int(rank)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (rank - lo)
+
+
+class P95:
+    """SQLite aggregate p95(x); NULLs are ignored like in the built-in aggregates"""
+
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(value)
+
+    def finalize(self):
+        if not self.values:
+            return None
+        self.values.sort()
+        return _p95_sorted(self.values)
+
+
+def _result(bucket_ms, ts_ms, count, columns, metrics, aggregates):
+    result = {"bucket_ms": bucket_ms, "ts_ms": ts_ms}
+    if "count" in aggregates:
+        result["count"] = count
+    for m in metrics:
+        result[m] = {a: columns[m, a] for a in aggregates if a != "count"}
+    return result
+
+
+def sql_query(db, from_ms, to_ms, bucket_ms, metrics, aggregates, device_id=None):
+    """Aggregates of the readings table in [from_ms, to_ms) as one GROUP BY over the ts_ms index"""
+    check_buckets(from_ms, to_ms, bucket_ms)
+    db.create_aggregate("p95", 1, P95)
+    keys = [(m, a) for m in metrics for a in aggregates if a != "count"]
+    select = ["ts_ms / :bucket * :bucket", "COUNT(*)"] + [SQL_AGGREGATES[a].format(m) for m, a in keys]
+    params = {"bucket": bucket_ms, "from_ms": from_ms, "to_ms": to_ms, "device_id": device_id}
+    rows = db.execute(f"""
+        SELECT {", ".join(select)}
+        FROM readings
+        WHERE ts_ms >= :from_ms AND ts_ms < :to_ms {"AND device_id = :device_id" if device_id is not None else ""}
+        GROUP BY ts_ms / :bucket
+        ORDER BY 1
+    """, params).fetchall()
+    columns = {key: [row[i + 2] for row in rows] for i, key in enumerate(keys)}
+    return _result(bucket_ms, [row[0] for row in rows], [row[1] for row in rows], columns, metrics, aggregates)
+
+
+def numpy_query(arrays, bucket_ms, metrics, aggregates):
+    """The same aggregates over column arrays ('timestamp' in epoch seconds, sorted), vectorized per bucket"""
+    if np is None:
+        raise ValueError("Aggregating in-memory readings needs NumPy")
+    ts_ms = np.rint(np.asarray(arrays["timestamp"], dtype=np.float64) * 1000).astype(np.int64)
+    if not len(ts_ms):
+        return _result(bucket_ms, [], [], {(m, a): [] for m in metrics for a in aggregates}, metrics, aggregates)
+    check_buckets(int(ts_ms[0]), int(ts_ms[-1]), bucket_ms)
+
+    buckets = ts_ms // bucket_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(buckets)])
+    columns = {}
+    for m in metrics:
+        values = np.asarray(arrays[m], dtype=np.float64)
+        if "min" in aggregates:
+            columns[m, "min"] = np.minimum.reduceat(values, starts)
+        if "max" in aggregates:
+            columns[m, "max"] = np.maximum.reduceat(values, starts)
+        if "sum" in aggregates or "avg" in aggregates:
+            sums = np.add.reduceat(values, starts)
+            columns[m, "sum"] = sums
+            columns[m, "avg"] = sums / counts
+        if "p95" in aggregates:
+            # Sort values within each bucket at once, then interpolate between ranks per bucket
+            ordered = values[np.lexsort((values, buckets))]
+            rank = 0.95 * (counts - 1)
+            lo = np.floor(rank).astype(np.int64)
+            hi = np.minimum(lo + 1, counts - 1)
+            low, high = ordered[starts + lo], ordered[starts + hi]
+            columns[m, "p95"] = low + (high - low) * (rank - lo)
+    columns = {key: values.tolist() for key, values in columns.items()}
+    return _result(bucket_ms, (buckets[starts] * bucket_ms).tolist(), counts.tolist(), columns, metrics, aggregates)
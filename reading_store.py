@@ -0,0 +1,360 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:  # Multi-device merges fall back to sorting in Python
+    np = None
+
+NUMERIC_FIELDS = ("co_in", "co_out", "efficiency", "predicted_efficiency", "voltage", "current", "power",
+                  "anomaly_score")
+LABEL_FIELDS = ("recommendation",)
+DEVICE_LABEL_FIELDS = ("recommendation", "device_id", "vehicle")
+
+
+def typecode(field, label_fields=LABEL_FIELDS):
+    """array typecode a field is stored with"""
+    if field == "anomaly":
+        return 'b'
+    if field in label_fields:
+        return 'H'
+    return 'd'
+
+
+class _TimeIndex:
+    """Sequence view of the timestamp column in logical (oldest first) order, for bisect"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return self.store.size
+
+    def __getitem__(self, i):
+        return self.store._ts[self.store._physical(i)]
+
+
+class ReadingStore:
+    """Fixed-capacity, column-oriented ring buffer of sensor readings.
+
+    Each numeric field is an array('d') of `capacity` slots, anomaly is a byte
+    per reading and string fields (recommendation, vehicle) are interned to
+    small integer codes. Appends are O(1) and overwrite the oldest reading once
+    the store is full, so memory stays flat no matter how long the process runs.
+    """
+
+    def __init__(self, capacity=100_000, numeric_fields=NUMERIC_FIELDS, label_fields=LABEL_FIELDS, stats=None):
+        self.capacity = capacity
+        self.numeric_fields = tuple(numeric_fields)
+        self.label_fields = tuple(label_fields)
+        self.stats = stats  # Optional RunningStats fed on every append
+
+        self._ts = array('d', bytes(8 * capacity))
+        self._columns = {f: array('d', bytes(8 * capacity)) for f in self.numeric_fields}
+        self._anomaly = array('b', bytes(capacity))
+        self._labels = {f: array('H', bytes(2 * capacity)) for f in self.label_fields}
+        self._label_values = {f: [] for f in self.label_fields}
+        self._label_codes = {f: {} for f in self.label_fields}
+
+        self._lock = threading.Lock()
+        self._next = 0     # Physical slot the next append goes into
+        self.size = 0
+        self.total = 0     # Readings appended over the store's lifetime
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def fields(self):
+        return ("timestamp",) + self.numeric_fields + ("anomaly",) + self.label_fields
+
+    def _physical(self, i):
+        """Physical slot of logical index i (0 = oldest retained reading)"""
+        return (self._next - self.size + i) % self.capacity
+
+    def _code(self, field, value):
+        codes = self._label_codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self._label_values[field])
+            self._label_values[field].append(value)
+        return code
+
+    def append(self, reading):
+        """Store one reading dict (ISO `timestamp`, numeric fields, `anomaly`, labels)"""
+        ts = datetime.fromisoformat(reading["timestamp"]).timestamp()
+        with self._lock:
+            slot = self._next
+            self._ts[slot] = ts
+            for f in self.numeric_fields:
+                self._columns[f][slot] = reading.get(f, 0)
+            self._anomaly[slot] = int(reading.get("anomaly", 0))
+            for f in self.label_fields:
+                value = reading.get(f)  # None for e.g. a device without a vehicle
+                self._labels[f][slot] = self._code(f, "" if value is None else value)
+            self._next = (slot + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+            self.total += 1
+        if self.stats is not None:
+            self.stats.add(reading)
+
+    def _row(self, slot):
+        row = {"timestamp": datetime.fromtimestamp(self._ts[slot]).isoformat()}
+        for f in self.numeric_fields:
+            row[f] = self._columns[f][slot]
+        row["anomaly"] = self._anomaly[slot]
+        for f in self.label_fields:
+            row[f] = self._label_values[f][self._labels[f][slot]]
+        return row
+
+    def latest(self):
+        with self._lock:
+            return self._row(self._physical(self.size - 1)) if self.size else None
+
+    def index_since(self, ts):
+        """Logical index of the first reading at or after epoch seconds `ts` (O(log n))"""
+        with self._lock:
+            return bisect_left(_TimeIndex(self), ts)
+
+    def _rows(self, start, stop):
+        stop = self.size if stop is None else min(stop, self.size)
+        return [self._row(self._physical(i)) for i in range(max(start, 0), stop)]
+
+    def rows(self, start=0, stop=None):
+        """Reading dicts for logical indexes [start, stop), oldest first"""
+        with self._lock:
+            return self._rows(start, stop)
+
+    def last(self, n):
+        with self._lock:
+            return self._rows(self.size - n, None)
+
+    def since(self, ts):
+        """Reading dicts at or after epoch seconds `ts`"""
+        with self._lock:
+            return self._rows(bisect_left(_TimeIndex(self), ts), None)
+
+    def _getter(self, field):
+        """slot -> value accessor for one field, as it appears in row dicts"""
+        if field == "timestamp":
+            ts = self._ts
+            return lambda slot: datetime.fromtimestamp(ts[slot]).isoformat()
+        if field == "anomaly":
+            return self._anomaly.__getitem__
+        if field in self._columns:
+            return self._columns[field].__getitem__
+        codes, values = self._labels[field], self._label_values[field]
+        return lambda slot: values[codes[slot]]
+
+    def chunks(self, fields, from_ts=None, to_ts=None, size=1000):
+        """Yield lists of row tuples for readings in [from_ts, to_ts), oldest first.
+
+        The lock is only held while one chunk is copied out, so a long export
+        never stalls appends; readings overwritten mid-export are skipped.
+        """
+        getters = [self._getter(f) for f in fields]
+        with self._lock:
+            start = bisect_left(_TimeIndex(self), from_ts) if from_ts is not None else 0
+            pos = self.total - self.size + start  # Absolute reading number; lives in slot pos % capacity
+            stop = self.total  # Readings appended after the export started are not included
+        while pos < stop:
+            with self._lock:
+                pos = max(pos, self.total - self.size)
+                end = min(stop, pos + size)
+                rows = []
+                for n in range(pos, end):
+                    slot = n % self.capacity
+                    if to_ts is not None and self._ts[slot] >= to_ts:
+                        end = n
+                        break
+                    rows.append(tuple(get(slot) for get in getters))
+            if rows:
+                yield rows
+            if end < pos + size:
+                return
+            pos = end
+
+    def _column(self, field):
+        if field == "timestamp":
+            return self._ts
+        if field == "anomaly":
+            return self._anomaly
+        if field in self._labels:
+            return self._labels[field]
+        return self._columns[field]
+
+    def _segments(self, column, start, stop):
+        """Memoryview segments of logical [start, stop) of a column (caller holds the lock)"""
+        stop = self.size if stop is None else min(stop, self.size)
+        start = max(start, 0)
+        mv = memoryview(column)
+        if start >= stop:
+            return [mv[0:0]]
+        first = self._physical(start)
+        count = stop - start
+        if first + count <= self.capacity:
+            return [mv[first:first + count]]
+        return [mv[first:], mv[:first + count - self.capacity]]
+
+    def view(self, field, start=0, stop=None):
+        """Zero-copy memoryview segments (one, or two if the range wraps) of a column.
+
+        `field` is "timestamp" (epoch seconds), "anomaly", a numeric field or a
+        label field (interned codes). Views alias the live buffers, so consume
+        them before further appends.
+        """
+        column = self._column(field)
+        with self._lock:
+            return self._segments(column, start, stop)
+
+    def _range(self, from_ts, to_ts):
+        """Logical [start, stop) of readings in [from_ts, to_ts) (caller holds the lock)"""
+        index = _TimeIndex(self)
+        start = bisect_left(index, from_ts) if from_ts is not None else 0
+        stop = bisect_left(index, to_ts) if to_ts is not None else self.size
+        return start, stop
+
+    def _copy(self, column, start, stop):
+        out = array(column.typecode)
+        for segment in self._segments(column, start, stop):
+            out.frombytes(segment.cast('B'))
+        return out
+
+    def column_arrays(self, fields, from_ts=None, to_ts=None):
+        """Copy readings in [from_ts, to_ts) out column by column as contiguous arrays.
+
+        Returns (arrays, labels): timestamp is epoch seconds array('d'), anomaly
+        array('b'), label fields are array('H') codes with their string values
+        in labels[field].
+        """
+        arrays, labels = {}, {}
+        with self._lock:
+            start, stop = self._range(from_ts, to_ts)
+            for f in fields:
+                arrays[f] = self._copy(self._column(f), start, stop)
+                if f in self._labels:
+                    labels[f] = list(self._label_values[f])
+        return arrays, labels
+
+    def rescore(self, fields, score, from_ts=None, to_ts=None):
+        """Recompute derived columns of readings in [from_ts, to_ts) in place.
+
+        `score(arrays)` gets the `fields` as column arrays and returns
+        {field: values} for numeric fields or anomaly. The lock is held
+        throughout so no reading is overwritten half way; running stats are
+        not revised. Returns the number of readings rescored.
+        """
+        with self._lock:
+            start, stop = self._range(from_ts, to_ts)
+            results = score({f: self._copy(self._column(f), start, stop) for f in fields})
+            for f, values in results.items():
+                column = self._column(f)
+                pos = 0
+                for segment in self._segments(column, start, stop):
+                    segment[:] = array(column.typecode, values[pos:pos + len(segment)])
+                    pos += len(segment)
+        return max(stop - start, 0)
+
+
+class DeviceStores:
+    """One ReadingStore per device_id, created on first use.
+
+    Partitioning keeps per-device queries proportional to that device's data;
+    queries without a device merge the partitions by timestamp.
+    """
+
+    def __init__(self, capacity=100_000, label_fields=DEVICE_LABEL_FIELDS, make_stats=None):
+        self.capacity = capacity
+        self.label_fields = label_fields
+        self.make_stats = make_stats  # Optional factory for a per-device RunningStats
+        self.stores = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(s) for s in list(self.stores.values()))
+
+    def get(self, device_id):
+        store = self.stores.get(device_id)
+        if store is None:
+            with self._lock:
+                store = self.stores.get(device_id)
+                if store is None:
+                    stats = self.make_stats() if self.make_stats else None
+                    store = self.stores[device_id] = ReadingStore(self.capacity, label_fields=self.label_fields,
+                                                                  stats=stats)
+        return store
+
+    def append(self, reading):
+        self.get(reading["device_id"]).append(reading)
+
+    def _selected(self, device_id):
+        if device_id is None:
+            return list(self.stores.values())
+        store = self.stores.get(device_id)
+        return [store] if store is not None else []
+
+    def latest(self, device_id=None):
+        rows = [r for r in (s.latest() for s in self._selected(device_id)) if r]
+        return max(rows, key=lambda r: r["timestamp"]) if rows else None
+
+    def last(self, n, device_id=None):
+        merged = list(heapq.merge(*(s.last(n) for s in self._selected(device_id)), key=lambda r: r["timestamp"]))
+        return merged[-n:]
+
+    def stats(self, device_id=None):
+        """The RunningStats of each selected device"""
+        return [s.stats for s in self._selected(device_id) if s.stats is not None]
+
+    @property
+    def fields(self):
+        return ("timestamp",) + NUMERIC_FIELDS + ("anomaly",) + self.label_fields
+
+    def chunks(self, fields, from_ts=None, to_ts=None, size=1000, device_id=None):
+        """ReadingStore.chunks() over the selected devices, one device after another"""
+        for store in self._selected(device_id):
+            yield from store.chunks(fields, from_ts, to_ts, size)
+
+    def rescore(self, fields, score, from_ts=None, to_ts=None, device_id=None):
+        """ReadingStore.rescore() for each selected device separately"""
+        return sum(store.rescore(fields, score, from_ts, to_ts) for store in self._selected(device_id))
+
+    def column_arrays(self, fields, from_ts=None, to_ts=None, device_id=None):
+        """ReadingStore.column_arrays() over the selected devices, merged in timestamp order"""
+        parts = [store.column_arrays(fields, from_ts, to_ts) for store in self._selected(device_id)]
+        if len(parts) == 1:
+            return parts[0]
+
+        labels = {f: [] for f in fields if f in self.label_fields}
+        codes = {f: {} for f in labels}
+        tables = []  # Per part: label field -> old code -> shared code
+        for _, part_labels in parts:
+            # Re-intern each device's label codes into one shared table
+            tables.append({f: [codes[f].setdefault(v, len(codes[f])) for v in part_labels[f]] for f in labels})
+        for f in labels:
+            labels[f] = list(codes[f])
+
+        if np is None:
+            arrays = {f: array(typecode(f, self.label_fields)) for f in fields}
+            for (part_arrays, _), table in zip(parts, tables):
+                for f in fields:
+                    arrays[f].extend((table[f][c] for c in part_arrays[f]) if f in labels else part_arrays[f])
+            if "timestamp" in arrays:
+                ts = arrays["timestamp"]
+                order = sorted(range(len(ts)), key=ts.__getitem__)
+                arrays = {f: array(a.typecode, (a[i] for i in order)) for f, a in arrays.items()}
+            return arrays, labels
+
+        columns = {}
+        for f in fields:
+            code = typecode(f, self.label_fields)
+            values = [np.frombuffer(part_arrays[f], dtype=code) for part_arrays, _ in parts]
+            if f in labels:
+                values = [np.array(table[f], dtype=code)[v] for v, table in zip(values, tables)]
+            columns[f] = np.concatenate(values) if values else np.empty(0, dtype=code)
+        if "timestamp" in columns:
+            order = np.argsort(columns["timestamp"], kind="stable")
+            columns = {f: values[order] for f, values in columns.items()}
+        return {f: array(typecode(f, self.label_fields), values.tobytes()) for f, values in columns.items()}, labels
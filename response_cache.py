@@ -0,0 +1,98 @@
+import functools
+import hashlib
+import threading
+
+from flask import make_response, request
+
+
+class ResponseCache:
+    """Serialized responses of read endpoints, valid until the next reading.
+
+    Entries are keyed by path, query string and Accept header and hold the
+    response body bytes plus a content ETag. Every new reading bumps a version
+    counter, which invalidates all entries at once; until then any number of
+    pollers is served the stored bytes, and clients sending If-None-Match get a
+    304. Concurrent misses on one key wait for a single computation.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.version = 0
+        self._entries = {}  # key -> (version, status, headers, body, etag)
+        self._computing = {}  # key -> lock held while that key is recomputed
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def bump(self, *args):
+        """Invalidate every entry (accepts and ignores callback arguments)"""
+        with self._lock:
+            self.version += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+            }
+
+    def _key(self):
+        return request.path, request.query_string, request.headers.get("Accept", "")
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == self.version:
+                self.hits += 1
+                return entry
+        return None
+
+    def _compute(self, view, args, kwargs):
+        version = self.version  # Read first: a reading arriving mid-computation must not be cached over
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.is_streamed:
+            return None, response
+        body = response.get_data()
+        etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        headers = [(k, v) for k, v in response.headers if k.lower() not in ("content-length", "etag")]
+        return (version, response.status_code, headers, body, etag), response
+
+    def cached(self, view):
+        """Decorator for a Flask view whose answer only changes when a reading arrives"""
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = self._key()
+            entry = self._lookup(key)
+            if entry is None:
+                with self._lock:
+                    computing = self._computing.setdefault(key, threading.Lock())
+                with computing:
+                    entry = self._lookup(key)  # Another request may have just computed it
+                    if entry is None:
+                        entry, response = self._compute(view, args, kwargs)
+                        with self._lock:
+                            self.misses += 1
+                            self._computing.pop(key, None)
+                            if entry is None:
+                                return response
+                            self._entries.pop(key, None)
+                            self._entries[key] = entry
+                            while len(self._entries) > self.max_entries:
+                                self._entries.pop(next(iter(self._entries)))  # Oldest insertion first
+
+            _, status, headers, body, etag = entry
+            response = make_response(body, status, headers)
+            response.set_etag(etag)
+            response.make_conditional(request)
+            if response.status_code == 304:
+                with self._lock:
+                    self.not_modified += 1
+            return response
+
+        return wrapper
@@ -0,0 +1,100 @@
+import itertools
+import threading
+import time
+from collections import deque
+
+
+class ResumeBacklog:
+    """Per-device sequence numbers and the last readings of each device, for clients that reconnect.
+
+    stamp() gives every reading a `seq` one higher than the device's previous
+    one and keeps it; since(device, seq) returns the kept readings after `seq`,
+    or None when they no longer cover it (evicted, or from before a restart),
+    in which case the client has to refetch in full. Numbering starts at the
+    server's start time in microseconds, so sequence numbers keep increasing
+    across restarts (a device would need a million readings a second to catch
+    up) while staying dense, and safe as JavaScript numbers, within one run.
+    Cluster workers follow() the ingest process's numbering instead; a gap
+    (a dropped bus event or an ingest restart) discards what they had kept.
+    """
+
+    def __init__(self, size=5000, start=None):
+        self.size = size
+        self.start = time.time_ns() // 1000 if start is None else start
+
+        self._lock = threading.Lock()
+        self._readings = {}  # device_id -> deque of readings, oldest first
+        self._floor = {}  # device_id -> seq of the last reading no longer kept
+        self._last = {}  # device_id -> seq of the newest reading
+
+        self.resumed = 0
+        self.replayed = 0
+        self.missed = 0
+
+    def stamp(self, reading):
+        """Number a new reading (sets reading["seq"]) and keep it"""
+        device = reading["device_id"]
+        with self._lock:
+            reading["seq"] = self._last.get(device, self.start) + 1
+            self._keep(device, reading)
+
+    def follow(self, reading):
+        """Keep a reading numbered by another process"""
+        device, seq = reading["device_id"], reading["seq"]
+        with self._lock:
+            if self._last.get(device) != seq - 1:
+                self._readings.pop(device, None)
+                self._floor[device] = seq - 1
+            self._keep(device, reading)
+
+    def _keep(self, device, reading):
+        kept = self._readings.get(device)
+        if kept is None:
+            kept = self._readings[device] = deque(maxlen=self.size)
+            self._floor.setdefault(device, reading["seq"] - 1)
+        if len(kept) == self.size:
+            self._floor[device] = kept[0]["seq"]
+        kept.append(reading)
+        self._last[device] = reading["seq"]
+
+    def since(self, device, seq):
+        """Readings of `device` after `seq`, oldest first; None if they aren't all kept any more"""
+        with self._lock:
+            floor, last = self._floor.get(device), self._last.get(device)
+            if floor is None or seq < floor:
+                self.missed += 1
+                return None
+            kept = self._readings[device]
+            readings = list(itertools.islice(kept, max(0, len(kept) - (last - seq)), None))
+        self.resumed += 1
+        self.replayed += len(readings)
+        return readings
+
+    def resume(self, seqs):
+        """(readings, missed): what a client that saw up to `seqs` ({device_id: seq}) missed, in time order,
+        and the devices it has to refetch"""
+        readings, missed = [], []
+        for device, seq in seqs.items():
+            try:
+                since = self.since(device, int(seq))
+            except (TypeError, ValueError):
+                since = None
+            if since is None:
+                missed.append(device)
+            else:
+                readings.extend(since)
+        readings.sort(key=lambda r: r["timestamp"])
+        return readings, missed
+
+    def stats(self):
+        with self._lock:
+            devices = {device: {"first_seq": self._floor[device] + 1, "last_seq": self._last[device],
+                                "kept": len(kept)}
+                       for device, kept in self._readings.items()}
+        return {
+            "size": self.size,
+            "devices": devices,
+            "resumed": self.resumed,
+            "replayed": self.replayed,
+            "missed": self.missed,
+        }
@@ -0,0 +1,373 @@
+import os
+import threading
+import time
+from array import array
+from datetime import date, datetime, timedelta
+
+from columnar_export import LABEL_COLUMNS, label_codes, sqlite_column_arrays, write_columns
+from csv_export import CHUNK_ROWS, cursor_chunks
+from metrics import RateLimitedLog
+
+try:
+    import numpy as np
+except ImportError:  # Archiving needs NumPy; without it raw readings are simply kept
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Archives are written as npz instead of Parquet
+    pa = None
+
+NUMERIC_COLUMNS = ("co_in", "co_out", "efficiency", "voltage", "current", "power", "predicted_efficiency",
+                   "anomaly_score")
+
+DELETE_READINGS = """
+    DELETE FROM readings WHERE rowid IN (
+        SELECT rowid FROM readings WHERE ts_ms >= ? AND ts_ms < ? LIMIT ?)
+"""
+DELETE_MINUTES = """
+    DELETE FROM rollup_minute WHERE rowid IN (
+        SELECT rowid FROM rollup_minute WHERE minute_ms < ? LIMIT ?)
+"""
+CATALOGUE_ARCHIVE = """
+    INSERT INTO archives (day, file, from_ms, to_ms, rows, bytes) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(day) DO UPDATE SET
+        file = excluded.file, from_ms = excluded.from_ms, to_ms = excluded.to_ms,
+        rows = excluded.rows, bytes = excluded.bytes
+"""
+
+
+def day_bounds(day):
+    """[start, end) of a local calendar day in epoch ms (23 or 25 hours across DST changes)"""
+    start = datetime.combine(day, datetime.min.time())
+    return int(start.timestamp() * 1000), int((start + timedelta(days=1)).timestamp() * 1000)
+
+
+class Archive:
+    """One compressed columnar file per local day of readings: Parquet (zstd), or npz without pyarrow.
+
+    In memory a day is a "table" of NumPy columns: ts_ms int64, the numeric
+    columns float64, anomaly int8 and device_id strings.
+    """
+
+    def __init__(self, directory, fmt=None):
+        self.directory = directory
+        self.fmt = fmt or ("parquet" if pa is not None else "npz")
+
+    def path(self, file):
+        return os.path.join(self.directory, file)
+
+    def write(self, day, table):
+        """Atomically (re)write the file for `day`; returns (file name, size in bytes)"""
+        labels, codes = np.unique(table["device_id"], return_inverse=True)
+        arrays = {"timestamp": table["ts_ms"] / 1000.0}
+        arrays.update((c, table[c]) for c in NUMERIC_COLUMNS)
+        arrays["anomaly"] = table["anomaly"]
+        arrays["device_id"] = codes.astype(np.uint16)
+        payload, _, ext = write_columns(arrays, {"device_id": [str(label) for label in labels]}, self.fmt)
+
+        file = f"readings-{day}.{ext}"
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self.path(file + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path(file))
+        return file, len(payload)
+
+    def load(self, file):
+        path = self.path(file)
+        if file.endswith(".parquet"):
+            t = pq.read_table(path)
+            table = {"ts_ms": t.column("timestamp").cast(pa.int64()).to_numpy()}
+            table.update((c, t.column(c).to_numpy()) for c in NUMERIC_COLUMNS)
+            table["anomaly"] = t.column("anomaly").to_numpy().astype(np.int8)
+            table["device_id"] = t.column("device_id").cast(pa.string()).to_numpy()
+            return table
+        with np.load(path) as z:
+            table = {"ts_ms": z["timestamp_ms"]}
+            table.update((c, z[c]) for c in NUMERIC_COLUMNS)
+            table["anomaly"] = z["anomaly"].astype(np.int8)
+            table["device_id"] = z["device_id_labels"][z["device_id"]]
+        return table
+
+
+def _read_table(db, from_ms, to_ms):
+    """All readings in [from_ms, to_ms) as an archive table"""
+    rows = db.execute(f"""
+        SELECT ts_ms, {", ".join(NUMERIC_COLUMNS)}, anomaly, device_id
+        FROM readings
+        WHERE ts_ms >= ? AND ts_ms < ?
+        ORDER BY ts_ms
+    """, (from_ms, to_ms)).fetchall()
+    columns = list(zip(*rows)) or [()] * (len(NUMERIC_COLUMNS) + 3)
+    table = {"ts_ms": np.array(columns[0], dtype=np.int64)}
+    for i, c in enumerate(NUMERIC_COLUMNS, 1):
+        table[c] = np.array([v or 0 for v in columns[i]], dtype=np.float64)
+    table["anomaly"] = np.array(columns[-2], dtype=np.int8)
+    table["device_id"] = np.array(columns[-1], dtype=str)
+    return table
+
+
+def _unarchived(archived, table):
+    """The rows of `table` whose (device_id, ts_ms) isn't in `archived` already"""
+    keep = np.ones(len(table["ts_ms"]), dtype=bool)
+    for device in np.unique(table["device_id"]):
+        rows = table["device_id"] == device
+        keep[rows] = ~np.isin(table["ts_ms"][rows], archived["ts_ms"][archived["device_id"] == device])
+    return {c: values[keep] for c, values in table.items()}
+
+
+def _concat(a, b):
+    """Two tables merged in ts_ms order"""
+    table = {c: np.concatenate((a[c], b[c])) for c in a}
+    order = np.argsort(table["ts_ms"], kind="stable")
+    return {c: values[order] for c, values in table.items()}
+
+
+def _csv_values(table, column):
+    if column == "timestamp":
+        return [datetime.fromtimestamp(ms / 1000).isoformat() for ms in table["ts_ms"].tolist()]
+    return table[column].tolist()
+
+
+class RetentionManager:
+    """Keeps sensor_data.db small: raw readings age into archive files, old minute rollups expire.
+
+    Raw readings are kept for `raw_days` whole local days. Each older day is
+    written to one archive file, catalogued in the archives table, then
+    deleted from SQLite `delete_batch` rows at a time through the ingest
+    writer, so every step is a short transaction between ingest batches.
+    Minute rollups are kept for `minute_days`; hour and day rollups forever.
+    Freed pages go back to the filesystem by incremental vacuum, a few
+    hundred pages per step.
+
+    Readers use the end of the last archived day as the archive horizon:
+    readings before it come from the archive files and later ones from
+    SQLite, so a day that is still being deleted is never counted twice.
+    Readings arriving late for an archived day join its file on the next pass.
+    A pass interrupted between writing a file and deleting its rows is simply
+    repeated: rows already in the file are not added to it again.
+    """
+
+    def __init__(self, writer, read_pool, archive_dir, raw_days=14, minute_days=90, interval=3600,
+                 delete_batch=5000, vacuum_pages=256, timeout=60, on_change=None, log=None):
+        self.writer = writer
+        self.read_pool = read_pool
+        self.archive = Archive(archive_dir)
+        self.raw_days = raw_days
+        self.minute_days = minute_days
+        self.interval = interval
+        self.delete_batch = delete_batch
+        self.vacuum_pages = vacuum_pages
+        self.timeout = timeout
+        self.on_change = on_change  # on_change() after readings or rollups were removed
+        self.log = log or RateLimitedLog()
+
+        self._run_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.runs = 0
+        self.errors = 0
+        self.rows_archived = 0
+        self.minute_rows_expired = 0
+        self.pages_vacuumed = 0
+        self.last_run = None
+        self.last_run_ms = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="retention")
+        self._thread.daemon = True
+        self._thread.start()
+        print(f"🗄 Retention manager started (raw {self.raw_days} days, minute rollups {self.minute_days} days)")
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                self.log.error("retention", "❌ Retention pass failed: %s", e)
+            self._stop.wait(self.interval)
+
+    def _write(self, fn):
+        return self.writer.call(fn).result(timeout=self.timeout)
+
+    def run_once(self):
+        """One full pass: archive expired days, expire minute rollups, vacuum; returns what was done"""
+        with self._run_lock:
+            started = time.perf_counter()
+            archived = self._archive_expired()
+            expired = self._expire_minutes()
+            vacuumed = self._vacuum()
+            if (archived or expired) and self.on_change is not None:
+                self.on_change()
+            with self._lock:
+                self.runs += 1
+                self.rows_archived += archived
+                self.minute_rows_expired += expired
+                self.pages_vacuumed += vacuumed
+                self.last_run = datetime.now().isoformat()
+                self.last_run_ms = (time.perf_counter() - started) * 1000
+            return {"rows_archived": archived, "minute_rows_expired": expired, "pages_vacuumed": vacuumed}
+
+    def _archive_expired(self):
+        if np is None:
+            self.log.warning("no_numpy", "⚠️ Archiving needs NumPy, keeping expired readings in SQLite")
+            return 0
+        cutoff_ms = day_bounds(date.today() - timedelta(days=self.raw_days))[0]
+        total = 0
+        while not self._stop.is_set():
+            with self.read_pool.connection("retention") as db:
+                oldest = db.execute("SELECT MIN(ts_ms) FROM readings").fetchone()[0]
+            if oldest is None or oldest >= cutoff_ms:
+                break
+            total += self._archive_day(datetime.fromtimestamp(oldest / 1000).date())
+        return total
+
+    def _archive_day(self, day):
+        from_ms, to_ms = day_bounds(day)
+        with self.read_pool.connection("retention") as db:
+            table = _read_table(db, from_ms, to_ms)
+            existing = db.execute("SELECT file FROM archives WHERE day = ?", (day.isoformat(),)).fetchone()
+        if existing and os.path.exists(self.archive.path(existing[0])):
+            archived = self.archive.load(existing[0])
+            table = _unarchived(archived, table)  # Left over from an interrupted pass, or late arrivals
+            rows = len(table["ts_ms"])
+            table = _concat(archived, table)
+        else:
+            rows = len(table["ts_ms"])
+
+        file, size = self.archive.write(day.isoformat(), table)
+        self._write(lambda conn: conn.execute(CATALOGUE_ARCHIVE, (day.isoformat(), file, from_ms, to_ms,
+                                                                  len(table["ts_ms"]), size)))
+        while self._write(lambda conn: conn.execute(DELETE_READINGS, (from_ms, to_ms, self.delete_batch)).rowcount):
+            pass
+        print(f"🗄 Archived {rows} readings of {day} to {file} ({size / 1024:.0f} KiB)")
+        return rows
+
+    def minute_cutoff_ms(self):
+        """Minute rollups before this are expired; older /history ranges need the hour rollup"""
+        return int((time.time() - self.minute_days * 86400) * 1000) // 60000 * 60000
+
+    def _expire_minutes(self):
+        cutoff_ms = self.minute_cutoff_ms()
+        total = 0
+        while True:
+            deleted = self._write(lambda conn: conn.execute(DELETE_MINUTES, (cutoff_ms, self.delete_batch)).rowcount)
+            total += deleted
+            if deleted < self.delete_batch:
+                return total
+
+    def _vacuum_step(self, conn):
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})").fetchall()
+        return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def _vacuum(self):
+        total = 0
+        while not self._stop.is_set():
+            freed = self._write(self._vacuum_step)
+            if freed <= 0:
+                break
+            total += freed
+        return total
+
+    # Reading across the archive horizon ---------------------------------------
+
+    def horizon(self, db):
+        """End of the last archived day in epoch ms (0 if nothing is archived)"""
+        return db.execute("SELECT COALESCE(MAX(to_ms), 0) FROM archives").fetchone()[0]
+
+    def _archived(self, db, from_ms, to_ms, device_id):
+        """Archived readings in [from_ms, to_ms), one table per day file, oldest first"""
+        files = db.execute("SELECT file FROM archives WHERE to_ms > ? AND from_ms < ? ORDER BY from_ms",
+                           (from_ms, to_ms)).fetchall()
+        for (file,) in files:
+            table = self.archive.load(file)
+            mask = (table["ts_ms"] >= from_ms) & (table["ts_ms"] < to_ms)
+            if device_id is not None:
+                mask &= table["device_id"] == device_id
+            if mask.any():
+                yield {c: values[mask] for c, values in table.items()}
+
+    def column_arrays(self, db, columns, from_ms, to_ms, device_id=None, labels=None):
+        """sqlite_column_arrays() over the archive files and the readings table together"""
+        labels = {} if labels is None else labels
+        horizon = self.horizon(db)
+        if from_ms >= horizon:
+            return sqlite_column_arrays(db, columns, from_ms, to_ms, device_id, labels)
+        arrays = {c: array('H' if c in LABEL_COLUMNS else 'b' if c == "anomaly" else 'd') for c in columns}
+        codes = {c: label_codes(labels.setdefault(c, [])) for c in columns if c in LABEL_COLUMNS}
+        for table in self._archived(db, from_ms, min(to_ms, horizon), device_id):
+            for c in columns:
+                if c in codes:
+                    names, inverse = np.unique(table[c], return_inverse=True)
+                    values = np.array([codes[c](name) for name in names.tolist()], dtype=np.uint16)[inverse]
+                else:
+                    values = table["ts_ms"] / 1000.0 if c == "timestamp" else table[c]
+                arrays[c].frombytes(values.astype(np.uint16 if c in codes else np.int8 if c == "anomaly"
+                                                  else np.float64).tobytes())
+        if to_ms > horizon:
+            for c, values in sqlite_column_arrays(db, columns, horizon, to_ms, device_id, labels).items():
+                arrays[c].extend(values)
+        return arrays
+
+    def csv_chunks(self, db, columns, from_ms, to_ms, device_id=None, size=CHUNK_ROWS):
+        """Row tuples in [from_ms, to_ms) for stream_csv(): archived readings first, then the readings table"""
+        horizon = self.horizon(db)
+        if from_ms < horizon:
+            for table in self._archived(db, from_ms, min(to_ms, horizon), device_id):
+                rows = list(zip(*(_csv_values(table, c) for c in columns)))
+                for i in range(0, len(rows), size):
+                    yield rows[i:i + size]
+        device_filter = "AND device_id = ?" if device_id is not None else ""
+        cursor = db.execute(f"""
+            SELECT {", ".join(columns)}
+            FROM readings
+            WHERE ts_ms >= ? AND ts_ms < ? {device_filter}
+            ORDER BY ts_ms
+        """, (max(from_ms, horizon), to_ms) + ((device_id,) if device_id is not None else ()))
+        yield from cursor_chunks(cursor, size)
+
+    def stats(self):
+        with self.read_pool.connection("retention") as db:
+            archives, archive_rows, archive_bytes, horizon = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(rows), 0), COALESCE(SUM(bytes), 0), COALESCE(MAX(to_ms), 0) "
+                "FROM archives").fetchone()
+            page_size = db.execute("PRAGMA page_size").fetchone()[0]
+            pages, free_pages = (db.execute("PRAGMA page_count").fetchone()[0],
+                                 db.execute("PRAGMA freelist_count").fetchone()[0])
+        with self._lock:
+            return {
+                "raw_days": self.raw_days,
+                "minute_days": self.minute_days,
+                "format": self.archive.fmt,
+                "archives": archives,
+                "archive_rows": archive_rows,
+                "archive_bytes": archive_bytes,
+                "horizon": datetime.fromtimestamp(horizon / 1000).isoformat() if horizon else None,
+                "db_bytes": pages * page_size,
+                "free_bytes": free_pages * page_size,
+                "runs": self.runs,
+                "errors": self.errors,
+                "rows_archived": self.rows_archived,
+                "minute_rows_expired": self.minute_rows_expired,
+                "pages_vacuumed": self.pages_vacuumed,
+                "last_run": self.last_run,
+                "last_run_ms": round(self.last_run_ms, 3),
+            }
@@ -0,0 +1,109 @@
+import threading
+from datetime import datetime
+
+
+class RunningStats:
+    """Running daily aggregates and a fixed-size health window, updated per reading.
+
+    Readings are folded in as they are appended, so /stats/daily and
+    /system/health answer in constant time instead of rescanning history.
+    """
+
+    def __init__(self, health_window=10):
+        self._lock = threading.Lock()
+        self._reset_day(None)
+
+        # Ring of (efficiency, anomaly, power) for the last `health_window` readings
+        self._window = [None] * health_window
+        self._window_pos = 0
+        self._window_len = 0
+        self._window_eff = 0.0
+        self._window_anomalies = 0
+        self._window_power = 0.0
+
+    def _reset_day(self, day):
+        self.day = day
+        self.count = 0
+        self.max_co_in = 0
+        self.sum_efficiency = 0.0
+        self.sum_power = 0.0
+        self.anomaly_count = 0
+
+    def add(self, reading):
+        """Fold one reading dict into the daily accumulators and the health window"""
+        day = reading["timestamp"][:10]
+        efficiency = reading["efficiency"]
+        anomaly = int(reading["anomaly"])
+        power = reading["power"]
+
+        with self._lock:
+            if day != self.day:
+                self._reset_day(day)  # Midnight rollover
+            self.max_co_in = max(self.max_co_in, reading["co_in"]) if self.count else reading["co_in"]
+            self.count += 1
+            self.sum_efficiency += efficiency
+            self.sum_power += power
+            self.anomaly_count += anomaly
+
+            evicted = self._window[self._window_pos]
+            if evicted is not None:
+                self._window_eff -= evicted[0]
+                self._window_anomalies -= evicted[1]
+                self._window_power -= evicted[2]
+            else:
+                self._window_len += 1
+            self._window[self._window_pos] = (efficiency, anomaly, power)
+            self._window_pos = (self._window_pos + 1) % len(self._window)
+            self._window_eff += efficiency
+            self._window_anomalies += anomaly
+            self._window_power += power
+
+    def daily(self, day=None):
+        """Today's aggregates, or None if nothing has been recorded for that day yet"""
+        day = day or datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            if day != self.day or not self.count:
+                return None
+            return {
+                "count": self.count,
+                "max_co_in": self.max_co_in,
+                "avg_efficiency": self.sum_efficiency / self.count,
+                "total_power": self.sum_power,
+                "anomaly_count": self.anomaly_count,
+            }
+
+    def health(self):
+        """Averages over the health window, or None before the first reading"""
+        with self._lock:
+            n = self._window_len
+            if not n:
+                return None
+            return {
+                "avg_efficiency": self._window_eff / n,
+                "anomaly_ratio": self._window_anomalies / n,
+                "avg_power": self._window_power / n,
+            }
+
+
+def combine_daily(dailies):
+    """Merge daily() results from several devices into one, or None if all were empty"""
+    dailies = [d for d in dailies if d]
+    if not dailies:
+        return None
+    count = sum(d["count"] for d in dailies)
+    return {
+        "count": count,
+        "max_co_in": max(d["max_co_in"] for d in dailies),
+        "avg_efficiency": sum(d["avg_efficiency"] * d["count"] for d in dailies) / count,
+        "total_power": sum(d["total_power"] for d in dailies),
+        "anomaly_count": sum(d["anomaly_count"] for d in dailies),
+    }
+
+
+def combine_health(windows):
+    """Average health() windows from several devices, or None if all were empty"""
+    windows = [w for w in windows if w]
+    if not windows:
+        return None
+    n = len(windows)
+    return {k: sum(w[k] for w in windows) / n for k in ("avg_efficiency", "anomaly_ratio", "avg_power")}
@@ -0,0 +1,480 @@
+"""create_app(config): the Flask + SocketIO sensor server shared by the real backend and the mock servers.
+
+Building an app does no I/O. The database schema is set up on the first
+request (or start()), and serial ports, simulators, the ingest writer and
+the broadcaster only run once start() is called, so tests and benchmarks
+can create as many in-process instances as they like without hardware.
+
+    app = create_app({"STORAGE": "memory", "DEVICES": [Device("sim-1", source="simulated")]})
+    server = app.extensions["sensor"]
+    server.start()
+    server.socketio.run(app, port=5001)
+
+With ROLE "ingest" the server also publishes every reading on the event bus at
+BUS_ADDRESS; with ROLE "worker" it runs no sources and serves the readings it
+receives from the bus instead (see cluster.py).
+"""
+
+import time
+from datetime import datetime
+
+from flask import Flask, Response, jsonify, request
+from flask_cors import CORS
+from flask_socketio import SocketIO
+
+from broadcaster import Broadcaster
+from csv_export import parse_range, parse_columns, stream_csv, download_headers
+from columnar_export import default_format, write_columns
+from detectors import AnomalyEngine
+from event_bus import DEFAULT_ADDRESS, BusPublisher, BusSubscriber
+from devices import Device, ReplaySource, SimulatedSource, load_devices
+from downsample import downsample_indices, select_rows
+from frame_parser import FrameParser
+from metrics import Registry, RateLimitedLog, STAGE_BUCKETS, stats_families
+from range_query import parse_query
+from response_cache import ResponseCache
+from resume_backlog import ResumeBacklog
+from serial_reader import SerialReader
+from storage import STORAGES
+from wire_format import readings_response
+
+DEFAULT_CONFIG = {
+    "TITLE": "✅ Sensor Server Running",
+    "STORAGE": "sqlite",  # sqlite (durable, the real backend), columnar (mmap column files) or memory (mocks)
+    "DEVICES": None,  # List of Device; without it the registry in DEVICES_FILE...
+    "DEVICES_FILE": None,
+    "SERIAL_PORT": "COM21",  # ...and without that a single Pico on SERIAL_PORT
+    "BAUD_RATE": 9600,
+    "SOURCES": {},  # Extra data sources: name -> factory(device, handle_frame, server), used by Device.source
+    "DB_PATH": "sensor_data.db",
+    "INGEST_BATCH_ROWS": 200,  # Flush to SQLite after this many readings...
+    "INGEST_BATCH_MS": 250,    # ...or after this many milliseconds, whichever comes first
+    "SPOOL_DIR": "spool",  # Crash-safe mmap spool between ingest and the writer; None queues in memory only
+    "SPOOL_SEGMENT_RECORDS": 65536,  # Readings per spool segment file (~12 MiB)
+    "READ_POOL_SIZE": 8,  # Read-only connections shared by request handlers
+    "RESCORE_TIMEOUT": 60,  # Seconds to wait for the writer to apply a rescore
+    "ARCHIVE_DIR": "archive",  # Compressed per-day files of readings older than RAW_RETENTION_DAYS
+    "RAW_RETENTION_DAYS": 14,  # Whole days of raw readings kept in SQLite
+    "MINUTE_RETENTION_DAYS": 90,  # Minute rollups kept this long; hour and day rollups are kept forever
+    "RETENTION_INTERVAL": 3600,  # Seconds between retention passes
+    "COLUMN_DIR": "columns",  # Columnar storage: one directory of column files per device and time chunk...
+    "COLUMN_CHUNK_SECONDS": 3600,  # ...starting a new chunk every hour...
+    "COLUMN_CHUNK_ROWS": 65536,  # ...or after this many readings, whichever comes first
+    "STORE_CAPACITY": 100_000,  # Readings kept in memory per device
+    "HEALTH_WINDOW": 10,  # Readings per device averaged by /system/health
+    "HISTORY_POINTS": 300,  # Default size of a downsampled /history series...
+    "HISTORY_MAX_POINTS": 5000,  # ...and the most a request gets, whatever `points` it asks for
+    "HISTORY_RAW_SPAN": 6 * 3600,  # Longer /history ranges are served from the minute rollup...
+    "HISTORY_MINUTE_SPAN": 7 * 86400,  # ...and longer ones (or older than its retention) from the hour rollup
+    "BROADCAST_MAX_HZ": 2.0,  # Max sensor_frame events per second per subscription room
+    "RESUME_BACKLOG": 5000,  # Readings per device kept for reconnecting clients (socket resume, ?since_seq=)
+    "EXPORT_NAME": "sensor_data",  # Download file name of exports, without extension
+    "ROLE": "standalone",  # standalone, or in a cluster: ingest (sources + writer) or worker (clients + reads)
+    "BUS_ADDRESS": DEFAULT_ADDRESS,  # Where the ingest process publishes readings for the workers
+    "SOCKET_TRANSPORTS": None,  # Engine.IO transports; a cluster allows only websocket (no sticky sessions)
+}
+
+ROLES = ("standalone", "ingest", "worker")
+
+
+def serial_source(device, handle, server):
+    return SerialReader(device.port, device.baudrate, handle, log=server.log, timer=server.observe_stage)
+
+
+def simulated_source(device, handle, server):
+    return SimulatedSource(device, handle)
+
+
+def replay_source(device, handle, server):
+    return ReplaySource(device, handle)
+
+
+SOURCES = {"serial": serial_source, "simulated": simulated_source, "replay": replay_source}
+
+
+def recommendation(reasons):
+    """Dashboard text for the detectors that fired on a reading"""
+    if any(r.startswith("cusum:") for r in reasons):
+        return "Efficiency trending down, inspect the CuO mesh"
+    if reasons:
+        return "High CO levels detected"
+    return "System operating normally"
+
+
+class SensorServer:
+    """Everything behind one app: storage, detectors, broadcaster and one data source per device"""
+
+    def __init__(self, app, config):
+        self.app = app
+        self.config = config
+        self.log = RateLimitedLog(interval=5.0)  # Levelled (LOG_LEVEL) and sampled per message key
+
+        # Prometheus-text /metrics: request latency per route, time per pipeline stage, and the
+        # components' own counters and queue depths (collected at scrape time)
+        self.metrics = Registry()
+        self.stage_seconds = self.metrics.histogram("sensor_stage_seconds", "Time spent per ingest pipeline stage",
+                                                    ("stage",), buckets=STAGE_BUCKETS)
+        self.metrics.instrument(app)
+
+        if config["ROLE"] not in ROLES:
+            raise ValueError(f"Unknown role '{config['ROLE']}', use one of: {', '.join(ROLES)}")
+        self.role = config["ROLE"]
+
+        self.socketio = SocketIO(app, cors_allowed_origins="*", transports=config["SOCKET_TRANSPORTS"])
+        self.broadcaster = Broadcaster(self.socketio, max_hz=config["BROADCAST_MAX_HZ"], timer=self.observe_stage)
+        self.broadcaster.register()
+        # Numbers every reading per device and keeps the last few, so reconnecting clients get only what they missed
+        self.backlog = ResumeBacklog(config["RESUME_BACKLOG"])
+
+        # Read endpoint answers, recomputed once per reading (and per committed batch) rather than
+        # once per polling dashboard
+        self.response_cache = ResponseCache()
+
+        if config["STORAGE"] not in STORAGES:
+            raise ValueError(f"Unknown storage '{config['STORAGE']}', use one of: {', '.join(STORAGES)}")
+        self.storage = STORAGES[config["STORAGE"]](config, on_change=self.storage_changed,
+                                                   timer=self.observe_stage, log=self.log)
+
+        # Streaming detectors and efficiency forecast, per device
+        self.anomaly_engine = AnomalyEngine()
+        # Schema-validating decoder for every device's frames (JSON, CSV or binary), with per-reason reject counts
+        self.frame_parser = FrameParser()
+
+        # Each device gets its own source (and threads, once started), so one slow or missing port never
+        # stalls the rest
+        factories = {**SOURCES, **config["SOURCES"]}
+        self.devices = config["DEVICES"]
+        if self.devices is None:
+            self.devices = load_devices(config["DEVICES_FILE"],
+                                        default=Device("pico", port=config["SERIAL_PORT"],
+                                                       baudrate=config["BAUD_RATE"]))
+        # In a cluster the ingest process publishes readings and commits; workers follow them
+        self.bus = None
+        if self.role == "ingest":
+            self.bus = BusPublisher(config["BUS_ADDRESS"], log=self.log)
+        elif self.role == "worker":
+            self.bus = BusSubscriber(config["BUS_ADDRESS"], self.receive, log=self.log)
+
+        self.sources = {}
+        for device in self.devices if self.role != "worker" else ():
+            if device.source not in factories:
+                raise ValueError(f"Device {device.device_id}: unknown source '{device.source}', "
+                                 f"use one of: {', '.join(factories)}")
+            self.sources[device.device_id] = factories[device.source](
+                device, lambda frame, device=device: self.process_frame(device, frame), self)
+        self.started = False
+
+    def observe_stage(self, stage, seconds):
+        self.stage_seconds.observe(seconds, stage)
+
+    def storage_changed(self, *args):
+        self.response_cache.bump()
+        if self.role == "ingest":
+            self.bus.publish("changed")  # A batch was committed; workers drop their cached answers too
+
+    def start(self):
+        """Open storage and start the writer, broadcaster, event bus and every device's source"""
+        if self.started:
+            return
+        self.started = True
+        self.storage.start()
+        self.broadcaster.start()
+        if self.bus is not None:
+            self.bus.start()
+        for device in self.devices:
+            if device.device_id in self.sources:  # Workers have none
+                print(f"🟢 Starting {device}")
+                self.sources[device.device_id].start()
+
+    def stop(self):
+        for source in self.sources.values():
+            source.stop()
+        if self.bus is not None:
+            self.bus.stop()
+        self.broadcaster.stop()
+        self.storage.stop()
+        self.started = False
+
+    def process_frame(self, device, frame):
+        """Handle one frame from a device; returns False if it was not a valid reading"""
+        started = time.perf_counter()
+        reading, error = self.frame_parser.parse(frame)
+        if error is not None:
+            self.log.warning(f"rejected:{error}", "⚠️ Rejected frame from %s (%s): %r", device.device_id, error,
+                             frame[:80])
+            return False
+
+        co_in = reading["co_in"]
+        co_out = reading["co_out"]
+        now = datetime.now()
+        efficiency = ((co_in - co_out) / co_in * 100) if co_in > 0 else 0
+        parsed = time.perf_counter()
+        self.observe_stage("parse", parsed - started)
+        scores = self.anomaly_engine.score({"co_in": co_in, "co_out": co_out, "efficiency": efficiency},
+                                           device.device_id)
+        self.observe_stage("score", time.perf_counter() - parsed)
+        self.log.debug("parsed", "✅ Parsed %s: CO_IN=%s, CO_OUT=%s, Efficiency=%.2f%%", device.device_id, co_in,
+                       co_out, efficiency)
+
+        data = {
+            "timestamp": now.isoformat(),
+            "co_in": co_in,
+            "co_out": co_out,
+            "efficiency": efficiency,
+            "predicted_efficiency": scores["predicted_efficiency"],
+            "voltage": reading["voltage"],
+            "current": reading["current"],
+            "power": reading["power"],
+            "anomaly": scores["anomaly"],
+            "anomaly_score": scores["anomaly_score"],
+            "recommendation": recommendation(scores["reasons"]),
+            "device_id": device.device_id,
+            "vehicle": device.vehicle
+        }
+        self.backlog.stamp(data)  # Before the broadcaster sees it, see Broadcaster.join()
+        self.storage.append(data, int(now.timestamp() * 1000))
+        self.response_cache.bump()
+
+        # Coalesced into the next sensor_frame; the broadcaster sheds stale readings if it falls behind
+        self.broadcaster.publish(data)
+        if self.role == "ingest":
+            self.bus.publish("reading", data)
+        return True
+
+    def receive(self, event, data):
+        """Handle an event from the ingest process's bus (workers only)"""
+        if event == "reading":
+            self.backlog.follow(data)
+            self.storage.follow(data)
+            self.response_cache.bump()
+            self.broadcaster.publish(data)  # Fanned out to this worker's own clients
+        elif event == "changed":
+            self.response_cache.bump()
+
+    def collect_metrics(self):
+        yield from stats_families("sensor_source",
+                                  {device_id: source.stats() for device_id, source in self.sources.items()},
+                                  label="device_id",
+                                  counters=("bytes_read", "frames", "dropped", "oversized", "resync_bytes",
+                                            "malformed", "errors", "reconnects"),
+                                  gauges=("connected", "running", "queue_depth"))
+        parser_stats = self.frame_parser.stats()
+        yield ("sensor_frames_parsed_total", "counter", "Valid frames by wire format",
+               [({"format": fmt}, count) for fmt, count in parser_stats["parsed"].items()])
+        yield ("sensor_frames_rejected_total", "counter", "Rejected frames by reason",
+               [({"reason": reason}, count) for reason, count in parser_stats["rejected"].items()])
+        yield from self.storage.metric_families()
+        yield from stats_families("sensor_broadcast", self.broadcaster.stats(),
+                                  counters=("published", "shed", "flushes", "frames"), gauges=("pending", "clients"))
+        if self.bus is not None:
+            yield from stats_families("sensor_bus", self.bus.stats(),
+                                      counters=("published", "connections", "dropped", "received", "reconnects",
+                                                "errors"),
+                                      gauges=("subscribers", "pending", "connected"))
+        yield from stats_families("sensor_resume", self.backlog.stats(), counters=("resumed", "replayed", "missed"))
+        yield from stats_families("sensor_response_cache", self.response_cache.stats(),
+                                  counters=("hits", "misses", "not_modified"), gauges=("entries",))
+
+
+def create_app(config=None):
+    """A sensor server app for `config` (keys of DEFAULT_CONFIG); the server is app.extensions["sensor"]"""
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.update(config or {})
+    CORS(app)
+    server = app.extensions["sensor"] = SensorServer(app, app.config)
+    register_routes(app, server)
+    return app
+
+
+def register_routes(app, server):
+    storage, cache, config = server.storage, server.response_cache, server.config
+
+    app.before_request(storage.open)  # Schema setup waits for the first request (or start())
+
+    storage.register(app)
+    server.metrics.collector(server.collect_metrics)
+
+    @app.route("/")
+    def index():
+        vehicles = ", ".join(sorted({d.vehicle or "unknown" for d in server.devices}))
+        return f"{config['TITLE']} ({len(server.devices)} devices: {vehicles})"
+
+    @app.route("/devices")
+    def get_devices():
+        """The device registry with each source's connection state and counters"""
+        return jsonify([
+            {"device_id": d.device_id, "vehicle": d.vehicle, "profile": d.profile, "source": d.source,
+             **(server.sources[d.device_id].stats() if d.device_id in server.sources else {})}
+            for d in server.devices
+        ])
+
+    @app.route("/serial/stats")
+    def get_serial_stats():
+        """Connection state, frame counters and queue depths of the ingest pipeline"""
+        return jsonify({
+            "sources": {device_id: source.stats() for device_id, source in server.sources.items()},
+            "parser": server.frame_parser.stats(),
+            "broadcast": server.broadcaster.stats(),
+            "resume": server.backlog.stats(),
+            "bus": server.bus.stats() if server.bus is not None else None
+        })
+
+    @app.route("/cache/stats")
+    def get_cache_stats():
+        """Hit/miss counters of the read endpoint response cache"""
+        return jsonify(cache.stats())
+
+    @app.route("/data")
+    @cache.cached
+    def latest_data():
+        latest = storage.latest(request.args.get("device"))
+        return jsonify(latest) if latest else jsonify({"error": "No data"})
+
+    @app.route("/stats/daily")
+    @cache.cached
+    def get_daily_stats():
+        """Today's aggregates (all devices, or ?device=)"""
+        stats = storage.daily(request.args.get("device"))
+        if not stats or not stats["count"]:
+            return jsonify({"max_co_in": 0, "avg_efficiency": 0, "total_energy": 0, "anomaly_count": 0, "count": 0})
+        return jsonify({
+            "max_co_in": round(stats["max_co_in"], 2),
+            "avg_efficiency": round(stats["avg_efficiency"], 2),
+            "total_energy": round(stats["total_power"] / 1000, 4),  # W
+            "anomaly_count": stats["anomaly_count"],
+            "count": stats["count"]
+        })
+
+    @app.route("/history")
+    @cache.cached
+    def get_history():
+        """Last 50 readings, or ?from=&to=&points=N (mode=lttb|minmax, metric=co_in) downsampled; optional device.
+
+        ?device=&since_seq=N returns the device's readings after sequence number
+        N from the resume backlog, or 410 if it no longer reaches back that far.
+        """
+        device = request.args.get("device")
+        if "since_seq" in request.args:
+            try:
+                if device is None:
+                    raise ValueError("since_seq needs a device, sequence numbers are per device")
+                readings = server.backlog.since(device, int(request.args["since_seq"]))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            if readings is None:
+                return jsonify({"error": f"Readings of {device} after {request.args['since_seq']} are no longer "
+                                         f"kept, refetch /history"}), 410
+            return readings_response(readings)
+        if "from" not in request.args and "to" not in request.args:
+            return readings_response(storage.last(50, device))
+        try:
+            from_ts, to_ts = parse_range(request.args)
+            points = int(request.args.get("points", config["HISTORY_POINTS"]))
+            if points < 2:
+                raise ValueError("points must be at least 2")
+            points = min(points, config["HISTORY_MAX_POINTS"])
+            metric = request.args.get("metric", "co_in")
+            if metric not in ("co_in", "co_out", "efficiency", "power"):
+                raise ValueError(f"Unknown metric '{metric}'")
+            arrays = storage.history(from_ts, to_ts, device)
+            indices = downsample_indices(arrays["timestamp"], arrays[metric], points,
+                                         request.args.get("mode", "lttb"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return readings_response(select_rows(arrays, indices))
+
+    @app.route("/query")
+    @cache.cached
+    def query_readings():
+        """Aggregates per time bucket: from/to, bucket=1m, metrics=a,b, agg=min,max,avg,sum,p95,count, device"""
+        try:
+            from_ts, to_ts = parse_range(request.args)
+            bucket_ms, metrics, aggregates = parse_query(request.args)
+            result = storage.query(from_ts, to_ts, request.args.get("device"), bucket_ms, metrics, aggregates)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(result)
+
+    @app.route("/export/csv")
+    def export_csv():
+        """Stream readings as CSV; optional from/to (epoch seconds or ISO), device and columns=a,b,c"""
+        try:
+            from_ts, to_ts = parse_range(request.args)
+            columns = parse_columns(request.args, storage.fields)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        chunks = storage.csv_chunks(columns, from_ts, to_ts, request.args.get("device"))
+        return Response(stream_csv(columns, chunks), mimetype='text/csv',
+                        headers=download_headers(f"{config['EXPORT_NAME']}.csv"))
+
+    @app.route("/export")
+    def export_columnar():
+        """Export readings column by column: format=parquet|arrow|npz|csv, compression=, from/to/device/columns"""
+        fmt = request.args.get("format", default_format())
+        if fmt == "csv":
+            return export_csv()
+        try:
+            from_ts, to_ts = parse_range(request.args)
+            columns = parse_columns(request.args, storage.fields)
+            arrays, labels = storage.export_arrays(columns, from_ts, to_ts, request.args.get("device"))
+            payload, mimetype, ext = write_columns(arrays, labels, fmt, request.args.get("compression"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return Response(payload, mimetype=mimetype, headers=download_headers(f"{config['EXPORT_NAME']}.{ext}"))
+
+    if server.role != "worker":  # Rescoring writes, which only the ingest process does (on its admin port)
+        @app.route("/anomaly/rescore", methods=["POST"])
+        def rescore_anomalies():
+            """Re-run the detectors over stored readings (optional from/to, device) and write the results back"""
+            try:
+                from_ts, to_ts = parse_range(request.args)
+                rescored = storage.rescore(server.anomaly_engine, from_ts, to_ts, request.args.get("device"))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            cache.bump()
+            return jsonify(rescored)
+
+    @app.route("/system/health")
+    @cache.cached
+    def system_health():
+        window = storage.health(request.args.get("device"))
+        if not window:
+            return jsonify({"health_score": 0, "status": "no_data"})
+
+        avg_eff = window["avg_efficiency"]
+        anomaly_ratio = window["anomaly_ratio"]
+        avg_power = window["avg_power"]
+
+        health_score = max(0, min(100,
+            (avg_eff * 0.6) +
+            ((1 - anomaly_ratio) * 30) +
+            (min(avg_power / 100, 1) * 10)
+        ))
+
+        status = (
+            "excellent" if health_score >= 80 else
+            "good" if health_score >= 60 else
+            "warning" if health_score >= 40 else
+            "critical"
+        )
+
+        return jsonify({
+            "health_score": round(health_score, 1),
+            "status": status,
+            "avg_efficiency": round(avg_eff, 1),
+            "anomaly_ratio": round(anomaly_ratio * 100, 1)
+        })
+
+    @server.socketio.on("connect")
+    def on_connect(auth=None):
+        """A reconnecting dashboard passes {"seqs": {device_id: last seq}} and is sent a `resume` frame first"""
+        seqs = auth.get("seqs") if isinstance(auth, dict) else None
+        if seqs and isinstance(seqs, dict):
+            server.broadcaster.join(replay=lambda: server.backlog.resume(seqs))
+            server.log.info("connect", "🖥 Web dashboard reconnected, resuming %d devices.", len(seqs))
+        else:
+            server.broadcaster.join()
+            server.log.info("connect", "🖥 Web dashboard connected to server.")
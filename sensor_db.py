@@ -0,0 +1,424 @@
+"""SQLite schema, migrations and rollup maintenance for sensor_data.db"""
+
+from array import array
+
+SCHEMA_VERSION = 6
+DEFAULT_DEVICE = "default"  # device_id given to readings recorded before schema v3
+
+# Columns in insertion order; ts_ms and anomaly were added by schema v1, device_id by v3, the
+# detector outputs by v4
+READING_COLUMNS = ("timestamp", "co_in", "co_out", "efficiency", "voltage", "current", "power",
+                   "ts_ms", "anomaly", "device_id", "predicted_efficiency", "anomaly_score")
+
+INSERT_READING = "INSERT INTO readings ({}) VALUES ({})".format(
+    ", ".join(READING_COLUMNS), ", ".join(":" + c for c in READING_COLUMNS))
+
+UPSERT_MINUTE = """
+INSERT INTO rollup_minute (device_id, minute_ms, day, max_co_in, sum_efficiency, count, sum_power, anomaly_count,
+                           sum_co_in, sum_co_out)
+VALUES (:device_id, :bucket, :day, :max_co_in, :sum_efficiency, :count, :sum_power, :anomaly_count,
+        :sum_co_in, :sum_co_out)
+ON CONFLICT(device_id, minute_ms) DO UPDATE SET
+    max_co_in = MAX(max_co_in, excluded.max_co_in),
+    sum_co_in = sum_co_in + excluded.sum_co_in,
+    sum_co_out = sum_co_out + excluded.sum_co_out,
+    sum_efficiency = sum_efficiency + excluded.sum_efficiency,
+    count = count + excluded.count,
+    sum_power = sum_power + excluded.sum_power,
+    anomaly_count = anomaly_count + excluded.anomaly_count
+"""
+
+UPSERT_HOUR = """
+INSERT INTO rollup_hour (device_id, hour_ms, day, max_co_in, sum_efficiency, count, sum_power, anomaly_count,
+                         sum_co_in, sum_co_out)
+VALUES (:device_id, :bucket, :day, :max_co_in, :sum_efficiency, :count, :sum_power, :anomaly_count,
+        :sum_co_in, :sum_co_out)
+ON CONFLICT(device_id, hour_ms) DO UPDATE SET
+    max_co_in = MAX(max_co_in, excluded.max_co_in),
+    sum_co_in = sum_co_in + excluded.sum_co_in,
+    sum_co_out = sum_co_out + excluded.sum_co_out,
+    sum_efficiency = sum_efficiency + excluded.sum_efficiency,
+    count = count + excluded.count,
+    sum_power = sum_power + excluded.sum_power,
+    anomaly_count = anomaly_count + excluded.anomaly_count
+"""
+
+UPSERT_DAY = """
+INSERT INTO rollup_day (device_id, day, max_co_in, sum_efficiency, count, sum_power, anomaly_count)
+VALUES (:device_id, :bucket, :max_co_in, :sum_efficiency, :count, :sum_power, :anomaly_count)
+ON CONFLICT(device_id, day) DO UPDATE SET
+    max_co_in = MAX(max_co_in, excluded.max_co_in),
+    sum_efficiency = sum_efficiency + excluded.sum_efficiency,
+    count = count + excluded.count,
+    sum_power = sum_power + excluded.sum_power,
+    anomaly_count = anomaly_count + excluded.anomaly_count
+"""
+
+
+def init_db(conn):
+    """Create or migrate the schema to SCHEMA_VERSION and enable WAL journaling and incremental vacuum"""
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")  # Only takes effect here on a new database file
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, avoids an fsync per commit
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS readings (
+        timestamp TEXT,
+        co_in REAL,
+        co_out REAL,
+        efficiency REAL,
+        voltage REAL,
+        current REAL,
+        power REAL
+    )
+    ''')
+
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        _migrate_v1(conn)
+    if version < 2:
+        _migrate_v2(conn)
+    if version < 3:
+        _migrate_v3(conn)
+    if version < 4:
+        _migrate_v4(conn)
+    if version < 5:
+        _migrate_v5(conn)
+    if version < 6:
+        _migrate_v6(conn)
+    conn.commit()
+
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        # Existing files need a full VACUUM (outside any transaction) to switch vacuum mode, once
+        print("🛠 Enabling incremental vacuum on sensor_data.db (one-time VACUUM)...")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        print("✅ Incremental vacuum enabled.")
+
+
+def _migrate_v1(conn):
+    """Epoch-ms time index, persisted anomaly flag and minute/day rollups"""
+    print("🛠 Migrating sensor_data.db to schema v1...")
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(readings)")}
+    if "ts_ms" not in columns:
+        conn.execute("ALTER TABLE readings ADD COLUMN ts_ms INTEGER")
+    if "anomaly" not in columns:
+        conn.execute("ALTER TABLE readings ADD COLUMN anomaly INTEGER NOT NULL DEFAULT 0")
+
+    # Existing timestamps are naive local ISO strings
+    conn.execute("""
+        UPDATE readings
+        SET ts_ms = CAST(ROUND((julianday(timestamp, 'utc') - 2440587.5) * 86400000) AS INTEGER),
+            anomaly = (co_in > 100)
+        WHERE ts_ms IS NULL
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_readings_ts_ms ON readings (ts_ms)")
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS rollup_minute (
+        minute_ms INTEGER PRIMARY KEY,
+        day TEXT NOT NULL,
+        max_co_in REAL NOT NULL,
+        sum_efficiency REAL NOT NULL,
+        count INTEGER NOT NULL,
+        sum_power REAL NOT NULL,
+        anomaly_count INTEGER NOT NULL
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS rollup_day (
+        day TEXT PRIMARY KEY,
+        max_co_in REAL NOT NULL,
+        sum_efficiency REAL NOT NULL,
+        count INTEGER NOT NULL,
+        sum_power REAL NOT NULL,
+        anomaly_count INTEGER NOT NULL
+    )
+    ''')
+
+    # Backfill rollups from whatever was already recorded
+    conn.execute("DELETE FROM rollup_minute")
+    conn.execute("DELETE FROM rollup_day")
+    conn.execute("""
+        INSERT INTO rollup_minute
+        SELECT (ts_ms / 60000) * 60000, MIN(substr(timestamp, 1, 10)), MAX(co_in),
+               SUM(efficiency), COUNT(*), SUM(power), SUM(anomaly)
+        FROM readings GROUP BY ts_ms / 60000
+    """)
+    conn.execute("""
+        INSERT INTO rollup_day
+        SELECT substr(timestamp, 1, 10), MAX(co_in), SUM(efficiency), COUNT(*), SUM(power), SUM(anomaly)
+        FROM readings GROUP BY substr(timestamp, 1, 10)
+    """)
+    conn.execute("PRAGMA user_version = 1")
+    print("✅ Migration to schema v1 completed.")
+
+
+def _migrate_v2(conn):
+    """CO in/out sums on the minute rollup, so long /history ranges can be served from it"""
+    print("🛠 Migrating sensor_data.db to schema v2...")
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(rollup_minute)")}
+    for column in ("sum_co_in", "sum_co_out"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE rollup_minute ADD COLUMN {column} REAL NOT NULL DEFAULT 0")
+    conn.execute("""
+        UPDATE rollup_minute SET
+            sum_co_in = (SELECT COALESCE(SUM(co_in), 0) FROM readings
+                         WHERE ts_ms >= minute_ms AND ts_ms < minute_ms + 60000),
+            sum_co_out = (SELECT COALESCE(SUM(co_out), 0) FROM readings
+                          WHERE ts_ms >= minute_ms AND ts_ms < minute_ms + 60000)
+    """)
+    conn.execute("PRAGMA user_version = 2")
+    print("✅ Migration to schema v2 completed.")
+
+
+def _migrate_v3(conn):
+    """Partition readings and rollups by device_id"""
+    print("🛠 Migrating sensor_data.db to schema v3...")
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(readings)")}
+    if "device_id" not in columns:
+        conn.execute(f"ALTER TABLE readings ADD COLUMN device_id TEXT NOT NULL DEFAULT '{DEFAULT_DEVICE}'")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_readings_device_ts_ms ON readings (device_id, ts_ms)")
+
+    # Rollups get device_id as the leading primary key column, so they are rebuilt
+    conn.execute("ALTER TABLE rollup_minute RENAME TO rollup_minute_v2")
+    conn.execute('''
+    CREATE TABLE rollup_minute (
+        device_id TEXT NOT NULL,
+        minute_ms INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        max_co_in REAL NOT NULL,
+        sum_efficiency REAL NOT NULL,
+        count INTEGER NOT NULL,
+        sum_power REAL NOT NULL,
+        anomaly_count INTEGER NOT NULL,
+        sum_co_in REAL NOT NULL DEFAULT 0,
+        sum_co_out REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (device_id, minute_ms)
+    )
+    ''')
+    conn.execute(f"""
+        INSERT INTO rollup_minute
+        SELECT '{DEFAULT_DEVICE}', minute_ms, day, max_co_in, sum_efficiency, count, sum_power, anomaly_count,
+               sum_co_in, sum_co_out
+        FROM rollup_minute_v2
+    """)
+    conn.execute("DROP TABLE rollup_minute_v2")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rollup_minute_ms ON rollup_minute (minute_ms)")
+
+    conn.execute("ALTER TABLE rollup_day RENAME TO rollup_day_v2")
+    conn.execute('''
+    CREATE TABLE rollup_day (
+        device_id TEXT NOT NULL,
+        day TEXT NOT NULL,
+        max_co_in REAL NOT NULL,
+        sum_efficiency REAL NOT NULL,
+        count INTEGER NOT NULL,
+        sum_power REAL NOT NULL,
+        anomaly_count INTEGER NOT NULL,
+        PRIMARY KEY (device_id, day)
+    )
+    ''')
+    conn.execute(f"""
+        INSERT INTO rollup_day
+        SELECT '{DEFAULT_DEVICE}', day, max_co_in, sum_efficiency, count, sum_power, anomaly_count
+        FROM rollup_day_v2
+    """)
+    conn.execute("DROP TABLE rollup_day_v2")
+    conn.execute("PRAGMA user_version = 3")
+    print("✅ Migration to schema v3 completed.")
+
+
+def _migrate_v4(conn):
+    """Persist the anomaly engine's score and efficiency forecast per reading"""
+    print("🛠 Migrating sensor_data.db to schema v4...")
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(readings)")}
+    for column in ("predicted_efficiency", "anomaly_score"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE readings ADD COLUMN {column} REAL")
+    conn.execute("PRAGMA user_version = 4")
+    print("✅ Migration to schema v4 completed.")
+
+
+def _migrate_v5(conn):
+    """Hour rollup for history beyond the minute rollup's retention, and the archive catalogue"""
+    print("🛠 Migrating sensor_data.db to schema v5...")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS rollup_hour (
+        device_id TEXT NOT NULL,
+        hour_ms INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        max_co_in REAL NOT NULL,
+        sum_efficiency REAL NOT NULL,
+        count INTEGER NOT NULL,
+        sum_power REAL NOT NULL,
+        anomaly_count INTEGER NOT NULL,
+        sum_co_in REAL NOT NULL,
+        sum_co_out REAL NOT NULL,
+        PRIMARY KEY (device_id, hour_ms)
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rollup_hour_ms ON rollup_hour (hour_ms)")
+    conn.execute("DELETE FROM rollup_hour")
+    conn.execute("""
+        INSERT INTO rollup_hour
+        SELECT device_id, minute_ms / 3600000 * 3600000, MIN(day), MAX(max_co_in), SUM(sum_efficiency), SUM(count),
+               SUM(sum_power), SUM(anomaly_count), SUM(sum_co_in), SUM(sum_co_out)
+        FROM rollup_minute GROUP BY device_id, minute_ms / 3600000
+    """)
+
+    # One compressed columnar file per local day of readings moved out of the readings table
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS archives (
+        day TEXT PRIMARY KEY,
+        file TEXT NOT NULL,
+        from_ms INTEGER NOT NULL,
+        to_ms INTEGER NOT NULL,
+        rows INTEGER NOT NULL,
+        bytes INTEGER NOT NULL
+    )
+    ''')
+    conn.execute("PRAGMA user_version = 5")
+    print("✅ Migration to schema v5 completed.")
+
+
+def _migrate_v6(conn):
+    """Position of the ingest spool, committed along with the readings it covers"""
+    print("🛠 Migrating sensor_data.db to schema v6...")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS spool_position (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        committed INTEGER NOT NULL
+    )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO spool_position (id, committed) VALUES (0, 0)")
+    conn.execute("PRAGMA user_version = 6")
+    print("✅ Migration to schema v6 completed.")
+
+
+def _rollup(rows, key):
+    """Collapse a batch of readings into one accumulator per (device, rollup bucket)"""
+    buckets = {}
+    for r in rows:
+        k = (r["device_id"], key(r))
+        acc = buckets.get(k)
+        if acc is None:
+            acc = buckets[k] = {"device_id": k[0], "bucket": k[1], "day": r["timestamp"][:10],
+                                "max_co_in": r["co_in"], "sum_efficiency": 0.0, "count": 0, "sum_power": 0.0,
+                                "anomaly_count": 0, "sum_co_in": 0.0, "sum_co_out": 0.0}
+        acc["max_co_in"] = max(acc["max_co_in"], r["co_in"])
+        acc["sum_co_in"] += r["co_in"]
+        acc["sum_co_out"] += r["co_out"]
+        acc["sum_efficiency"] += r["efficiency"]
+        acc["count"] += 1
+        acc["sum_power"] += r["power"]
+        acc["anomaly_count"] += int(r["anomaly"])
+    return list(buckets.values())
+
+
+def save_readings(conn, rows):
+    """Insert a batch of reading dicts and fold them into the rollups (caller owns the transaction)"""
+    conn.executemany(INSERT_READING, rows)
+    conn.executemany(UPSERT_MINUTE, _rollup(rows, lambda r: r["ts_ms"] // 60000 * 60000))
+    conn.executemany(UPSERT_HOUR, _rollup(rows, lambda r: r["ts_ms"] // 3600000 * 3600000))
+    conn.executemany(UPSERT_DAY, _rollup(rows, lambda r: r["timestamp"][:10]))
+
+
+def load_spool_position(conn):
+    """Next spool record the writer has not committed"""
+    return conn.execute("SELECT committed FROM spool_position WHERE id = 0").fetchone()[0]
+
+
+def save_spool_position(conn, committed):
+    """Record the spool position in the transaction that saved the records before it"""
+    conn.execute("UPDATE spool_position SET committed = ? WHERE id = 0", (committed,))
+
+
+def _device_filter(device_id):
+    """SQL condition and parameters restricting a query to one device (or none)"""
+    if device_id is None:
+        return "1", ()
+    return "device_id = ?", (device_id,)
+
+
+def daily_stats(conn, day, device_id=None):
+    """Aggregates for one local day ('YYYY-MM-DD') from the day rollup, for one device or all of them"""
+    where, params = _device_filter(device_id)
+    max_co_in, sum_efficiency, count, sum_power, anomaly_count = conn.execute(f"""
+        SELECT MAX(max_co_in), SUM(sum_efficiency), SUM(count), SUM(sum_power), SUM(anomaly_count)
+        FROM rollup_day WHERE day = ? AND {where}
+    """, (day,) + params).fetchone()
+    if not count:
+        return {"count": 0, "max_co_in": 0, "avg_efficiency": 0, "total_power": 0, "anomaly_count": 0}
+    return {
+        "count": count,
+        "max_co_in": max_co_in,
+        "avg_efficiency": sum_efficiency / count,
+        "total_power": sum_power,
+        "anomaly_count": anomaly_count,
+    }
+
+
+def _rollup_series(conn, table, bucket, from_ms, to_ms, device_id):
+    arrays = {name: array('d') for name in ("timestamp", "co_in", "co_out", "efficiency", "power")}
+    where, params = _device_filter(device_id)
+    rows = conn.execute(f"""
+        SELECT {bucket} / 1000.0, SUM(sum_co_in) / SUM(count), SUM(sum_co_out) / SUM(count),
+               SUM(sum_efficiency) / SUM(count), SUM(sum_power) / SUM(count)
+        FROM {table}
+        WHERE {bucket} >= ? AND {bucket} < ? AND {where}
+        GROUP BY {bucket}
+        ORDER BY {bucket}
+    """, (from_ms, to_ms) + params)
+    columns = list(arrays.values())
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+    return arrays
+
+
+def minute_series(conn, from_ms, to_ms, device_id=None):
+    """Per-minute averages in [from_ms, to_ms) from the minute rollup, as column arrays"""
+    return _rollup_series(conn, "rollup_minute", "minute_ms", from_ms, to_ms, device_id)
+
+
+def hour_series(conn, from_ms, to_ms, device_id=None):
+    """Per-hour averages in [from_ms, to_ms) from the hour rollup, as column arrays"""
+    return _rollup_series(conn, "rollup_hour", "hour_ms", from_ms, to_ms, device_id)
+
+
+def update_scores(conn, device_id, from_ms, to_ms, rowids, scores):
+    """Overwrite the detector outputs of one device's readings in [from_ms, to_ms] and fix up the
+    rollups' anomaly counts; `scores` has anomaly, anomaly_score and predicted_efficiency arrays
+    aligned with `rowids`. The range must not reach back before the archive horizon, or rollups
+    would be recounted from readings no longer in the table. Caller owns the transaction."""
+    conn.executemany("""
+        UPDATE readings SET anomaly = ?, anomaly_score = ?, predicted_efficiency = ?
+        WHERE rowid = ?
+    """, ((int(a), float(s), float(p), int(r)) for r, a, s, p in
+          zip(rowids, scores["anomaly"], scores["anomaly_score"], scores["predicted_efficiency"])))
+    conn.execute("""
+        UPDATE rollup_minute SET anomaly_count = (
+            SELECT COUNT(*) FROM readings r
+            WHERE r.device_id = rollup_minute.device_id AND r.anomaly
+              AND r.ts_ms >= rollup_minute.minute_ms AND r.ts_ms < rollup_minute.minute_ms + 60000)
+        WHERE device_id = ? AND minute_ms >= ? AND minute_ms <= ?
+    """, (device_id, from_ms // 60000 * 60000, to_ms))
+    conn.execute("""
+        UPDATE rollup_hour SET anomaly_count = (
+            SELECT COALESCE(SUM(m.anomaly_count), 0) FROM rollup_minute m
+            WHERE m.device_id = rollup_hour.device_id
+              AND m.minute_ms >= rollup_hour.hour_ms AND m.minute_ms < rollup_hour.hour_ms + 3600000)
+        WHERE device_id = ? AND hour_ms >= ? AND hour_ms <= ?
+    """, (device_id, from_ms // 3600000 * 3600000, to_ms))
+    days = [row[0] for row in conn.execute("""
+        SELECT DISTINCT substr(timestamp, 1, 10) FROM readings
+        WHERE device_id = ? AND ts_ms >= ? AND ts_ms <= ?
+    """, (device_id, from_ms, to_ms))]
+    conn.executemany("""
+        UPDATE rollup_day SET anomaly_count = (
+            SELECT COUNT(*) FROM readings r
+            WHERE r.device_id = rollup_day.device_id AND r.anomaly AND substr(r.timestamp, 1, 10) = rollup_day.day
+              AND r.ts_ms >= ? AND r.ts_ms < ?)  -- keeps the recount on the (device_id, ts_ms) index
+        WHERE device_id = ? AND day = ?
+    """, ((from_ms - 86_400_000 * 2, to_ms + 86_400_000 * 2, device_id, day) for day in days))
@@ -0,0 +1,161 @@
+import queue
+import threading
+import time
+
+import serial
+
+from frame_parser import FrameSplitter
+from metrics import RateLimitedLog
+
+MAX_FRAME_BYTES = 1024  # A "line" longer than this is noise; drop it and resynchronise on the next newline
+
+
+class DropOldestQueue(queue.Queue):
+    """Bounded queue whose producers never block: when full, the oldest item is discarded"""
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self.dropped = 0
+
+    def offer(self, item):
+        while True:
+            try:
+                self.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+
+class SerialReader:
+    """Serial ingestion pipeline: an I/O thread that splits bytes into frames, and a worker that handles them.
+
+    The port is opened lazily on the I/O thread and reopened with exponential
+    backoff whenever it disappears, so a missing Pico never breaks startup.
+    Frames (text lines or binary frames, see frame_parser) go through a bounded
+    drop-oldest queue to `handle_line(frame)`, which returns False for a
+    malformed frame. `timer(stage, seconds)`, if
+    given, is told how long each read of already-waiting bytes took to frame.
+    """
+
+    def __init__(self, port, baudrate, handle_line, max_queue=1000, read_timeout=0.1,
+                 min_backoff=0.5, max_backoff=30.0, log=None, timer=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.handle_line = handle_line
+        self.read_timeout = read_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.log = log or RateLimitedLog()
+        self.timer = timer
+        self.lines = DropOldestQueue(max_queue)
+
+        self.splitter = FrameSplitter(MAX_FRAME_BYTES)
+        self._ser = None
+        self._threads = []
+        self._running = False
+
+        self.connected = False
+        self.reconnects = 0
+        self.bytes_read = 0
+        self.frames = 0
+        self.malformed = 0
+        self.errors = 0
+
+    def start(self):
+        if self._threads:
+            return
+        self._running = True
+        for target, name in ((self._io_loop, "serial-io"), (self._work_loop, "serial-worker")):
+            t = threading.Thread(target=target, name=name)
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout=5):
+        self._running = False
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+        self._close()
+
+    def stats(self):
+        return {
+            "port": self.port,
+            "connected": self.connected,
+            "reconnects": self.reconnects,
+            "bytes_read": self.bytes_read,
+            "frames": self.frames,
+            "queue_depth": self.lines.qsize(),
+            "dropped": self.lines.dropped,
+            "oversized": self.splitter.oversized,
+            "resync_bytes": self.splitter.resync_bytes,
+            "malformed": self.malformed,
+            "errors": self.errors,
+        }
+
+    def _open(self):
+        return serial.Serial(self.port, self.baudrate, timeout=self.read_timeout)
+
+    def _close(self):
+        if self._ser is not None:
+            try:
+                self._ser.close()
+            except (serial.SerialException, OSError):
+                pass
+        self._ser = None
+        self.connected = False
+
+    def _io_loop(self):
+        backoff = self.min_backoff
+        while self._running:
+            if self._ser is None:
+                try:
+                    self._ser = self._open()
+                except (serial.SerialException, OSError) as e:
+                    self.log.warning("open", "🔌 Serial port %s unavailable, retrying in %.1fs: %s",
+                                     self.port, backoff, e)
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+                self.log.info("connected", "🟢 Connected to serial port %s at %s baud.", self.port, self.baudrate)
+                self.connected = True
+                self.splitter.clear()
+                backoff = self.min_backoff
+
+            try:
+                waiting = self._ser.in_waiting
+                started = time.perf_counter()
+                chunk = self._ser.read(waiting or 1)
+            except (serial.SerialException, OSError) as e:
+                self.log.error("read", "❌ Serial port %s lost: %s", self.port, e)
+                self._close()
+                self.reconnects += 1
+                continue
+            if chunk:
+                self.bytes_read += len(chunk)
+                self._feed(chunk)
+                # A read that had to block for its first byte would time the device, not the pipeline
+                if waiting and self.timer is not None:
+                    self.timer("serial_read", time.perf_counter() - started)
+
+    def _feed(self, chunk):
+        for frame in self.splitter.feed(chunk):
+            self.frames += 1
+            self.lines.offer(frame)
+
+    def _work_loop(self):
+        while self._running:
+            try:
+                line = self.lines.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                if self.handle_line(line) is False:
+                    self.malformed += 1
+            except Exception as e:
+                self.errors += 1
+                self.log.error("handle", "❌ Error processing serial frame: %s", e)
@@ -0,0 +1,249 @@
+"""Deterministic sensor load generator and export replayer.
+
+    python simulator.py --profile car --devices 4 --rate 2000 --seed 7 --registry sim_devices.json
+    DEVICES_FILE=sim_devices.json python backend_routes.py
+
+    python simulator.py --replay sensor_data_24h.csv --speed 60 --registry sim_devices.json
+
+Every virtual device writes Pico-style frames (JSON lines by default, --frame
+csv|binary for the compact formats in frame_parser) to a pseudo-terminal of its
+own, so readings take the same serial ingest path as real hardware; --registry
+writes a device registry pointing the backend at those ports. --stdout prints
+the frames instead. Same --seed, same readings. POSIX only for ptys.
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import time
+
+from csv_export import parse_time
+from frame_parser import ENCODERS
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # Replaying Parquet exports needs pyarrow
+    pq = None
+
+REPLAY_DEVICE = "replay"  # device_id of replayed rows from exports without a device_id column
+
+# Vehicle profiles, as data. Step curves hold [readings, CO_IN ppm, efficiency %] per step
+# (the last step repeats forever); noise profiles draw CO_IN and the CO drop uniformly.
+PROFILES = {
+    "bike": {"steps": [[3, 0.25, 0], [1, 2800, 85], [1, 3200, 88], [6, 3749, 92], [1, 2800, 90],
+                       [1, 1800, 88], [1, 1100, 86], [1, 800, 85], [1, 0.25, 85]],
+             "voltage": [2.5, 3.0], "current": [270, 290]},
+    "car": {"steps": [[2, 2200, 88], [3, 2800, 90], [6, 2950, 92], [2, 2400, 90], [2, 1800, 88], [1, 800, 85]],
+            "voltage": [2.5, 3.0], "current": [270, 290]},
+    "bus": {"steps": [[4, 1500, 86], [3, 3100, 90], [8, 3400, 93], [3, 2600, 91], [4, 1500, 88], [1, 900, 85]],
+            "voltage": [2.5, 3.0], "current": [270, 290]},
+    "pico": {"co_in": [30, 160], "co_drop": [5, 30], "voltage": [2.5, 3.0], "current": [270, 290]},
+    "mock": {"co_in": [30, 160], "co_drop": [5, 30], "voltage": [1.5, 5], "current": [20, 150]},
+}
+
+
+class VirtualDevice:
+    """One simulated sensor: successive readings of a profile, reproducible from `seed`"""
+
+    def __init__(self, device_id, profile="pico", vehicle=None, seed=None, profiles=PROFILES):
+        if profile not in profiles:
+            raise ValueError(f"Unknown profile '{profile}', use one of: {', '.join(profiles)}")
+        self.device_id = device_id
+        self.vehicle = vehicle
+        self.profile = profiles[profile]
+        self.rng = random.Random(f"{seed}:{device_id}" if seed is not None else None)
+        self.step = 0
+        self._curve = []
+        for hold, co_in, efficiency in self.profile.get("steps", []):
+            self._curve += [(co_in, efficiency)] * hold
+
+    def reading(self):
+        """Next reading's sensor values (no timestamp, no anomaly scoring)"""
+        p, rng = self.profile, self.rng
+        if self._curve:
+            co_in, efficiency = self._curve[min(self.step, len(self._curve) - 1)]
+            co_out = round(co_in * (1 - efficiency / 100), 2)
+        else:
+            co_in = round(rng.uniform(*p["co_in"]), 2)
+            co_out = round(co_in - rng.uniform(*p["co_drop"]), 2)
+            efficiency = round((co_in - co_out) / co_in * 100, 2)
+        voltage = round(rng.uniform(*p["voltage"]), 2)
+        current = round(rng.uniform(*p["current"]), 2)
+        self.step += 1
+        return {
+            "co_in": co_in,
+            "co_out": co_out,
+            "efficiency": efficiency,
+            "voltage": voltage,
+            "current": current,
+            "power": round(voltage * current, 2),
+        }
+
+    def pico_line(self):
+        return pico_line(self.reading())
+
+
+def pico_line(reading):
+    """A reading as the JSON line the Pico firmware prints"""
+    return json.dumps({
+        "CO_IN": reading["co_in"],
+        "CO_OUT": reading["co_out"],
+        "V_bus": reading["voltage"],
+        "current": reading["current"],
+        "power": reading["power"],
+    }) + "\n"
+
+
+def paced(items, rate, duration=None):
+    """Yield items at `rate` per second overall (unpaced if rate is 0), for at most `duration` seconds.
+
+    Items are released in bursts every few milliseconds, so thousands per
+    second cost a handful of sleeps rather than one per item.
+    """
+    start = time.monotonic()
+    sent = 0
+    for item in items:
+        now = time.monotonic()
+        if duration is not None and now - start >= duration:
+            return
+        if rate:
+            due_at = start + sent / rate
+            if due_at > now:
+                time.sleep(max(due_at - now, 0.002))
+        yield item
+        sent += 1
+
+
+def simulate(devices):
+    """Endless round-robin of (device, reading) over `devices`"""
+    while True:
+        for device in devices:
+            yield device, device.reading()
+
+
+def read_export(path):
+    """(epoch seconds, device_id, reading) rows of a CSV or Parquet export, in file order"""
+    if path.endswith(".parquet"):
+        if pq is None:
+            raise ValueError("Replaying Parquet needs pyarrow")
+        for batch in pq.ParquetFile(path).iter_batches():
+            for row in batch.to_pylist():
+                yield _replay_row(row)
+    else:
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                yield _replay_row(row)
+
+
+def _replay_row(row):
+    ts = row["timestamp"]
+    ts = ts.timestamp() if hasattr(ts, "timestamp") else parse_time(ts)
+    reading = {f: float(row.get(f) or 0) for f in ("co_in", "co_out", "voltage", "current", "power")}
+    return ts, row.get("device_id") or REPLAY_DEVICE, reading
+
+
+def replay(rows, speed):
+    """Yield (device_id, reading) at `speed` times the recorded pace (speed 0: as fast as possible)"""
+    start = first = None
+    for ts, device_id, reading in rows:
+        if speed:
+            if first is None:
+                start, first = time.monotonic(), ts
+            wait = start + (ts - first) / speed - time.monotonic()
+            if wait > 0.002:
+                time.sleep(wait)
+        yield device_id, reading
+
+
+class PtyOutput:
+    """One pseudo-terminal per device id, opened on first use"""
+
+    def __init__(self):
+        import tty
+        self._tty = tty
+        self.ports = {}  # device_id -> (master fd, slave path)
+
+    def port(self, device_id):
+        if device_id not in self.ports:
+            master, slave = os.openpty()
+            self._tty.setraw(slave)
+            self.ports[device_id] = (master, os.ttyname(slave))
+            print(f"🔌 {device_id} on {self.ports[device_id][1]}", file=sys.stderr)
+        return self.ports[device_id]
+
+    def write(self, device_id, frame):
+        os.write(self.port(device_id)[0], frame)
+
+
+class StdoutOutput:
+    def write(self, device_id, frame):
+        if frame[:1] == b"{":
+            try:
+                frame = json.dumps({"device_id": device_id, **json.loads(frame)}).encode() + b"\n"
+            except ValueError:
+                pass  # Corrupted on purpose by --noise
+        sys.stdout.buffer.write(frame)
+        sys.stdout.flush()
+
+
+def write_registry(path, ports, vehicles):
+    """Device registry (see devices.example.json) for the ptys, to hand to the backend as DEVICES_FILE"""
+    with open(path, "w") as f:
+        json.dump({"devices": [{"device_id": device_id, "vehicle": vehicles.get(device_id), "source": "serial",
+                                "port": port} for device_id, (_, port) in ports.items()]}, f, indent=2)
+    print(f"📝 Device registry written to {path}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", default="pico", help=f"one of: {', '.join(PROFILES)}")
+    parser.add_argument("--profiles", help="JSON file of extra profiles, same shape as PROFILES")
+    parser.add_argument("--devices", type=int, default=1, help="number of virtual devices")
+    parser.add_argument("--rate", type=float, default=1.0, help="readings per second over all devices (0 = unpaced)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--frame", default="json", choices=ENCODERS, help="wire format of the frames")
+    parser.add_argument("--noise", type=float, default=0.0, help="fraction of frames to corrupt")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    parser.add_argument("--replay", help="CSV or Parquet export to replay instead of simulating")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up (0 = as fast as possible)")
+    parser.add_argument("--registry", help="write a device registry for the ptys to this path")
+    parser.add_argument("--stdout", action="store_true", help="print the frames instead of opening ptys")
+    args = parser.parse_args()
+
+    profiles = dict(PROFILES)
+    if args.profiles:
+        with open(args.profiles) as f:
+            profiles.update(json.load(f))
+
+    encode = ENCODERS[args.frame]
+    output = StdoutOutput() if args.stdout else PtyOutput()
+    vehicles = {}
+    if args.replay:
+        rows = ((device_id, encode(reading)) for device_id, reading in replay(read_export(args.replay), args.speed))
+        if not args.stdout:
+            # Open every device's port up front so the registry is complete before the backend starts
+            for _, device_id, _ in read_export(args.replay):
+                output.port(device_id)
+    else:
+        devices = [VirtualDevice(f"sim-{args.profile}-{i + 1}", args.profile, vehicle=args.profile, seed=args.seed,
+                                 profiles=profiles) for i in range(args.devices)]
+        vehicles = {d.device_id: d.vehicle for d in devices}
+        rows = paced(((d.device_id, encode(r)) for d, r in simulate(devices)), args.rate, args.duration)
+        if not args.stdout:
+            for d in devices:
+                output.port(d.device_id)
+    if args.registry and not args.stdout:
+        write_registry(args.registry, output.ports, vehicles)
+
+    noise = random.Random(args.seed)
+    for device_id, frame in rows:
+        if args.noise and noise.random() < args.noise:
+            frame = bytes(noise.randint(0, 255) for _ in range(noise.randint(1, 40))) + frame[len(frame) // 2:]
+        output.write(device_id, frame)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from metrics import RateLimitedLog
+
+# One fixed-size record per reading, CRC-32 of everything before the CRC at the end. `seq` is the
+# reading's position in the spool since it was created, so a record is only valid in its own slot.
+RECORD = struct.Struct("<qq8dB32s64sI")
+TIMESTAMP_BYTES = 32  # Longest UTF-8 timestamp and device_id a record holds
+DEVICE_ID_BYTES = 64
+VALUES = ("co_in", "co_out", "efficiency", "voltage", "current", "power", "predicted_efficiency", "anomaly_score")
+SEGMENT_RECORDS = 65536  # Records per segment file (~12 MiB)
+
+
+def encode_record(seq, row):
+    """A row as the record for slot `seq`; ValueError if its timestamp or device_id doesn't fit"""
+    timestamp, device_id = row["timestamp"].encode(), row["device_id"].encode()
+    if len(timestamp) > TIMESTAMP_BYTES or len(device_id) > DEVICE_ID_BYTES:
+        raise ValueError(f"timestamp or device_id too long for a spool record: {row['device_id']!r}")
+    body = RECORD.pack(seq, row["ts_ms"], *(row[v] for v in VALUES), row["anomaly"],
+                       timestamp, device_id, 0)[:-4]
+    return body + zlib.crc32(body).to_bytes(4, "little")
+
+
+def record_intact(seq, data):
+    """Whether `data` is a complete record written to slot `seq`"""
+    return (zlib.crc32(data[:-4]) == int.from_bytes(data[-4:], "little")
+            and int.from_bytes(data[:8], "little", signed=True) == seq)
+
+
+def decode_record(seq, data):
+    """The row stored in a record, or None if it isn't a complete, readable record for slot `seq`"""
+    if not record_intact(seq, data):
+        return None
+    _, ts_ms, *values, anomaly, timestamp, device_id, _ = RECORD.unpack(data)
+    try:
+        timestamp, device_id = timestamp.rstrip(b"\0").decode(), device_id.rstrip(b"\0").decode()
+    except UnicodeDecodeError:  # Only from a spool written before long values were rejected
+        return None
+    row = dict(zip(VALUES, values))
+    row.update(ts_ms=ts_ms, anomaly=anomaly, timestamp=timestamp, device_id=device_id)
+    return row
+
+
+class Spool:
+    """Append-only, memory-mapped log of readings between the ingest pipeline and the database writer.
+
+    append() copies one checksummed record into the mapped segment and returns;
+    it never waits for SQLite. The writer reads batches from its committed
+    position and records the new position in the same transaction as the rows
+    (see IngestWriter), so after a crash or a failed commit the uncommitted
+    records are simply read again. Segments are preallocated files of
+    `segment_records` records, deleted once every record in them is committed.
+    A record cut short by a crash fails its CRC and marks the end of the spool;
+    an intact one that doesn't decode is logged and skipped by read().
+    """
+
+    def __init__(self, directory, segment_records=SEGMENT_RECORDS, max_segments=None, log=None):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.max_segments = max_segments  # None: bounded only by the disk
+        self.log = log or RateLimitedLog()
+
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._maps = {}  # segment -> (file, mmap)
+        self._opened = False
+        self._woken = False
+
+        self.committed = 0  # Next record the writer needs
+        self.appended = 0   # Next record append() writes
+        self.replayed = 0
+        self.dropped = 0
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f"spool-{segment:010d}.seg")
+
+    def _segments(self):
+        return sorted(int(name[6:16]) for name in os.listdir(self.directory)
+                      if name.startswith("spool-") and name.endswith(".seg"))
+
+    def _map(self, segment):
+        if segment not in self._maps:
+            path = self._path(segment)
+            size = self.segment_records * RECORD.size
+            file = open(path, "r+b" if os.path.exists(path) else "w+b")
+            if os.fstat(file.fileno()).st_size < size:
+                file.truncate(size)  # Sparse zeroes, which never pass the CRC
+            self._maps[segment] = (file, mmap.mmap(file.fileno(), size))
+        return self._maps[segment][1]
+
+    def _slot(self, seq):
+        segment, index = divmod(seq, self.segment_records)
+        return self._map(segment), index * RECORD.size
+
+    def open(self, committed):
+        """Map the spool and find its end, resuming after the writer's last committed record"""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            for segment in self._segments():
+                if (segment + 1) * self.segment_records <= committed:
+                    os.remove(self._path(segment))
+            self.committed = self.appended = committed
+            existing = set(self._segments())
+            while self.appended // self.segment_records in existing:
+                mm, offset = self._slot(self.appended)
+                if not record_intact(self.appended, mm[offset:offset + RECORD.size]):
+                    break
+                self.appended += 1
+            self.replayed = self.appended - committed
+            self._opened = True
+        if self.replayed:
+            print(f"♻️ Replaying {self.replayed} uncommitted readings from {self.directory}")
+
+    def close(self):
+        with self._lock:
+            for file, mm in self._maps.values():
+                mm.flush()
+                mm.close()
+                file.close()
+            self._maps.clear()
+            self._opened = False
+
+    def append(self, row):
+        """Copy a row into the spool; False if it isn't open or is out of segments (the reading is dropped)"""
+        with self._lock:
+            if not self._opened:
+                self.dropped += 1
+                return False
+            seq = self.appended
+            try:
+                if self.max_segments is not None and \
+                        seq // self.segment_records - self.committed // self.segment_records >= self.max_segments:
+                    raise OSError("spool full")
+                mm, offset = self._slot(seq)
+                mm[offset:offset + RECORD.size] = encode_record(seq, row)
+            except (OSError, ValueError) as e:
+                self.dropped += 1
+                self.log.error("spool", "❌ Spool append failed, reading dropped: %s", e)
+                return False
+            self.appended = seq + 1
+            self._ready.notify()
+        return True
+
+    def pending(self):
+        return self.appended - self.committed
+
+    def wait(self, count, timeout):
+        """Block until `count` records are uncommitted or wake() is called, at most `timeout` seconds"""
+        with self._lock:
+            self._ready.wait_for(lambda: self.appended - self.committed >= count or self._woken, timeout)
+            self._woken = False
+
+    def wake(self):
+        with self._lock:
+            self._woken = True
+            self._ready.notify_all()
+
+    def read(self, limit):
+        """(rows, end): up to `limit` uncommitted rows and the position after them"""
+        with self._lock:
+            start, end = self.committed, min(self.appended, self.committed + limit)
+            records = []
+            for seq in range(start, end):
+                mm, offset = self._slot(seq)
+                records.append(mm[offset:offset + RECORD.size])
+        rows = []
+        for seq, data in enumerate(records, start):  # Decoded outside the lock, appends carry on meanwhile
+            row = decode_record(seq, data)
+            if row is None:  # Only if the file was changed underneath us
+                self.log.error("spool_corrupt", "❌ Spool record %d is corrupt, skipping it", seq)
+            else:
+                rows.append(row)
+        return rows, end
+
+    def commit(self, end):
+        """The writer committed everything before `end`; segments that are done are deleted"""
+        with self._lock:
+            self.committed = end
+            for segment in [s for s in self._maps if (s + 1) * self.segment_records <= end]:
+                file, mm = self._maps.pop(segment)
+                mm.close()
+                file.close()
+                os.remove(self._path(segment))
+
+    def sync(self):
+        """Write dirty pages of the mapped segments back to their files (survives an OS crash, not just ours)"""
+        with self._lock:
+            maps = [mm for _, mm in self._maps.values()]
+        for mm in maps:
+            mm.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "committed": self.committed,
+                "appended": self.appended,
+                "pending": self.appended - self.committed,
+                "segments": len(self._maps),
+                "replayed": self.replayed,
+                "dropped": self.dropped,
+            }
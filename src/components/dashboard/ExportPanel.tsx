@@ -6,28 +6,48 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@
 import { Download, FileText } from 'lucide-react';
 import { useToast } from '@/hooks/use-toast';
 
+// Export window lengths in seconds, sent to the backend as a from/to range
+const WINDOW_SECONDS: Record<string, number> = {
+  '1h': 60 * 60,
+  '6h': 6 * 60 * 60,
+  '24h': 24 * 60 * 60,
+  '7d': 7 * 24 * 60 * 60,
+};
+
+// Columnar formats are typed and much smaller than CSV for multi-day exports
+const FORMATS: Record<string, { label: string; extension: string }> = {
+  csv: { label: 'CSV', extension: 'csv' },
+  parquet: { label: 'Parquet', extension: 'parquet' },
+  arrow: { label: 'Arrow', extension: 'arrow' },
+  npz: { label: 'NPZ', extension: 'npz' },
+};
+
 export const ExportPanel: React.FC = () => {
   const [isExporting, setIsExporting] = useState(false);
   const [timeWindow, setTimeWindow] = useState('24h');
+  const [format, setFormat] = useState('csv');
   const { toast } = useToast();
 
   const handleExport = async () => {
     setIsExporting(true);
     try {
-      const response = await fetch('http://localhost:5001/export/csv');
+      const to = Date.now() / 1000;
+      const from = to - WINDOW_SECONDS[timeWindow];
+      const url = format === 'csv'
+        ? `http://localhost:5001/export/csv?from=${from}&to=${to}`
+        : `http://localhost:5001/export?format=${format}&from=${from}&to=${to}`;
+      const response = await fetch(url);
       if (response.ok) {
-        const csvData = await response.text();
-        
-        // Create and download the CSV file
-        const blob = new Blob([csvData], { type: 'text/csv' });
-        const url = window.URL.createObjectURL(blob);
+        // Create and download the export file
+        const blob = await response.blob();
+        const blobUrl = window.URL.createObjectURL(blob);
         const link = document.createElement('a');
-        link.href = url;
-        link.download = `sensor_data_${timeWindow}.csv`;
+        link.href = blobUrl;
+        link.download = `sensor_data_${timeWindow}.${FORMATS[format].extension}`;
         document.body.appendChild(link);
         link.click();
         document.body.removeChild(link);
-        window.URL.revokeObjectURL(url);
+        window.URL.revokeObjectURL(blobUrl);
 
         toast({
           title: "✅ Export Complete",
@@ -74,6 +94,23 @@ export const ExportPanel: React.FC = () => {
           </Select>
         </div>
 
+        <div className="space-y-2">
+          <label className="text-xs font-medium text-slate-700 dark:text-slate-300">
+            Format
+          </label>
+          <Select value={format} onValueChange={setFormat}>
+            <SelectTrigger className="h-8">
+              <SelectValue placeholder="Select format" />
+            </SelectTrigger>
+            <SelectContent>
+              <SelectItem value="csv">CSV</SelectItem>
+              <SelectItem value="parquet">Parquet</SelectItem>
+              <SelectItem value="arrow">Arrow IPC</SelectItem>
+              <SelectItem value="npz">NumPy (.npz)</SelectItem>
+            </SelectContent>
+          </Select>
+        </div>
+
         <Button 
           onClick={handleExport}
           disabled={isExporting}
@@ -89,7 +126,7 @@ export const ExportPanel: React.FC = () => {
           ) : (
             <>
               <Download className="mr-2 h-3 w-3" />
-              Export CSV
+              Export {FORMATS[format].label}
             </>
           )}
         </Button>
@@ -1,5 +1,5 @@
 
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from 'recharts';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
@@ -16,10 +16,42 @@ interface RealtimeChartProps {
   data: ChartData[];
 }
 
+type ChartRange = 'live' | '1h' | '24h';
+
+// Longer ranges are fetched from the backend already downsampled to a few hundred points
+const RANGE_SECONDS: Record<Exclude<ChartRange, 'live'>, number> = {
+  '1h': 60 * 60,
+  '24h': 24 * 60 * 60,
+};
+const RANGE_POINTS = 300;
+
 export const RealtimeChart: React.FC<RealtimeChartProps> = ({ data }) => {
   const [activeMetric, setActiveMetric] = useState<'co_in' | 'co_out' | 'efficiency_actual'>('co_in');
+  const [range, setRange] = useState<ChartRange>('live');
+  const [rangeData, setRangeData] = useState<ChartData[]>([]);
+
+  useEffect(() => {
+    if (range === 'live') {
+      return;
+    }
+    const metric = activeMetric === 'efficiency_actual' ? 'efficiency' : activeMetric;
+    const from = Date.now() / 1000 - RANGE_SECONDS[range];
+    fetch(`http://localhost:5001/history?from=${from}&points=${RANGE_POINTS}&metric=${metric}`)
+      .then(response => response.json())
+      .then(rows => {
+        if (Array.isArray(rows)) {
+          setRangeData(rows.map(row => ({
+            co_in: row.co_in,
+            co_out: row.co_out,
+            efficiency_actual: row.efficiency,
+            timestamp: new Date(row.timestamp)
+          })));
+        }
+      })
+      .catch(error => console.error('❌ Error fetching history range:', error));
+  }, [range, activeMetric]);
 
-  const chartData = data.map((item, index) => ({
+  const chartData = (range === 'live' ? data : rangeData).map((item, index) => ({
     time: index,
     co_in: item.co_in,
     co_out: item.co_out,
@@ -65,6 +97,16 @@ export const RealtimeChart: React.FC<RealtimeChartProps> = ({ data }) => {
             <CardTitle className="text-lg">Real-Time Monitoring</CardTitle>
           </div>
           <div className="flex space-x-2">
+            {(['live', '1h', '24h'] as ChartRange[]).map(option => (
+              <Button
+                key={option}
+                variant={range === option ? 'secondary' : 'ghost'}
+                size="sm"
+                onClick={() => setRange(option)}
+              >
+                {option === 'live' ? 'Live' : option}
+              </Button>
+            ))}
             <Button
               variant={activeMetric === 'co_in' ? 'default' : 'outline'}
               size="sm"
@@ -125,7 +167,9 @@ export const RealtimeChart: React.FC<RealtimeChartProps> = ({ data }) => {
         </div>
         <div className="mt-4 text-center">
           <p className="text-sm text-slate-600 dark:text-slate-400">
-            Showing {config.label} over the last {chartData.length} readings
+            {range === 'live'
+              ? `Showing ${config.label} over the last ${chartData.length} readings`
+              : `Showing ${config.label} over the last ${range} (${chartData.length} points)`}
           </p>
         </div>
       </CardContent>
@@ -0,0 +1,76 @@
+// Decoder for the compact binary reading lists sent by the backend (see wire_format.py):
+// opt in with ?wire=binary on /history or on the socket connection.
+
+export const WIRE_MIMETYPE = 'application/x-sensor-readings';
+
+const VERSION = 2;
+const NUMERIC_FIELDS = [
+  'co_in', 'co_out', 'efficiency', 'predicted_efficiency', 'voltage', 'current', 'power', 'anomaly_score',
+] as const;
+const LABEL_FIELDS = ['recommendation', 'device_id', 'vehicle'] as const;
+const MISSING = 0xffff;
+const ANOMALY = 0x01;
+const HAS_SEQ = 0x01;
+const HEADER_SIZE = 8;
+const RECORD_SIZE = 8 + 4 * NUMERIC_FIELDS.length + 1 + 2 * LABEL_FIELDS.length;
+
+export type WireReading = Record<string, string | number | boolean>;
+
+const pad = (n: number, width = 2) => String(n).padStart(width, '0');
+
+// Local time without an offset, like the backend's datetime.isoformat() (microseconds only when non-zero),
+// so binary and JSON readings bucket into the same local days
+const localIsoString = (ms: number): string => {
+  const d = new Date(ms);
+  const iso = `${d.getFullYear()}-${pad(d.getMonth() + 1)}-${pad(d.getDate())}T${pad(d.getHours())}:` +
+    `${pad(d.getMinutes())}:${pad(d.getSeconds())}`;
+  return d.getMilliseconds() ? `${iso}.${pad(d.getMilliseconds(), 3)}000` : iso;
+};
+
+export const decodeReadings = (buffer: ArrayBuffer): WireReading[] => {
+  const view = new DataView(buffer);
+  if (view.getUint8(0) !== 0x53 || view.getUint8(1) !== 0x52 || view.getUint8(2) !== VERSION) {
+    throw new Error(`Not a version ${VERSION} sensor readings payload`);
+  }
+  const hasSeq = (view.getUint8(3) & HAS_SEQ) !== 0;
+  const recordSize = RECORD_SIZE + (hasSeq ? 8 : 0);
+  const count = view.getUint32(4, true);
+
+  const decoder = new TextDecoder();
+  let offset = HEADER_SIZE;
+  const tables = LABEL_FIELDS.map(() => {
+    const n = view.getUint16(offset, true);
+    offset += 2;
+    const table: string[] = [];
+    for (let i = 0; i < n; i++) {
+      const length = view.getUint16(offset, true);
+      table.push(decoder.decode(new Uint8Array(buffer, offset + 2, length)));
+      offset += 2 + length;
+    }
+    return table;
+  });
+
+  const rows: WireReading[] = [];
+  for (let i = 0; i < count; i++, offset += recordSize) {
+    const row: WireReading = {
+      timestamp: localIsoString(Number(view.getBigInt64(offset, true))),
+    };
+    NUMERIC_FIELDS.forEach((field, j) => {
+      const value = view.getFloat32(offset + 8 + 4 * j, true);
+      if (!Number.isNaN(value)) row[field] = value;
+    });
+    let at = offset + 8 + 4 * NUMERIC_FIELDS.length;
+    row.anomaly = (view.getUint8(at) & ANOMALY) !== 0;
+    at += 1;
+    LABEL_FIELDS.forEach((field, j) => {
+      const code = view.getUint16(at + 2 * j, true);
+      if (code !== MISSING) row[field] = tables[j][code];
+    });
+    if (hasSeq) {
+      const seq = Number(view.getBigInt64(offset + RECORD_SIZE, true));
+      if (seq >= 0) row.seq = seq;
+    }
+    rows.push(row);
+  }
+  return rows;
+};
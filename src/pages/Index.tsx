@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { io, Socket } from 'socket.io-client';
 import { Header } from '@/components/dashboard/Header';
 import { MetricsGrid } from '@/components/dashboard/MetricsGrid';
@@ -8,6 +8,10 @@ import { SummaryStats } from '@/components/dashboard/SummaryStats';
 import { ExportPanel } from '@/components/dashboard/ExportPanel';
 import { ThemeProvider } from '@/components/dashboard/ThemeProvider';
 import { useToast } from '@/hooks/use-toast';
+import { decodeReadings } from '@/lib/wireFormat';
+
+// Set VITE_WIRE_FORMAT=binary to receive readings in the compact binary encoding
+const WIRE_FORMAT = import.meta.env.VITE_WIRE_FORMAT === 'binary' ? 'binary' : 'json';
 
 // Define the interface for sensor data from your backend
 interface SensorData {
@@ -21,6 +25,8 @@ interface SensorData {
   power: number;
   anomaly: boolean;
   recommendation: string;
+  device_id?: string;
+  seq?: number;  // Per-device sequence number, used to resume after a reconnect
 }
 
 interface DailyStats {
@@ -28,8 +34,67 @@ interface DailyStats {
   avg_efficiency: number;
   total_energy: number;
   anomaly_count: number;
+  count?: number;
+  day?: string;
+}
+
+// What a batch of readings adds to the daily stats, sent with every sensor_frame
+interface StatsDelta {
+  day: string;
+  count: number;
+  max_co_in: number;
+  sum_efficiency: number;
+  sum_power: number;
+  anomaly_count: number;
 }
 
+interface SensorFrame {
+  device: string;
+  readings: SensorData[] | ArrayBuffer;
+  stats_delta: StatsDelta | null;
+}
+
+// Sent once on a reconnect that passed the last seen seqs: the readings missed meanwhile, and the
+// devices whose missed readings the server no longer keeps (those need a full refetch)
+interface ResumeFrame extends SensorFrame {
+  missed: string[];
+}
+
+const frameReadings = (frame: SensorFrame): SensorData[] =>
+  frame.readings instanceof ArrayBuffer
+    ? decodeReadings(frame.readings) as unknown as SensorData[]
+    : frame.readings;
+
+// The same delta as the backend's, for the readings of a frame that weren't already seen
+const readingsDelta = (readings: SensorData[]): StatsDelta => {
+  const day = readings[readings.length - 1].timestamp.slice(0, 10);
+  const today = readings.filter(r => r.timestamp.startsWith(day));
+  return {
+    day,
+    count: today.length,
+    max_co_in: Math.max(...today.map(r => r.co_in)),
+    sum_efficiency: today.reduce((sum, r) => sum + r.efficiency, 0),
+    sum_power: today.reduce((sum, r) => sum + r.power, 0),
+    anomaly_count: today.filter(r => r.anomaly).length,
+  };
+};
+
+const mergeStatsDelta = (stats: DailyStats, delta: StatsDelta): DailyStats => {
+  // A new day starts from scratch; stats fetched before the first frame carry no day
+  const base = stats.day && stats.day !== delta.day
+    ? { max_co_in: 0, avg_efficiency: 0, total_energy: 0, anomaly_count: 0, count: 0 }
+    : stats;
+  const count = (base.count ?? 0) + delta.count;
+  return {
+    day: delta.day,
+    count,
+    max_co_in: Math.max(base.max_co_in, delta.max_co_in),
+    avg_efficiency: count ? (base.avg_efficiency * (base.count ?? 0) + delta.sum_efficiency) / count : 0,
+    total_energy: base.total_energy + delta.sum_power / 1000,
+    anomaly_count: base.anomaly_count + delta.anomaly_count,
+  };
+};
+
 const Index = () => {
   console.log('🚀 Index component rendering...');
   
@@ -58,6 +123,8 @@ const Index = () => {
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const { toast } = useToast();
+  // Last sequence number seen per device, sent on reconnect so the server replays only what was missed
+  const lastSeq = useRef<Record<string, number>>({});
 
   console.log('📊 Current state:', { 
     connectionStatus, 
@@ -85,8 +152,10 @@ const Index = () => {
   const fetchHistoricalData = async () => {
     try {
       console.log('📜 Fetching historical data...');
-      const response = await fetch('http://localhost:5001/history');
-      const data = await response.json();
+      const response = await fetch(`http://localhost:5001/history?wire=${WIRE_FORMAT}`);
+      const data = WIRE_FORMAT === 'binary'
+        ? decodeReadings(await response.arrayBuffer())
+        : await response.json();
       console.log('📜 Historical data response:', data);
       if (Array.isArray(data)) {
         setHistoricalData(data);
@@ -101,11 +170,51 @@ const Index = () => {
     
     // Connect to your Flask backend
     const socket: Socket = io('http://localhost:5001', {
-      transports: ['websocket', 'polling']
+      transports: ['websocket', 'polling'],
+      query: { wire: WIRE_FORMAT },
+      auth: (cb) => cb({ seqs: lastSeq.current })
     });
+    let connectedBefore = false;
+
+    // Readings from a frame or a resume; ones already seen (by seq) are skipped
+    const applyReadings = (readings: SensorData[], delta: StatsDelta | null) => {
+      const fresh = readings.filter(r =>
+        r.seq === undefined || r.device_id === undefined || r.seq > (lastSeq.current[r.device_id] ?? -1));
+      fresh.forEach(r => {
+        if (r.seq !== undefined && r.device_id !== undefined) lastSeq.current[r.device_id] = r.seq;
+      });
+      if (!fresh.length) return;
+
+      // Update current data
+      const data = fresh[fresh.length - 1];
+      setCurrentData(data);
+      setLastUpdated(new Date(data.timestamp));
+
+      // Add to historical data (keep last 50 points)
+      setHistoricalData(prev => [...prev, ...fresh].slice(-50));
+
+      // Fold the readings into today's stats instead of refetching them
+      const freshDelta = delta && fresh.length === readings.length ? delta : readingsDelta(fresh);
+      setDailyStats(prev => mergeStatsDelta(prev, freshDelta));
+
+      // Show one anomaly toast per frame
+      const anomalies = fresh.filter(r => r.anomaly);
+      if (anomalies.length) {
+        toast({
+          title: anomalies.length > 1 ? `⚠️ ${anomalies.length} Anomalies Detected` : "⚠️ Anomaly Detected",
+          description: anomalies[anomalies.length - 1].recommendation,
+          variant: "destructive",
+        });
+      }
+    };
 
     socket.on('connect', () => {
       console.log('✅ Connected to backend');
+      // A reconnect with seqs to resume from gets a resume frame; without any, refetch everything
+      if (connectedBefore && !Object.keys(lastSeq.current).length) {
+        fetchInitialData();
+      }
+      connectedBefore = true;
       setConnectionStatus('connected');
       setError(null);
       toast({
@@ -130,33 +239,29 @@ const Index = () => {
       setError(`Connection failed: ${err.message}`);
     });
 
-    socket.on('sensor_data', (data: SensorData) => {
-      console.log('📡 Received sensor data:', data);
-      
+    // Readings arrive batched: at most a couple of frames per second, each with a daily stats delta
+    socket.on('sensor_frame', (frame: SensorFrame) => {
       try {
-        // Update current data
-        setCurrentData(data);
-        setLastUpdated(new Date(data.timestamp));
-        
-        // Add to historical data (keep last 50 points)
-        setHistoricalData(prev => {
-          const updated = [...prev, data].slice(-50);
-          return updated;
-        });
-
-        // Refresh stats when new data arrives
-        fetchDailyStats();
+        const readings = frameReadings(frame);
+        console.log('📡 Received sensor frame:', readings.length, 'readings');
+        applyReadings(readings, frame.stats_delta);
+      } catch (err) {
+        console.error('❌ Error processing sensor data:', err);
+      }
+    });
 
-        // Show anomaly toast if detected
-        if (data.anomaly) {
-          toast({
-            title: "⚠️ Anomaly Detected",
-            description: data.recommendation,
-            variant: "destructive",
-          });
+    // What was missed while disconnected, sent before any new sensor_frame
+    socket.on('resume', (frame: ResumeFrame) => {
+      try {
+        const readings = frameReadings(frame);
+        console.log('⏩ Resumed with', readings.length, 'missed readings');
+        applyReadings(readings, frame.stats_delta);
+        if (frame.missed.length) {
+          console.log('🔄 Server no longer has every missed reading of', frame.missed.join(', '));
+          fetchInitialData();
         }
       } catch (err) {
-        console.error('❌ Error processing sensor data:', err);
+        console.error('❌ Error processing resume frame:', err);
       }
     });
 
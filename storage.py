@@ -0,0 +1,521 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import jsonify
+
+from column_store import ColumnStore, iso_timestamps
+from columnar_export import sqlite_column_arrays
+from db_pool import ReadPool
+from ingest_writer import IngestWriter
+from metrics import stats_families
+from range_query import numpy_query, sql_query
+from reading_store import DeviceStores
+from retention import RetentionManager
+from running_stats import RunningStats, combine_daily, combine_health
+from sensor_db import init_db, save_readings, daily_stats, minute_series, hour_series, update_scores
+from spool import Spool
+
+HISTORY_COLUMNS = ["timestamp", "co_in", "co_out", "efficiency", "power"]
+EXPORT_COLUMNS = ("timestamp", "co_in", "co_out", "efficiency", "voltage", "current", "power", "anomaly",
+                  "predicted_efficiency", "anomaly_score", "device_id")
+SCORE_COLUMNS = ["co_in", "co_out", "efficiency"]
+
+
+def _range_ms(from_ts, to_ts, default_span):
+    """[from_ms, to_ms) for a requested range; a missing `from` means the last `default_span` seconds"""
+    now = datetime.now().timestamp()
+    from_ts = from_ts if from_ts is not None else now - default_span
+    to_ts = to_ts if to_ts is not None else now
+    return int(from_ts * 1000), int(to_ts * 1000)
+
+
+def _export_range(from_ts, to_ts):
+    """[from_ms, to_ms) for exports and rescoring: the last day by default, open-ended unless `to` is given"""
+    from_ts = from_ts if from_ts is not None else (datetime.now() - timedelta(days=1)).timestamp()
+    return int(from_ts * 1000), int(to_ts * 1000) if to_ts is not None else 2 ** 50
+
+
+class MemoryStorage:
+    """Readings kept only in memory: a ring buffer per device plus running daily and health aggregates.
+
+    What the mock servers serve from, and the SQLite storage's recent tail.
+    Ranges default to everything still held.
+    """
+
+    name = "memory"
+
+    def __init__(self, config, on_change=None, timer=None, log=None):
+        self.readings = DeviceStores(config["STORE_CAPACITY"],
+                                     make_stats=lambda: RunningStats(health_window=config["HEALTH_WINDOW"]))
+
+    def open(self):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def register(self, app):
+        pass
+
+    @property
+    def fields(self):
+        return self.readings.fields
+
+    def append(self, reading, ts_ms=None):
+        self.readings.append(reading)
+
+    def follow(self, reading):
+        """Keep a reading another process stored (a cluster worker's view of the ingest process)"""
+        self.readings.append(reading)
+
+    def latest(self, device=None):
+        return self.readings.latest(device)
+
+    def last(self, n, device=None):
+        return self.readings.last(n, device)
+
+    def history(self, from_ts, to_ts, device=None):
+        return self.readings.column_arrays(HISTORY_COLUMNS, from_ts, to_ts, device)[0]
+
+    def query(self, from_ts, to_ts, device, bucket_ms, metrics, aggregates):
+        arrays, _ = self.readings.column_arrays(["timestamp"] + metrics, from_ts, to_ts, device)
+        return numpy_query(arrays, bucket_ms, metrics, aggregates)
+
+    def daily(self, device=None):
+        return combine_daily(s.daily() for s in self.readings.stats(device))
+
+    def health(self, device=None):
+        return combine_health(s.health() for s in self.readings.stats(device))
+
+    def export_arrays(self, columns, from_ts, to_ts, device=None):
+        return self.readings.column_arrays(columns, from_ts, to_ts, device)
+
+    def csv_chunks(self, columns, from_ts, to_ts, device=None, size=1000):
+        return self.readings.chunks(columns, from_ts, to_ts, size=size, device_id=device)
+
+    def rescore(self, engine, from_ts, to_ts, device=None):
+        return {"rescored": self.readings.rescore(SCORE_COLUMNS, engine.rescore, from_ts, to_ts, device)}
+
+    def stats(self):
+        return {"devices": {device_id: len(store) for device_id, store in list(self.readings.stores.items())}}
+
+    def metric_families(self):
+        yield ("sensor_readings_stored", "gauge", "Readings held in memory",
+               [({"device_id": device_id}, count) for device_id, count in self.stats()["devices"].items()])
+
+
+class SqliteStorage:
+    """sensor_data.db behind a single batching writer and a pool of read-only connections.
+
+    Nothing touches the file until open(): the schema is created or migrated
+    on the first request or on start(), whichever comes first, and the writer
+    and retention threads only run after start(); cluster workers (ROLE
+    "worker") only read the file the ingest process writes: they start no
+    writer, schedule no retention and serve no write endpoints. Recent
+    readings are also kept in a MemoryStorage so /data, /history and
+    /system/health rarely reach SQLite. Ranges default to the last day (last
+    hour for /history).
+    """
+
+    name = "sqlite"
+
+    def __init__(self, config, on_change=None, timer=None, log=None):
+        self.config = config
+        self.db_path = config["DB_PATH"]
+        self.log = log
+        self.recent = MemoryStorage(config)
+
+        # Dedicated writer, the only connection that writes: producers only spool (or queue) rows,
+        # batches are committed off-thread. Cluster workers never ingest, so they don't open the spool.
+        self.spool = None
+        if config["SPOOL_DIR"] and config["ROLE"] != "worker":
+            self.spool = Spool(config["SPOOL_DIR"], segment_records=config["SPOOL_SEGMENT_RECORDS"], log=log)
+        self.writer = IngestWriter(self.db_path, save_readings,
+                                   batch_rows=config["INGEST_BATCH_ROWS"], batch_ms=config["INGEST_BATCH_MS"],
+                                   on_flush=on_change, timer=timer, log=log, spool=self.spool)
+        # Request handlers each borrow a read-only connection, so they run in parallel with ingest
+        self.read_pool = ReadPool(self.db_path, size=config["READ_POOL_SIZE"])
+        # Ages raw readings into ARCHIVE_DIR, expires old minute rollups and vacuums, all through the writer;
+        # range queries read across the archive horizon
+        self.retention = RetentionManager(self.writer, self.read_pool, config["ARCHIVE_DIR"],
+                                          raw_days=config["RAW_RETENTION_DAYS"],
+                                          minute_days=config["MINUTE_RETENTION_DAYS"],
+                                          interval=config["RETENTION_INTERVAL"], on_change=on_change, log=log)
+        self._opened = False
+        self._open_lock = threading.Lock()
+
+    def open(self):
+        """Create or migrate the schema, once"""
+        if self._opened:
+            return
+        with self._open_lock:
+            if self._opened:
+                return
+            print(f"Connecting to SQLite database: {self.db_path}")
+            conn = sqlite3.connect(self.db_path)
+            try:
+                init_db(conn)
+            finally:
+                conn.close()
+            print("Database setup completed.\n")
+            self._opened = True
+
+    def start(self):
+        self.open()
+        if self.config["ROLE"] != "worker":  # One process per database writes and schedules retention passes
+            self.writer.start()
+            self.retention.start()
+
+    def stop(self):
+        self.retention.stop()
+        self.writer.stop()
+        self.read_pool.close()
+
+    def register(self, app):
+        """Endpoints that only make sense with a database behind them"""
+
+        @app.route("/ingest/stats")
+        def get_ingest_stats():
+            """Queue depth, flush latency and throughput of the ingest writer"""
+            return jsonify(self.writer.stats())
+
+        @app.route("/db/stats")
+        def get_db_stats():
+            """Read pool usage and per-query timings"""
+            return jsonify(self.read_pool.stats())
+
+        @app.route("/retention/stats")
+        def get_retention_stats():
+            """Archive size and horizon, database size and what the retention passes have done"""
+            return jsonify(self.retention.stats())
+
+        if self.config["ROLE"] == "worker":
+            return  # Write endpoints are served by the ingest process only, on its admin port
+
+        @app.route("/retention/run", methods=["POST"])
+        def run_retention():
+            """Run a retention pass now instead of waiting for the next one"""
+            return jsonify(self.retention.run_once())
+
+    @property
+    def fields(self):
+        return EXPORT_COLUMNS
+
+    def append(self, reading, ts_ms):
+        """Queue for the batched DB writer and keep in the recent tail"""
+        if not self.writer.submit({
+            "timestamp": reading["timestamp"], "ts_ms": ts_ms,
+            "co_in": reading["co_in"], "co_out": reading["co_out"], "efficiency": reading["efficiency"],
+            "voltage": reading["voltage"], "current": reading["current"], "power": reading["power"],
+            "anomaly": int(reading["anomaly"]), "device_id": reading["device_id"],
+            "predicted_efficiency": reading["predicted_efficiency"], "anomaly_score": reading["anomaly_score"]
+        }):
+            self.log.warning("db_full", "⚠️ Ingest queue (or spool) full, reading dropped.")
+        self.recent.append(reading)
+
+    def follow(self, reading):
+        """Keep a reading the ingest process is writing in the recent tail, without writing it again"""
+        self.recent.append(reading)
+
+    def latest(self, device=None):
+        latest = self.recent.latest(device)
+        if latest:
+            return latest
+
+        where, params = ("WHERE device_id = ?", (device,)) if device is not None else ("", ())
+        with self.read_pool.connection("data") as db:
+            row = db.execute(f"""
+                SELECT timestamp, co_in, co_out, efficiency, voltage, current, power, anomaly, device_id,
+                       predicted_efficiency, anomaly_score
+                FROM readings {where} ORDER BY ts_ms DESC LIMIT 1
+            """, params).fetchone()
+        if not row:
+            return None
+        return {
+            "timestamp": row[0],
+            "co_in": row[1],
+            "co_out": row[2],
+            "efficiency": row[3],
+            "predicted_efficiency": row[9] if row[9] is not None else row[3],  # Not scored before schema v4
+            "voltage": row[4],
+            "current": row[5],
+            "power": row[6],
+            "anomaly": bool(row[7]),
+            "anomaly_score": row[10] or 0,
+            "recommendation": "High CO levels detected" if row[7] else "System operating normally",
+            "device_id": row[8]
+        }
+
+    def last(self, n, device=None):
+        if self.recent.latest(device):
+            return self.recent.last(n, device)
+
+        where, params = ("WHERE device_id = ?", (device,)) if device is not None else ("", ())
+        with self.read_pool.connection("history") as db:
+            rows = db.execute(f"""
+                SELECT timestamp, co_in, co_out, efficiency, power
+                FROM readings
+                {where}
+                ORDER BY ts_ms DESC
+                LIMIT ?
+            """, params + (n,)).fetchall()
+        # Reverse to get chronological order
+        return [{"timestamp": r[0], "co_in": r[1], "co_out": r[2], "efficiency": r[3], "power": r[4]}
+                for r in reversed(rows)]
+
+    def history(self, from_ts, to_ts, device=None):
+        """Raw readings for short ranges, minute or hour averages for longer (or older) ones"""
+        from_ms, to_ms = _range_ms(from_ts, to_ts, 3600)
+        span = (to_ms - from_ms) / 1000
+        if span > self.config["HISTORY_MINUTE_SPAN"] or (
+                span > self.config["HISTORY_RAW_SPAN"] and from_ms < self.retention.minute_cutoff_ms()):
+            with self.read_pool.connection("history_hour_rollup") as db:
+                return hour_series(db, from_ms, to_ms, device)
+        if span > self.config["HISTORY_RAW_SPAN"]:
+            with self.read_pool.connection("history_rollup") as db:
+                return minute_series(db, from_ms, to_ms, device)
+        with self.read_pool.connection("history_range") as db:
+            return self.retention.column_arrays(db, HISTORY_COLUMNS, from_ms, to_ms, device)
+
+    def query(self, from_ts, to_ts, device, bucket_ms, metrics, aggregates):
+        from_ms, to_ms = _range_ms(from_ts, to_ts, 86400)
+        with self.read_pool.connection("query") as db:
+            if from_ms < self.retention.horizon(db):
+                # Archived days are no longer in SQLite; aggregate the whole range from column arrays instead
+                arrays = self.retention.column_arrays(db, ["timestamp"] + metrics, from_ms, to_ms, device)
+                return numpy_query(arrays, bucket_ms, metrics, aggregates)
+            return sql_query(db, from_ms, to_ms, bucket_ms, metrics, aggregates, device)
+
+    def daily(self, device=None):
+        today = datetime.now().strftime('%Y-%m-%d')
+        with self.read_pool.connection("stats_daily") as db:
+            return daily_stats(db, today, device)
+
+    def health(self, device=None):
+        return self.recent.health(device)
+
+    def export_arrays(self, columns, from_ts, to_ts, device=None):
+        from_ms, to_ms = _export_range(from_ts, to_ts)
+        with self.read_pool.connection("export") as db:
+            labels = {}
+            return self.retention.column_arrays(db, columns, from_ms, to_ms, device, labels), labels
+
+    def csv_chunks(self, columns, from_ts, to_ts, device=None):
+        from_ms, to_ms = _export_range(from_ts, to_ts)
+        # Holds one pooled connection for the whole stream; other handlers use the rest
+        with self.read_pool.connection("export_csv") as db:
+            yield from self.retention.csv_chunks(db, columns, from_ms, to_ms, device)
+
+    def rescore(self, engine, from_ts, to_ts, device=None):
+        """Re-run the detectors per device and persist the results through the writer"""
+        from_ms, to_ms = _export_range(from_ts, to_ts)
+        with self.read_pool.connection("rescore") as db:
+            from_ms = max(from_ms, self.retention.horizon(db))  # Archived readings keep their scores
+
+        if device is not None:
+            device_ids = [device]
+        else:
+            with self.read_pool.connection("rescore") as db:
+                device_ids = [row[0] for row in db.execute(
+                    "SELECT DISTINCT device_id FROM readings WHERE ts_ms >= ? AND ts_ms < ?", (from_ms, to_ms))]
+
+        rescored = {}
+        for device_id in device_ids:
+            with self.read_pool.connection("rescore") as db:
+                arrays = sqlite_column_arrays(db, ["rowid"] + SCORE_COLUMNS, from_ms, to_ms, device_id)
+            scores = engine.rescore(arrays)
+            # Writes go through the ingest writer's connection, between its batches
+            self.writer.call(
+                lambda w, device_id=device_id, rowids=arrays["rowid"], scores=scores:
+                    update_scores(w, device_id, from_ms, to_ms, rowids, scores)
+            ).result(timeout=self.config["RESCORE_TIMEOUT"])
+            rescored[device_id] = {"readings": len(arrays["rowid"]), "anomalies": int(scores["anomaly"].sum())}
+        return rescored
+
+    def stats(self):
+        return {"ingest": self.writer.stats(), "db": self.read_pool.stats(), "retention": self.retention.stats()}
+
+    def metric_families(self):
+        yield from stats_families("sensor_ingest", self.writer.stats(),
+                                  counters=("rows_written", "rows_dropped", "rows_failed", "flushes",
+                                            "flush_errors"),
+                                  gauges=("queue_depth", "pending_jobs"))
+        if self.spool is not None:
+            yield from stats_families("sensor_spool", self.spool.stats(), counters=("replayed", "dropped"),
+                                      gauges=("pending", "segments"))
+        yield from stats_families("sensor_read_pool", self.read_pool.stats(),
+                                  counters=("waits", "timeouts"), gauges=("open", "in_use"))
+        yield from stats_families("sensor_retention", self.retention.stats(),
+                                  counters=("runs", "errors", "rows_archived", "minute_rows_expired",
+                                            "pages_vacuumed"),
+                                  gauges=("archives", "archive_bytes", "db_bytes", "free_bytes"))
+
+
+class ColumnarStorage:
+    """Readings in a ColumnStore: memory-mapped column files per device and time chunk, under COLUMN_DIR.
+
+    Every read is a range read over the chunks it overlaps, so /history,
+    /stats/daily, /query and exports cost time in proportion to the readings
+    they cover rather than to everything stored. Writes are a few mapped
+    memory stores per reading on the caller's thread. Like SqliteStorage,
+    nothing touches the directory before open() and recent readings are also
+    kept in a MemoryStorage. Single-process: cluster workers need sqlite.
+    """
+
+    name = "columnar"
+
+    def __init__(self, config, on_change=None, timer=None, log=None):
+        if config["ROLE"] == "worker":
+            raise ValueError("Columnar storage can't be shared with cluster workers, use sqlite")
+        self.config = config
+        self.timer = timer
+        self.recent = MemoryStorage(config)
+        self.store = ColumnStore(config["COLUMN_DIR"], chunk_seconds=config["COLUMN_CHUNK_SECONDS"],
+                                 chunk_rows=config["COLUMN_CHUNK_ROWS"])
+        self._opened = False
+        self._open_lock = threading.Lock()
+
+    def open(self):
+        """Index the chunks on disk, once"""
+        if self._opened:
+            return
+        with self._open_lock:
+            if self._opened:
+                return
+            self.store.open()
+            stats = self.store.stats()["devices"]
+            print(f"🧱 Column store {self.store.directory}: {sum(d['readings'] for d in stats.values())} readings, "
+                  f"{sum(d['chunks'] for d in stats.values())} chunks")
+            self._opened = True
+
+    def start(self):
+        self.open()
+
+    def stop(self):
+        self.store.close()
+
+    def register(self, app):
+        @app.route("/columns/stats")
+        def get_column_stats():
+            """Chunks, readings and time span per device of the column store"""
+            return jsonify(self.store.stats())
+
+    @property
+    def fields(self):
+        return EXPORT_COLUMNS
+
+    def append(self, reading, ts_ms=None):
+        started = time.perf_counter()
+        self.store.append(reading)
+        if self.timer is not None:
+            self.timer("db_write", time.perf_counter() - started)
+        self.recent.append(reading)
+
+    def follow(self, reading):
+        self.recent.append(reading)
+
+    def latest(self, device=None):
+        latest = self.recent.latest(device)
+        if latest:
+            return latest
+        rows = []
+        for device_id in ([device] if device is not None else self.store.devices()):
+            arrays = self.store.tail(1, device_id)
+            if arrays and len(arrays["timestamp"]):
+                rows.append({**self._rows(arrays, list(arrays))[0], "device_id": device_id})
+        if not rows:
+            return None
+        row = max(rows, key=lambda r: r["timestamp"])
+        row["anomaly"] = bool(row["anomaly"])
+        row["recommendation"] = "High CO levels detected" if row["anomaly"] else "System operating normally"
+        return row
+
+    def last(self, n, device=None):
+        if self.recent.latest(device):
+            return self.recent.last(n, device)
+        arrays = self.store.tail(n, device)
+        return self._rows(arrays, HISTORY_COLUMNS) if arrays else []
+
+    @staticmethod
+    def _rows(arrays, columns):
+        values = {c: iso_timestamps(arrays[c]) if c == "timestamp" else arrays[c].tolist()
+                  for c in columns}
+        return [dict(zip(columns, row)) for row in zip(*values.values())]
+
+    def history(self, from_ts, to_ts, device=None):
+        from_ms, to_ms = _range_ms(from_ts, to_ts, 3600)
+        return self.store.arrays(HISTORY_COLUMNS, from_ms * 1000, to_ms * 1000, device)
+
+    def query(self, from_ts, to_ts, device, bucket_ms, metrics, aggregates):
+        from_ms, to_ms = _range_ms(from_ts, to_ts, 86400)
+        arrays = self.store.arrays(["timestamp"] + metrics, from_ms * 1000, to_ms * 1000, device)
+        return numpy_query(arrays, bucket_ms, metrics, aggregates)
+
+    def daily(self, device=None):
+        """Today's aggregates, reduced straight from views of today's chunks"""
+        midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        from_us = int(midnight.timestamp() * 1_000_000)
+        to_us = int((midnight + timedelta(days=1)).timestamp() * 1_000_000)
+        views = {c: [v for device_views in self.store.views(c, from_us, to_us, device).values()
+                     for v in device_views]
+                 for c in ("co_in", "efficiency", "power", "anomaly")}
+        count = sum(len(v) for v in views["co_in"])
+        if not count:
+            return {"count": 0, "max_co_in": 0, "avg_efficiency": 0, "total_power": 0, "anomaly_count": 0}
+        return {
+            "count": count,
+            "max_co_in": float(max(v.max() for v in views["co_in"] if len(v))),
+            "avg_efficiency": sum(float(v.sum(dtype="f8")) for v in views["efficiency"]) / count,
+            "total_power": sum(float(v.sum(dtype="f8")) for v in views["power"]),
+            "anomaly_count": sum(int(v.sum()) for v in views["anomaly"]),
+        }
+
+    def health(self, device=None):
+        return self.recent.health(device)
+
+    def export_arrays(self, columns, from_ts, to_ts, device=None):
+        from_ms, to_ms = _export_range(from_ts, to_ts)
+        labels = {}
+        return self.store.arrays(columns, from_ms * 1000, to_ms * 1000, device, labels), labels
+
+    def csv_chunks(self, columns, from_ts, to_ts, device=None, size=1000):
+        """One device after another, `size` readings at a time"""
+        from_ms, to_ms = _export_range(from_ts, to_ts)
+        for device_id in ([device] if device is not None else sorted(self.store.devices())):
+            arrays = self.store.arrays([c for c in columns if c != "device_id"] or ["timestamp"],
+                                       from_ms * 1000, to_ms * 1000, device_id)
+            for start in range(0, len(next(iter(arrays.values()))), size):
+                part = {c: values[start:start + size] for c, values in arrays.items()}
+                count = len(next(iter(part.values())))
+                yield list(zip(*([device_id] * count if c == "device_id" else
+                                 iso_timestamps(part[c]) if c == "timestamp" else part[c].tolist()
+                                 for c in columns)))
+
+    def rescore(self, engine, from_ts, to_ts, device=None):
+        """Re-run the detectors per device and write the scores back into the column files"""
+        from_ms, to_ms = _export_range(from_ts, to_ts)
+        rescored = {}
+        for device_id in ([device] if device is not None else self.store.devices()):
+            count, scores = self.store.rescore(device_id, from_ms * 1000, to_ms * 1000, SCORE_COLUMNS,
+                                               engine.rescore)
+            if count:
+                rescored[device_id] = {"readings": count, "anomalies": int(scores["anomaly"].sum())}
+        return rescored
+
+    def stats(self):
+        return self.store.stats()
+
+    def metric_families(self):
+        devices = self.store.stats()["devices"]
+        yield ("sensor_readings_stored", "gauge", "Readings in the column store",
+               [({"device_id": device_id}, s["readings"]) for device_id, s in devices.items()])
+        yield ("sensor_column_chunks", "gauge", "Chunks in the column store",
+               [({"device_id": device_id}, s["chunks"]) for device_id, s in devices.items()])
+
+
+STORAGES = {"sqlite": SqliteStorage, "memory": MemoryStorage, "columnar": ColumnarStorage}
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# The backend is a set of flat modules in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FRAME = b"$R,61.2,40.1,2.71,281.4,762.6\n"  # A valid CSV frame from the Pico
+
+
+@pytest.fixture
+def frame():
+    return FRAME
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    """Run every test in its own directory, so default paths (sensor_data.db, spool/...) never land in the repo"""
+    monkeypatch.chdir(tmp_path)
@@ -0,0 +1,39 @@
+import pytest
+
+from devices import Device
+from sensor_app import create_app
+
+
+@pytest.fixture
+def app_and_server():
+    app = create_app({"STORAGE": "memory", "DEVICES": [Device("a", source="simulated")]})
+    return app, app.extensions["sensor"]
+
+
+@pytest.mark.parametrize("message", ["pico-1", ["co_in"], 3])
+def test_subscribe_rejects_non_objects(app_and_server, message):
+    app, server = app_and_server
+    client = server.socketio.test_client(app)
+    assert "error" in client.emit("subscribe", message, callback=True)
+    assert client.is_connected()
+
+
+def test_subscribe_switches_room(app_and_server, frame):
+    app, server = app_and_server
+    client = server.socketio.test_client(app)
+    assert client.emit("subscribe", {"device": "a", "metrics": ["co_in"]}, callback=True) == {"room": "a|co_in"}
+    server.process_frame(server.devices[0], frame)
+    server.broadcaster.flush()
+    (event,) = client.get_received()
+    assert event["name"] == "sensor_frame"
+    (reading,) = event["args"][0]["readings"]
+    assert "co_in" in reading and "co_out" not in reading and "seq" in reading
+
+
+@pytest.mark.parametrize("metrics", ["co_in", 5, [1, 2], ["co_in", "speed"], {"co_in": True}])
+def test_subscribe_rejects_bad_metrics(app_and_server, metrics):
+    app, server = app_and_server
+    client = server.socketio.test_client(app)
+    response = client.emit("subscribe", {"metrics": metrics}, callback=True)
+    assert "metrics must be a list" in response["error"]
+    assert client.is_connected()
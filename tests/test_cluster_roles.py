@@ -0,0 +1,37 @@
+import pytest
+
+from sensor_app import create_app
+
+
+def sqlite_app(tmp_path, role):
+    return create_app({"STORAGE": "sqlite", "DB_PATH": str(tmp_path / "sensor.db"), "SPOOL_DIR": None,
+                       "ARCHIVE_DIR": str(tmp_path / "archive"), "DEVICES": [], "ROLE": role,
+                       "BUS_ADDRESS": str(tmp_path / "bus.sock")})
+
+
+@pytest.mark.parametrize("path", ["/retention/run", "/anomaly/rescore"])
+def test_workers_serve_no_write_endpoints(tmp_path, path):
+    app = sqlite_app(tmp_path, "worker")
+    assert app.test_client().post(path).status_code in (404, 405)
+
+
+def test_workers_start_no_writer(tmp_path):
+    sqlite_app(tmp_path, "ingest").extensions["sensor"].storage.open()  # The ingest process creates the schema
+    server = sqlite_app(tmp_path, "worker").extensions["sensor"]
+    server.start()
+    try:
+        assert server.storage.writer._thread is None
+        assert server.storage.retention._thread is None
+    finally:
+        server.stop()
+
+
+def test_ingest_serves_write_endpoints(tmp_path):
+    app = sqlite_app(tmp_path, "ingest")
+    server = app.extensions["sensor"]
+    server.storage.open()
+    server.storage.writer.start()
+    try:
+        assert app.test_client().post("/anomaly/rescore").status_code == 200
+    finally:
+        server.storage.writer.stop()
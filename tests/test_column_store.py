@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import column_store  # noqa: E402
+from column_store import ColumnStore, epoch_us, iso_timestamps, widen  # noqa: E402
+
+START = datetime(2026, 10, 18, 10, 59, 0)
+
+
+def reading(second, device_id="pico", anomaly=False):
+    return {"timestamp": (START + timedelta(seconds=second)).isoformat(), "device_id": device_id,
+            "co_in": 61.2 + second, "co_out": 40.1, "efficiency": 34.5, "voltage": 2.7, "current": 281.4,
+            "power": 762.6, "predicted_efficiency": 34.0, "anomaly_score": 0.1, "anomaly": anomaly}
+
+
+def us(second):
+    return epoch_us((START + timedelta(seconds=second)).isoformat())
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ColumnStore(str(tmp_path / "columns"), chunk_seconds=3600, chunk_rows=50)
+    store.open()
+    yield store
+    store.close()
+
+
+def fill(store, seconds, device_id="pico"):
+    for second in seconds:
+        store.append(reading(second, device_id, anomaly=second % 7 == 0))
+
+
+def test_range_reads_across_chunks(store):
+    fill(store, range(120))  # Crosses 11:00 and fills chunks of 50 readings
+    assert store.stats()["devices"]["pico"]["chunks"] == 4
+    arrays = store.arrays(["timestamp", "co_in", "anomaly"], us(30), us(100))
+    assert arrays["co_in"].tolist() == [61.2 + s for s in range(30, 100)]
+    assert arrays["anomaly"].tolist() == [int(s % 7 == 0) for s in range(30, 100)]
+    assert iso_timestamps(arrays["timestamp"][:1]) == [(START + timedelta(seconds=30)).isoformat()]
+
+
+def test_devices_merge_by_time(store):
+    fill(store, range(0, 20, 2), "a")
+    fill(store, range(1, 20, 2), "b")
+    assert store.arrays(["co_in"], us(0), us(20))["co_in"].tolist() == [61.2 + s for s in range(20)]
+    assert store.tail(3, "a")["co_in"].tolist() == [61.2 + s for s in (14, 16, 18)]
+
+
+def test_reopen_keeps_the_chunk_size_on_disk(tmp_path):
+    directory = str(tmp_path / "columns")
+    store = ColumnStore(directory, chunk_rows=50)
+    store.open()
+    fill(store, range(30))
+    store.close()
+
+    store = ColumnStore(directory, chunk_rows=80)  # Changed setting: only new chunks get 80
+    store.open()
+    fill(store, range(30, 60))
+    assert store.arrays(["co_in"], us(0), us(60))["co_in"].tolist() == [61.2 + s for s in range(60)]
+    capacities = sorted(c.capacity for c in store._partitions["pico"].chunks)
+    assert capacities[0] == 50 and capacities[-1] == 80
+    store.close()
+
+
+def test_sealed_chunks_are_mapped_once_and_bounded(tmp_path, monkeypatch):
+    store = ColumnStore(str(tmp_path / "columns"), chunk_rows=10, mapped_chunks=3)
+    store.open()
+    fill(store, range(100))
+    opened = []
+    memmap = column_store.np.memmap
+    monkeypatch.setattr(column_store.np, "memmap", lambda *a, **k: opened.append(a[0]) or memmap(*a, **k))
+
+    for _ in range(3):
+        store.arrays(["co_in"], us(0), us(30))
+    assert len(opened) == 3 * 2  # Timestamp and co_in of each of the 3 chunks, the first time only
+    store.arrays(["co_in"], us(50), us(80))
+    assert len(store._mapped) == 3
+    assert not store._partitions["pico"].chunks[0]._readers  # Least recently read, released
+    store.close()
+
+
+def test_rescore_writes_back(store):
+    fill(store, range(60))
+
+    def score(arrays):
+        return {"anomaly_score": arrays["co_in"] / 100, "anomaly": (arrays["co_in"] > 100).astype(np.int8)}
+
+    count, _ = store.rescore("pico", us(0), us(60), ["co_in"], score)
+    assert count == 60
+    arrays = store.arrays(["anomaly", "anomaly_score"], us(0), us(60))
+    assert arrays["anomaly"].tolist() == [int(61.2 + s > 100) for s in range(60)]
+    assert arrays["anomaly_score"][0] == pytest.approx(0.612)
+
+
+def test_widen_drops_float32_noise():
+    assert widen(np.array([61.2, 0.0, -3.3e-5], dtype=np.float32)).tolist() == [61.2, 0.0, -3.3e-5]
+
+
+def test_iso_timestamps_match_isoformat():
+    moments = [START, START + timedelta(microseconds=250), START + timedelta(seconds=1, milliseconds=5)]
+    seconds = [m.timestamp() for m in moments]
+    assert iso_timestamps(seconds) == [m.isoformat() for m in moments]
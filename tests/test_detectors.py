@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from detectors import AnomalyEngine, CusumDetector, EfficiencyForecaster, EwmaDetector, ZScoreDetector
+
+np = pytest.importorskip("numpy")
+
+
+def series(length=600, seed=7):
+    """Noisy readings around 90 with a spike at 200 and a level shift down from 400"""
+    rng = random.Random(seed)
+    x = [90.0 + rng.gauss(0, 1.5) for _ in range(length)]
+    x[200] += 40.0
+    for i in range(400, length):
+        x[i] -= 12.0
+    return x
+
+
+def streamed(detector, x):
+    return np.array([detector.update(v) for v in x])
+
+
+@pytest.mark.parametrize("params", [{}, {"alpha": 0.3, "threshold": 2.0, "warmup": 3}])
+def test_ewma_batch_matches_streaming(params):
+    x = series()
+    expected = streamed(EwmaDetector("co_in", **params), x)
+    assert EwmaDetector.batch(x, **params) == pytest.approx(expected, rel=1e-6, abs=1e-9)
+    assert expected[200] >= 1  # The spike is caught either way
+
+
+@pytest.mark.parametrize("params", [{}, {"window": 10, "threshold": 2.0}])
+def test_zscore_batch_matches_streaming(params):
+    x = series()
+    expected = streamed(ZScoreDetector("co_out", **params), x)
+    assert ZScoreDetector.batch(x, **params) == pytest.approx(expected, rel=1e-6, abs=1e-9)
+    assert expected[200] >= 1
+
+
+@pytest.mark.parametrize("params", [{}, {"direction": "up", "k": 0.2, "warmup": 5}])
+def test_cusum_batch_matches_streaming(params):
+    x = series()
+    expected = streamed(CusumDetector("efficiency", **params), x)
+    assert CusumDetector.batch(x, **params) == pytest.approx(expected, rel=1e-6, abs=1e-9)
+    if not params:
+        assert expected[399] < 1 <= expected[-1]  # The level shift down builds up to an alarm
+
+
+def test_forecaster_batch_matches_streaming():
+    x = series()
+    expected = streamed(EfficiencyForecaster(alpha=0.3, horizon=4), x)
+    assert EfficiencyForecaster(alpha=0.3, horizon=4).batch(x) == pytest.approx(expected, rel=1e-9)
+
+
+def test_engine_rescore_matches_score():
+    x = series()
+    arrays = {"co_in": np.array(x), "co_out": np.array(x) / 3, "efficiency": np.array(x)}
+    engine = AnomalyEngine()
+    scored = [engine.score({"co_in": a, "co_out": b, "efficiency": c})
+              for a, b, c in zip(*arrays.values())]
+    rescored = AnomalyEngine().rescore(arrays)
+    assert rescored["anomaly_score"] == pytest.approx([s["anomaly_score"] for s in scored], abs=1e-3)
+    assert rescored["predicted_efficiency"] == pytest.approx([s["predicted_efficiency"] for s in scored], abs=0.01)
+    assert rescored["anomaly"].sum() == sum(s["anomaly"] for s in scored)
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from devices import Device, ReplaySource, load_devices
+
+EXPORT = """timestamp,co_in,co_out,voltage,current,power,device_id
+2026-01-01T12:00:00,61.0,40.0,2.7,280.0,756.0,pico-1
+2026-01-01T12:00:01,1500.0,200.0,2.7,280.0,756.0,sim-bus-1
+2026-01-01T12:00:02,62.0,40.0,2.7,280.0,756.0,pico-1
+2026-01-01T12:00:03,3100.0,300.0,2.7,280.0,756.0,sim-bus-1
+"""
+
+
+def replayed(tmp_path, device_id, export=EXPORT):
+    path = tmp_path / "export.csv"
+    path.write_text(export)
+    lines = []
+    source = ReplaySource(Device(device_id, source="replay", path=str(path), speed=0), lines.append)
+    source.start()
+    source._thread.join(5)
+    return [json.loads(line)["CO_IN"] for line in lines], source.stats()
+
+
+def test_replay_keeps_only_its_own_device(tmp_path):
+    co_in, stats = replayed(tmp_path, "sim-bus-1")
+    assert co_in == [1500.0, 3100.0]
+    assert stats["replayed"] == 2 and stats["skipped"] == 2
+
+
+def test_replay_of_an_export_without_devices(tmp_path):
+    export = "\n".join(",".join(line.split(",")[:6]) for line in EXPORT.splitlines()) + "\n"
+    co_in, stats = replayed(tmp_path, "anything", export)
+    assert co_in == [61.0, 1500.0, 62.0, 3100.0]
+    assert stats["skipped"] == 0
+
+
+def test_registry_rejects_duplicates(tmp_path):
+    path = tmp_path / "devices.json"
+    path.write_text(json.dumps({"devices": [{"device_id": "a", "source": "simulated"},
+                                            {"device_id": "a", "source": "simulated"}]}))
+    with pytest.raises(ValueError, match="Duplicate"):
+        load_devices(str(path))
@@ -0,0 +1,79 @@
+import math
+import random
+from array import array
+
+import pytest
+
+import downsample
+from downsample import downsample_indices
+
+np = pytest.importorskip("numpy")
+
+
+def series(length, seed=1):
+    rng = random.Random(seed)
+    x = array("d", (1767268800 + i for i in range(length)))
+    y = array("d", (math.sin(i / 50) * 100 + rng.gauss(0, 5) for i in range(length)))
+    y[length // 3] = 500.0  # A spike downsampling has to keep
+    y[2 * length // 3] = -500.0
+    return x, y
+
+
+@pytest.mark.parametrize("mode", ["lttb", "minmax"])
+@pytest.mark.parametrize("points", [2, 3, 4, 5, 50, 299, 300])
+def test_keeps_endpoints_within_points(mode, points):
+    x, y = series(1000)
+    indices = list(downsample_indices(x, y, points, mode))
+    assert 2 <= len(indices) <= points
+    assert indices[0] == 0 and indices[-1] == 999
+    assert indices == sorted(set(indices))
+
+
+@pytest.mark.parametrize("mode", ["lttb", "minmax"])
+def test_keeps_the_extremes(mode):
+    x, y = series(1000)
+    indices = list(downsample_indices(x, y, 50, mode))
+    assert 333 in indices and 666 in indices
+
+
+def test_short_series_is_kept_whole():
+    x, y = series(10)
+    assert list(downsample_indices(x, y, 10)) == list(range(10))
+    assert list(downsample_indices(x, y, 300, "minmax")) == list(range(10))
+
+
+@pytest.mark.parametrize("points", [-1, 0, 1])
+def test_too_few_points(points):
+    x, y = series(100)
+    with pytest.raises(ValueError):
+        downsample_indices(x, y, points)
+
+
+@pytest.mark.parametrize("points", [2, 3, 7, 300, 999])
+def test_fallback_without_numpy(monkeypatch, points):
+    monkeypatch.setattr(downsample, "np", None)
+    x, y = series(1000)
+    indices = list(downsample_indices(x, y, points))
+    assert 2 <= len(indices) <= points
+    assert indices[0] == 0 and indices[-1] == 999
+    assert indices == sorted(set(indices))
+    with pytest.raises(ValueError):
+        downsample_indices(x, y, 0)
+
+
+def test_history_points_are_checked():
+    from devices import Device
+    from sensor_app import create_app
+
+    app = create_app({"STORAGE": "memory", "DEVICES": [Device("a", source="simulated")],
+                      "HISTORY_MAX_POINTS": 20})
+    server = app.extensions["sensor"]
+    for i in range(100):
+        server.storage.append({"timestamp": f"2026-01-01T12:00:{i // 10:02d}.{i % 10}00000", "device_id": "a",
+                               "co_in": float(i), "co_out": 1.0, "efficiency": 50.0, "power": 1.0, "anomaly": False})
+    client = app.test_client()
+    for points in ("0", "1", "-5", "many"):
+        assert client.get(f"/history?from=0&points={points}").status_code == 400
+    response = client.get("/history?from=0&points=1000000")
+    assert response.status_code == 200
+    assert 2 <= len(response.get_json()) <= 20
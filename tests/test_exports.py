@@ -0,0 +1,102 @@
+import csv
+import io
+
+import pytest
+
+from devices import Device
+from sensor_app import create_app
+
+
+def mock_app(**config):
+    """An app like mock_server.py's: one simulated device without a vehicle, in memory"""
+    return create_app({"STORAGE": "memory", "DEVICES": [Device("mock", source="simulated", profile="mock")],
+                       **config})
+
+
+@pytest.fixture
+def client(frame):
+    app = mock_app()
+    server = app.extensions["sensor"]
+    for _ in range(3):
+        assert server.process_frame(server.devices[0], frame)
+    return app.test_client()
+
+
+def test_mock_server_default_export(client):
+    assert client.get("/export").status_code == 200
+
+
+def test_parquet_export_of_vehicle_less_device(client):
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = client.get("/export?format=parquet&columns=timestamp,vehicle,device_id,co_in")
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.data))
+    assert table.num_rows == 3
+    assert table.column("device_id").to_pylist() == ["mock"] * 3
+    assert table.column("co_in").to_pylist() == [61.2] * 3
+
+
+def test_arrow_table_null_label():
+    pq = pytest.importorskip("pyarrow.parquet")
+    from array import array
+    from columnar_export import _arrow_table
+
+    table = _arrow_table({"vehicle": array("H", [0, 1, 0])}, {"vehicle": [None, "bus"]})
+    out = io.BytesIO()
+    pq.write_table(table, out)
+    assert pq.read_table(io.BytesIO(out.getvalue())).column("vehicle").to_pylist() == [None, "bus", None]
+
+
+def test_csv_export(client):
+    response = client.get("/export/csv?columns=timestamp,co_in,co_out,anomaly")
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == ["timestamp", "co_in", "co_out", "anomaly"]
+    assert len(rows) == 4
+    assert [float(r[1]) for r in rows[1:]] == [61.2] * 3
+
+
+def test_npz_export(client):
+    np = pytest.importorskip("numpy")
+    response = client.get("/export?format=npz&columns=timestamp,co_in,vehicle")
+    assert response.status_code == 200
+    with np.load(io.BytesIO(response.data)) as npz:
+        assert npz["co_in"].tolist() == [61.2] * 3
+        assert len(npz["timestamp_ms"]) == 3
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "columnar"])
+def test_csv_export_replays_per_device(tmp_path, frame, kind):
+    if kind == "columnar":
+        pytest.importorskip("numpy")
+    from simulator import read_export
+
+    app = create_app({"STORAGE": kind, "DB_PATH": str(tmp_path / "sensor.db"), "SPOOL_DIR": None,
+                      "COLUMN_DIR": str(tmp_path / "columns"),
+                      "DEVICES": [Device("pico-1", source="simulated", profile="pico"),
+                                  Device("sim-bus-1", vehicle="bus", source="simulated", profile="bus")]})
+    server = app.extensions["sensor"]
+    server.storage.start()
+    try:
+        for _ in range(2):
+            for device in server.devices:
+                assert server.process_frame(device, frame)
+        if kind == "sqlite":
+            server.storage.writer.call(lambda conn: None).result(timeout=10)  # Queued after the readings
+        response = app.test_client().get("/export/csv")
+        assert response.status_code == 200
+        (tmp_path / "export.csv").write_bytes(response.data)
+        replayed = [device_id for _, device_id, _ in read_export(str(tmp_path / "export.csv"))]
+        assert sorted(replayed) == ["pico-1", "pico-1", "sim-bus-1", "sim-bus-1"]
+
+        pytest.importorskip("numpy")
+        arrays, labels = server.storage.export_arrays(["timestamp", "device_id"], None, None)
+        assert sorted(labels["device_id"][code] for code in arrays["device_id"]) == sorted(replayed)
+    finally:
+        server.storage.stop()
+
+
+@pytest.mark.parametrize("value", ["inf", "-inf", "nan", "1e300", "yesterday"])
+@pytest.mark.parametrize("path", ["/export/csv", "/export", "/query", "/history"])
+def test_bad_range_is_a_client_error(client, path, value):
+    assert client.get(f"{path}?from={value}").status_code == 400
@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from frame_parser import ENCODERS, FrameParser, FrameSplitter
+
+READING = {"co_in": 61.25, "co_out": 40.5, "voltage": 2.75, "current": 281.5, "power": 762.5}
+
+
+@pytest.mark.parametrize("kind", sorted(ENCODERS))
+def test_every_encoding_parses(kind):
+    parser = FrameParser()
+    (frame,) = FrameSplitter().feed(ENCODERS[kind](READING))
+    assert parser.parse(frame) == (READING, None)
+    assert parser.stats()["parsed"][kind] == 1
+
+
+@pytest.mark.parametrize("frame, reason", [
+    (b"hello", "not_a_frame"),
+    (b"{not json", "bad_json"),
+    (b"[1, 2]", "not_a_frame"),
+    (b'{"CO_IN": 1, "CO_OUT": 1}', "missing_field"),
+    (b'{"CO_IN": "1", "CO_OUT": 1, "V_bus": 1, "current": 1, "power": 1}', "bad_type"),
+    (b'{"CO_IN": -5, "CO_OUT": 1, "V_bus": 1, "current": 1, "power": 1}', "out_of_range"),
+    (b"$R,1,2,3,4,5*00", "bad_checksum"),
+    (b"$R,1,2,3", "missing_field"),
+    (b"$R,1,x,3,4,5", "bad_type"),
+])
+def test_rejects_with_a_reason(frame, reason):
+    parser = FrameParser()
+    assert parser.parse(frame) == (None, reason)
+    assert parser.stats()["rejected"][reason] == 1
+
+
+def test_text_frames_resync_past_noise():
+    parser = FrameParser()
+    reading, error = parser.parse(b"\x00\xffgarbage" + ENCODERS["csv"](READING).strip())
+    assert error is None and reading == READING
+    assert parser.stats()["resynced"] == 1
+
+
+def test_splitter_resyncs_a_noisy_stream():
+    splitter = FrameSplitter()
+    binary = ENCODERS["binary"](READING)
+    corrupt = binary[:5] + bytes([binary[5] ^ 0xFF]) + binary[6:]
+    stream = b"\x01\x02" + binary + corrupt + ENCODERS["json"](READING) + binary
+    frames = []
+    for i in range(0, len(stream), 7):  # Frames split across reads
+        frames += splitter.feed(stream[i:i + 7])
+    parser = FrameParser()
+    assert [parser.parse(f)[0] for f in frames] == [READING] * 3
+    assert splitter.resync_bytes > 0
+
+
+def test_splitter_drops_oversized_lines():
+    splitter = FrameSplitter(max_frame=16)
+    assert splitter.feed(b"x" * 40 + b"\n" + b"$R,1,2,3,4,5\n") == [b"$R,1,2,3,4,5"]
+    assert splitter.oversized == 1
+
+
+def test_counters_are_exact_across_threads():
+    parser = FrameParser()
+    frames = [ENCODERS["csv"](READING).strip(), ENCODERS["json"](READING).strip(), b"noise"]
+
+    def parse():
+        for _ in range(5000):
+            for frame in frames:
+                parser.parse(frame)
+
+    threads = [threading.Thread(target=parse) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = parser.stats()
+    assert stats["parsed"]["csv"] == stats["parsed"]["json"] == stats["rejected"]["not_a_frame"] == 20000
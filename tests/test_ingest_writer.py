@@ -0,0 +1,102 @@
+import sqlite3
+
+from ingest_writer import IngestWriter
+
+
+def create(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE t (v INTEGER)")
+    conn.commit()
+    conn.close()
+
+
+def save(conn, rows):
+    conn.executemany("INSERT INTO t (v) VALUES (?)", [(r,) for r in rows])
+
+
+def count(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_call_resolves_after_commit(tmp_path):
+    db = str(tmp_path / "w.db")
+    create(db)
+    writer = IngestWriter(db, save, batch_ms=10)
+    writer.start()
+    try:
+        for i in range(20):
+            writer.call(lambda conn, i=i: conn.execute("INSERT INTO t (v) VALUES (?)", (i,))).result(timeout=5)
+            assert count(db) == i + 1  # Visible to another connection as soon as the future is resolved
+    finally:
+        writer.stop()
+
+
+def test_failed_job_sets_exception(tmp_path):
+    db = str(tmp_path / "w.db")
+    create(db)
+    writer = IngestWriter(db, save, batch_ms=10)
+    writer.start()
+    try:
+        future = writer.call(lambda conn: conn.execute("INSERT INTO missing VALUES (1)"))
+        assert isinstance(future.exception(timeout=5), sqlite3.OperationalError)
+        assert writer.call(lambda conn: 42).result(timeout=5) == 42
+    finally:
+        writer.stop()
+
+
+def test_writer_survives_non_sqlite_errors(tmp_path):
+    db = str(tmp_path / "w.db")
+    create(db)
+    flushed = []
+
+    def write_batch(conn, rows):
+        if "bad" in rows:
+            raise TypeError("not a reading")
+        save(conn, rows)
+
+    def on_flush(rows):
+        flushed.extend(rows)
+        raise RuntimeError("callback failed")
+
+    writer = IngestWriter(db, write_batch, batch_ms=10, on_flush=on_flush)
+    writer.start()
+    try:
+        writer.submit("bad")
+        writer.call(lambda conn: None).result(timeout=5)  # The batch before the job has been tried
+        writer.submit(1)
+        writer.submit(2)
+        writer.call(lambda conn: None).result(timeout=5)
+        assert writer._thread.is_alive()
+        assert count(db) == 2
+        assert flushed == [1, 2]
+        stats = writer.stats()
+        assert stats["flush_errors"] == 1 and stats["rows_failed"] == 1 and stats["rows_written"] == 2
+    finally:
+        writer.stop()
+
+
+def test_writer_survives_a_failed_read(tmp_path):
+    db = str(tmp_path / "w.db")
+    create(db)
+    writer = IngestWriter(db, save, batch_ms=10, retry_ms=10)
+    next_batch, failures = writer._next_batch, []
+
+    def flaky_next_batch():
+        if not failures:
+            failures.append(1)
+            raise UnicodeDecodeError("utf-8", b"\xc3", 0, 1, "unexpected end of data")
+        return next_batch()
+
+    writer._next_batch = flaky_next_batch
+    writer.start()
+    try:
+        writer.submit(1)
+        writer.call(lambda conn: None).result(timeout=5)
+        assert failures and writer._thread.is_alive()
+        assert count(db) == 1
+    finally:
+        writer.stop()
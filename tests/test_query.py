@@ -0,0 +1,108 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from range_query import numpy_query, parse_bucket, sql_query
+from sensor_app import create_app
+from sensor_db import init_db, save_readings
+
+np = pytest.importorskip("numpy")
+
+START_MS = 1767268800000  # A whole UTC day, so minute buckets start on it
+AGGREGATES = ["min", "max", "avg", "sum", "p95", "count"]
+
+
+def reading(i, device_id="pico"):
+    ts_ms = START_MS + i * 7000  # Every 7 s: minute buckets of 8 or 9 readings
+    return {"timestamp": datetime.fromtimestamp(ts_ms / 1000).isoformat(), "ts_ms": ts_ms,
+            "co_in": float((i * 37) % 101), "co_out": 40.0, "efficiency": 50.0 + i % 5, "voltage": 2.7,
+            "current": 280.0, "power": 760.0, "anomaly": int(i % 10 == 0), "device_id": device_id,
+            "predicted_efficiency": 50.0, "anomaly_score": 0.1}
+
+
+ROWS = [reading(i, device) for i in range(60) for device in ("pico", "bus")]
+
+
+@pytest.fixture
+def db(tmp_path):
+    conn = sqlite3.connect(tmp_path / "sensor.db")
+    init_db(conn)
+    with conn:
+        save_readings(conn, ROWS)
+    yield conn
+    conn.close()
+
+
+def test_parse_bucket():
+    assert parse_bucket("250ms") == 250
+    assert parse_bucket("15m") == 900_000
+    assert parse_bucket("1d") == 86_400_000
+    for bad in ("0m", "1w", "m", "1.5h"):
+        with pytest.raises(ValueError):
+            parse_bucket(bad)
+
+
+def test_sql_buckets(db):
+    result = sql_query(db, START_MS, START_MS + 3_600_000, 60_000, ["co_in"], AGGREGATES, "pico")
+    minutes = [r for r in ROWS if r["device_id"] == "pico"]
+    expected_ts = sorted({r["ts_ms"] // 60_000 * 60_000 for r in minutes})
+    assert result["ts_ms"] == expected_ts
+    assert sum(result["count"]) == 60
+    first = [r["co_in"] for r in minutes if r["ts_ms"] < START_MS + 60_000]
+    assert result["count"][0] == len(first) == 9
+    assert result["co_in"]["min"][0] == min(first)
+    assert result["co_in"]["max"][0] == max(first)
+    assert result["co_in"]["sum"][0] == sum(first)
+    assert result["co_in"]["p95"][0] == pytest.approx(np.percentile(first, 95))
+
+
+def test_numpy_matches_sql(db):
+    metrics = ["co_in", "efficiency", "anomaly"]
+    expected = sql_query(db, START_MS, START_MS + 3_600_000, 60_000, metrics, AGGREGATES)
+    ordered = sorted(ROWS, key=lambda r: r["ts_ms"])
+    arrays = {"timestamp": [r["ts_ms"] / 1000 for r in ordered], **{m: [r[m] for r in ordered] for m in metrics}}
+    result = numpy_query(arrays, 60_000, metrics, AGGREGATES)
+    assert result["ts_ms"] == expected["ts_ms"]
+    assert result["count"] == expected["count"]
+    for m in metrics:
+        for a in AGGREGATES[:-1]:
+            assert result[m][a] == pytest.approx(expected[m][a]), (m, a)
+
+
+def test_numpy_empty_range():
+    result = numpy_query({"timestamp": [], "co_in": []}, 1000, ["co_in"], ["avg", "count"])
+    assert result == {"bucket_ms": 1000, "ts_ms": [], "count": [], "co_in": {"avg": []}}
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "memory"])
+def test_query_endpoint(tmp_path, kind):
+    app = create_app({"STORAGE": kind, "DB_PATH": str(tmp_path / "sensor.db"), "SPOOL_DIR": None,
+                      "ARCHIVE_DIR": str(tmp_path / "archive"), "DEVICES": []})
+    storage = app.extensions["sensor"].storage
+    storage.open()
+    if kind == "sqlite":
+        storage.writer.start()
+        storage.writer.call(lambda conn: save_readings(conn, ROWS)).result(timeout=10)
+    else:
+        for r in sorted(ROWS, key=lambda r: r["ts_ms"]):
+            storage.append(r)
+    client = app.test_client()
+    try:
+        response = client.get(f"/query?from={START_MS / 1000}&to={START_MS / 1000 + 600}&bucket=5m"
+                              f"&metrics=co_in&agg=max,count&device=bus")
+        assert response.status_code == 200
+        result = response.get_json()
+        assert result["bucket_ms"] == 300_000
+        assert result["ts_ms"] == [START_MS, START_MS + 300_000]
+        assert result["count"] == [43, 17]
+        bus = ROWS[1::2]
+        assert result["co_in"]["max"] == [max(r["co_in"] for r in bus[:43]), max(r["co_in"] for r in bus[43:])]
+
+        assert client.get(f"/query?from={START_MS / 1000}&bucket=1x").status_code == 400
+        assert client.get(f"/query?from={START_MS / 1000}&metrics=vehicle").status_code == 400
+        # A 30-day range in 1 ms buckets is far more than MAX_BUCKETS
+        assert client.get(f"/query?from={START_MS / 1000 - 30 * 86400}&to={START_MS / 1000 + 600}"
+                          f"&bucket=1ms").status_code == 400
+    finally:
+        storage.stop()
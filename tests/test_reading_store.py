@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import reading_store
+from reading_store import DeviceStores, ReadingStore
+
+START = datetime(2026, 10, 18, 12)
+
+
+def reading(second, device_id, recommendation="ok", vehicle=None):
+    return {"timestamp": (START + timedelta(seconds=second)).isoformat(), "co_in": float(second), "co_out": 1.0,
+            "efficiency": 50.0, "anomaly": second % 3 == 0, "recommendation": recommendation,
+            "device_id": device_id, "vehicle": vehicle}
+
+
+@pytest.fixture
+def stores():
+    stores = DeviceStores(capacity=8)
+    for second in range(12):  # Ring buffers wrap: each device keeps its last 8
+        stores.append(reading(second, "a", "ok" if second % 2 else "check", "car"))
+        stores.append(reading(second + 0.5, "b", "check", None))
+    return stores
+
+
+def test_ring_buffer_keeps_the_newest_readings():
+    store = ReadingStore(capacity=4)
+    for second in range(10):
+        store.append(reading(second, "a"))
+    assert len(store) == 4 and store.total == 10
+    assert [r["co_in"] for r in store.rows()] == [6.0, 7.0, 8.0, 9.0]
+
+
+@pytest.mark.parametrize("with_numpy", [True, False])
+def test_merge_across_devices_in_time_order(stores, monkeypatch, with_numpy):
+    if not with_numpy:
+        monkeypatch.setattr(reading_store, "np", None)
+    fields = ["timestamp", "co_in", "anomaly", "recommendation", "device_id", "vehicle"]
+    arrays, labels = stores.column_arrays(fields)
+    assert list(arrays["timestamp"]) == sorted(arrays["timestamp"])
+    assert list(arrays["co_in"]) == [s + half for s in range(4, 12) for half in (0, 0.5)]
+    assert [labels["device_id"][c] for c in arrays["device_id"]] == ["a", "b"] * 8
+    assert [labels["vehicle"][c] for c in arrays["vehicle"]] == ["car", ""] * 8
+    assert [labels["recommendation"][c] for c in arrays["recommendation"]][:4] == ["check", "check", "ok", "check"]
+    assert list(arrays["anomaly"][:6]) == [0, 0, 0, 0, 1, 0]
+    assert {f: a.typecode for f, a in arrays.items()} == {"timestamp": "d", "co_in": "d", "anomaly": "b",
+                                                          "recommendation": "H", "device_id": "H", "vehicle": "H"}
+
+
+def test_merge_of_a_range_and_of_no_devices(stores):
+    from_ts = (START + timedelta(seconds=10)).timestamp()
+    arrays, _ = stores.column_arrays(["timestamp", "co_in"], from_ts=from_ts)
+    assert list(arrays["co_in"]) == [10.0, 10.5, 11.0, 11.5]
+    arrays, labels = DeviceStores().column_arrays(["timestamp", "device_id"])
+    assert len(arrays["timestamp"]) == 0 and labels == {"device_id": []}
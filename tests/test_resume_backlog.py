@@ -0,0 +1,92 @@
+import pytest
+
+from devices import Device
+from resume_backlog import ResumeBacklog
+from sensor_app import create_app
+
+START = 1_000_000
+
+
+def stamped(backlog, count, device="a"):
+    readings = [{"device_id": device, "timestamp": f"2026-01-01T12:00:{i:02d}"} for i in range(count)]
+    for r in readings:
+        backlog.stamp(r)
+    return readings
+
+
+def seqs(readings):
+    return [r["seq"] for r in readings]
+
+
+def test_stamp_numbers_per_device_from_the_start():
+    backlog = ResumeBacklog(start=START)
+    assert seqs(stamped(backlog, 3, "a")) == [START + 1, START + 2, START + 3]
+    assert seqs(stamped(backlog, 2, "b")) == [START + 1, START + 2]
+
+
+def test_since_at_and_past_the_floor():
+    backlog = ResumeBacklog(start=START)
+    stamped(backlog, 3)
+    assert seqs(backlog.since("a", START)) == [START + 1, START + 2, START + 3]  # Right at the floor
+    assert seqs(backlog.since("a", START + 2)) == [START + 3]
+    assert backlog.since("a", START - 1) is None  # From before this run
+
+
+def test_since_after_eviction():
+    backlog = ResumeBacklog(size=3, start=START)
+    stamped(backlog, 5)  # START + 1 and + 2 are evicted, the floor is START + 2
+    assert seqs(backlog.since("a", START + 2)) == [START + 3, START + 4, START + 5]
+    assert seqs(backlog.since("a", START + 3)) == [START + 4, START + 5]
+    assert backlog.since("a", START + 1) is None
+    assert backlog.stats()["devices"]["a"] == {"first_seq": START + 3, "last_seq": START + 5, "kept": 3}
+
+
+def test_since_beyond_the_last_reading_is_empty():
+    backlog = ResumeBacklog(start=START)
+    stamped(backlog, 2)
+    assert backlog.since("a", START + 2) == []
+    assert backlog.since("a", START + 50) == []
+    assert backlog.since("unknown", START) is None
+
+
+def test_follow_discards_the_backlog_on_a_gap():
+    backlog = ResumeBacklog()
+    for seq in (10, 11):
+        backlog.follow({"device_id": "a", "seq": seq, "timestamp": str(seq)})
+    assert seqs(backlog.since("a", 9)) == [10, 11]
+
+    backlog.follow({"device_id": "a", "seq": 13, "timestamp": "13"})  # 12 was never seen
+    assert backlog.since("a", 11) is None
+    assert seqs(backlog.since("a", 12)) == [13]
+    backlog.follow({"device_id": "a", "seq": 14, "timestamp": "14"})
+    assert seqs(backlog.since("a", 12)) == [13, 14]
+
+
+def test_resume_sorts_and_reports_missed_devices():
+    backlog = ResumeBacklog(size=2, start=START)
+    a, b = stamped(backlog, 2, "a"), stamped(backlog, 4, "b")
+    readings, missed = backlog.resume({"a": START, "b": START, "c": START, "d": "not a number"})
+    assert readings == a
+    assert missed == ["b", "c", "d"]
+    stats = backlog.stats()
+    assert stats["missed"] == 2 and stats["resumed"] == 1 and stats["replayed"] == 2
+    assert backlog.resume({"b": START + 2})[0] == b[2:]
+
+
+@pytest.fixture
+def client(frame):
+    app = create_app({"STORAGE": "memory", "DEVICES": [Device("a", source="simulated")], "RESUME_BACKLOG": 3})
+    server = app.extensions["sensor"]
+    for _ in range(5):
+        assert server.process_frame(server.devices[0], frame)
+    return app.test_client(), server.backlog.stats()["devices"]["a"]
+
+
+def test_history_since_seq(client):
+    client, kept = client
+    response = client.get(f"/history?device=a&since_seq={kept['last_seq'] - 1}")
+    assert response.status_code == 200
+    assert [r["seq"] for r in response.get_json()] == [kept["last_seq"]]
+    assert client.get(f"/history?device=a&since_seq={kept['first_seq'] - 2}").status_code == 410
+    assert client.get(f"/history?since_seq={kept['last_seq']}").status_code == 400  # No device
+    assert client.get("/history?device=a&since_seq=latest").status_code == 400
@@ -0,0 +1,103 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import retention
+from retention import day_bounds
+from sensor_app import create_app
+from sensor_db import save_readings
+
+pytest.importorskip("numpy")
+
+
+def reading(day, second, device_id="pico"):
+    ts = datetime.combine(day, datetime.min.time()) + timedelta(hours=12, seconds=second)
+    return {"timestamp": ts.isoformat(), "ts_ms": int(ts.timestamp() * 1000), "co_in": 60.0 + second,
+            "co_out": 40.0, "efficiency": 33.3, "voltage": 2.7, "current": 280.0, "power": 760.0, "anomaly": 0,
+            "device_id": device_id, "predicted_efficiency": 33.0, "anomaly_score": 0.1}
+
+
+@pytest.fixture
+def storage(tmp_path):
+    app = create_app({"STORAGE": "sqlite", "DB_PATH": str(tmp_path / "sensor.db"), "SPOOL_DIR": None,
+                      "ARCHIVE_DIR": str(tmp_path / "archive"), "RAW_RETENTION_DAYS": 2, "DEVICES": []})
+    storage = app.extensions["sensor"].storage
+    storage.open()
+    storage.writer.start()  # Not start(): no background retention pass racing the test's own
+    yield storage
+    storage.stop()
+
+
+def insert(storage, rows):
+    storage.writer.call(lambda conn: save_readings(conn, rows)).result(timeout=10)
+
+
+def archived_rows(storage, day):
+    with storage.read_pool.connection("test") as db:
+        (file,) = db.execute("SELECT file FROM archives WHERE day = ?", (day.isoformat(),)).fetchone()
+    return storage.retention.archive.load(file)
+
+
+def raw_count(storage):
+    with storage.read_pool.connection("test") as db:
+        return db.execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+
+
+def test_archives_expired_days_and_reads_across_the_horizon(storage):
+    old, recent = date.today() - timedelta(days=5), date.today()
+    insert(storage, [reading(old, s, device) for s in range(10) for device in ("pico", "bus")])
+    insert(storage, [reading(recent, s) for s in range(3)])
+
+    result = storage.retention.run_once()
+    assert result["rows_archived"] == 20
+    assert raw_count(storage) == 3
+    table = archived_rows(storage, old)
+    assert len(table["ts_ms"]) == 20
+    assert sorted(set(table["device_id"].tolist())) == ["bus", "pico"]
+
+    from_ms, to_ms = day_bounds(old)[0], day_bounds(recent)[1]
+    with storage.read_pool.connection("test") as db:
+        arrays = storage.retention.column_arrays(db, ["timestamp", "co_in"], from_ms, to_ms, "pico")
+    assert len(arrays["co_in"]) == 13
+    assert list(arrays["timestamp"]) == sorted(arrays["timestamp"])
+
+
+def test_late_readings_join_the_archived_day(storage):
+    old = date.today() - timedelta(days=5)
+    insert(storage, [reading(old, s) for s in range(5)])
+    storage.retention.run_once()
+    insert(storage, [reading(old, s) for s in range(5, 8)])
+
+    assert storage.retention.run_once()["rows_archived"] == 3
+    assert archived_rows(storage, old)["co_in"].tolist() == [60.0 + s for s in range(8)]
+
+
+def test_interrupted_pass_does_not_duplicate_archived_rows(storage, monkeypatch):
+    old = date.today() - timedelta(days=5)
+    insert(storage, [reading(old, s) for s in range(5)])
+
+    # The file is written and catalogued, then deleting the archived rows fails
+    monkeypatch.setattr(retention, "DELETE_READINGS", "DELETE FROM no_such_table WHERE ? AND ? AND ?")
+    with pytest.raises(Exception):
+        storage.retention.run_once()
+    assert len(archived_rows(storage, old)["ts_ms"]) == 5
+    assert raw_count(storage) == 5
+    monkeypatch.undo()
+
+    assert storage.retention.run_once()["rows_archived"] == 0
+    assert raw_count(storage) == 0
+    table = archived_rows(storage, old)
+    assert table["co_in"].tolist() == [60.0 + s for s in range(5)]
+
+
+
+def test_export_labels_devices_across_the_horizon(storage):
+    old, recent = date.today() - timedelta(days=5), date.today()
+    insert(storage, [reading(old, s, device) for s in range(2) for device in ("pico", "bus")])
+    insert(storage, [reading(recent, s, device) for s in range(2) for device in ("bus", "car")])
+    storage.retention.run_once()
+
+    arrays, labels = storage.export_arrays(["timestamp", "device_id"], day_bounds(old)[0] / 1000, None)
+    devices = [labels["device_id"][code] for code in arrays["device_id"]]
+    assert sorted(devices) == ["bus", "bus", "bus", "bus", "car", "car", "pico", "pico"]
+    assert sorted(set(labels["device_id"])) == ["bus", "car", "pico"]  # One code per device, archive or not
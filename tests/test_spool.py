@@ -0,0 +1,145 @@
+import os
+import time
+import zlib
+
+import pytest
+
+from sensor_app import create_app
+from spool import RECORD, Spool
+
+
+def row(i, device_id="pico"):
+    return {"timestamp": f"2026-01-01T12:00:{i:02d}", "ts_ms": 1767268800000 + i * 1000, "co_in": 60.0 + i,
+            "co_out": 40.0, "efficiency": 33.3, "voltage": 2.7, "current": 280.0, "power": 760.0, "anomaly": 0,
+            "device_id": device_id, "predicted_efficiency": 33.0, "anomaly_score": 0.1}
+
+
+def spooled(directory, rows, committed=0, **kwargs):
+    """A spool holding `rows` after `committed`, closed as if the process died before the writer got to them"""
+    spool = Spool(str(directory), **kwargs)
+    spool.open(committed)
+    for r in rows:
+        assert spool.append(r)
+    spool.close()
+
+
+def test_uncommitted_records_are_replayed_after_a_crash(tmp_path):
+    spooled(tmp_path, [row(i) for i in range(5)])
+
+    spool = Spool(str(tmp_path))
+    spool.open(0)
+    assert spool.replayed == 5
+    rows, end = spool.read(100)
+    assert end == 5
+    assert rows == [row(i) for i in range(5)]
+    assert spool.append(row(5))  # New readings go after the replayed ones
+    assert spool.read(100)[0][-1] == row(5)
+    spool.close()
+
+
+def test_committed_records_are_not_replayed(tmp_path):
+    spooled(tmp_path, [row(i) for i in range(5)])
+
+    spool = Spool(str(tmp_path))
+    spool.open(3)
+    assert spool.replayed == 2
+    assert spool.read(100) == ([row(3), row(4)], 5)
+    spool.close()
+
+
+def test_a_torn_record_ends_the_spool(tmp_path):
+    spooled(tmp_path, [row(i) for i in range(5)])
+    (segment,) = os.listdir(tmp_path)
+    with open(tmp_path / segment, "r+b") as f:
+        f.seek(2 * RECORD.size + 10)  # A crash in the middle of writing the third record
+        f.write(b"\xff")
+
+    spool = Spool(str(tmp_path))
+    spool.open(0)
+    assert spool.replayed == 2
+    assert spool.read(100) == ([row(0), row(1)], 2)
+    spool.close()
+
+
+def test_commit_deletes_finished_segments(tmp_path):
+    spool = Spool(str(tmp_path), segment_records=4)
+    spool.open(0)
+    for i in range(10):
+        assert spool.append(row(i))
+    assert len(os.listdir(tmp_path)) == 3
+
+    spool.commit(8)
+    assert sorted(os.listdir(tmp_path)) == ["spool-0000000002.seg"]
+    assert spool.read(100) == ([row(8), row(9)], 10)
+    spool.close()
+
+
+def test_full_spool_drops_readings(tmp_path):
+    spool = Spool(str(tmp_path), segment_records=2, max_segments=1)
+    spool.open(0)
+    assert spool.append(row(0)) and spool.append(row(1))
+    assert not spool.append(row(2))
+    assert spool.stats()["dropped"] == 1
+    spool.close()
+
+
+def test_writer_saves_spooled_readings_on_start(tmp_path):
+    spool_dir = tmp_path / "spool"
+    spooled(spool_dir, [row(i, device) for i in range(3) for device in ("pico", "bus")])
+
+    app = create_app({"STORAGE": "sqlite", "DB_PATH": str(tmp_path / "sensor.db"), "SPOOL_DIR": str(spool_dir),
+                      "ARCHIVE_DIR": str(tmp_path / "archive"), "DEVICES": []})
+    storage = app.extensions["sensor"].storage
+    storage.open()
+    storage.writer.start()
+    try:
+        deadline = time.monotonic() + 10
+        while storage.spool.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with storage.read_pool.connection("test") as db:
+            saved = db.execute("SELECT device_id, co_in FROM readings ORDER BY device_id, ts_ms").fetchall()
+            position = db.execute("SELECT committed FROM spool_position").fetchone()[0]
+    finally:
+        storage.stop()
+    assert saved == [("bus", 60.0), ("bus", 61.0), ("bus", 62.0), ("pico", 60.0), ("pico", 61.0), ("pico", 62.0)]
+    assert position == 6
+
+
+def test_over_long_values_are_dropped_not_cut(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.open(0)
+    assert not spool.append(row(0, "x" * 70))
+    assert not spool.append({**row(1), "timestamp": "2026-01-01T12:00:01.000000+00:00[Europe/Berlin]"})
+    assert spool.append(row(2, "é" * 32))  # 64 bytes: fits exactly
+    assert spool.stats()["dropped"] == 2
+    assert spool.read(100) == ([row(2, "é" * 32)], 1)
+    spool.close()
+
+
+def test_undecodable_record_is_skipped(tmp_path):
+    spooled(tmp_path, [row(0), row(1, "a" + "é" * 31), row(2)])
+    # A record from before over-long ids were rejected: intact, but cut inside a multibyte character
+    (segment,) = os.listdir(tmp_path)
+    with open(tmp_path / segment, "r+b") as f:
+        f.seek(RECORD.size)
+        data = bytearray(f.read(RECORD.size))
+        data[RECORD.size - 5] = 0xc3  # The last device_id byte: half of an "é"
+        data[-4:] = zlib.crc32(bytes(data[:-4])).to_bytes(4, "little")
+        f.seek(RECORD.size)
+        f.write(data)
+
+    spool = Spool(str(tmp_path))
+    spool.open(0)
+    assert spool.replayed == 3
+    assert spool.read(100) == ([row(0), row(2)], 3)
+    spool.close()
+
+
+def test_device_ids_must_fit_a_spool_record():
+    from devices import Device
+
+    with pytest.raises(ValueError):
+        Device("x" * 65, source="simulated")
+    with pytest.raises(ValueError):
+        Device("a" + "é" * 32, source="simulated")
+    assert Device("é" * 32, source="simulated").device_id == "é" * 32
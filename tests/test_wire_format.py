@@ -0,0 +1,94 @@
+import json
+import math
+import os
+import shutil
+import subprocess
+from datetime import datetime
+
+import pytest
+
+from wire_format import decode_readings, encode_readings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TS_DECODER = os.path.join(ROOT, "src", "lib", "wireFormat.ts")
+
+READINGS = [
+    {"timestamp": "2026-03-29T01:59:59.250000", "co_in": 61.25, "co_out": 40.5, "efficiency": 33.875,
+     "predicted_efficiency": 34.0, "voltage": 2.75, "current": 281.5, "power": 762.5, "anomaly_score": 0.125,
+     "anomaly": True, "recommendation": "High CO levels detected", "device_id": "pico-1", "vehicle": "car",
+     "seq": 1_792_000_000_000_001},
+    {"timestamp": "2026-10-18T14:00:00", "co_in": 10.0, "anomaly": False, "device_id": "pico-2", "seq": 7},
+    {"timestamp": "2026-10-18T23:59:59.999000", "co_in": 12.5, "co_out": 6.25, "anomaly": False,
+     "device_id": "pico-1", "recommendation": "System operating normally"},
+]
+
+
+def test_round_trip():
+    decoded = decode_readings(encode_readings(READINGS))
+    assert decoded[0] == READINGS[0]
+    assert decoded[1] == READINGS[1]
+    assert "seq" not in decoded[2] and "vehicle" not in decoded[2]
+    assert decoded[2]["timestamp"] == READINGS[2]["timestamp"]
+
+
+def test_without_seqs_records_stay_short():
+    rows = [{k: v for k, v in r.items() if k != "seq"} for r in READINGS]
+    assert len(encode_readings(READINGS)) - len(encode_readings(rows)) == 8 * len(READINGS)
+    assert all("seq" not in r for r in decode_readings(encode_readings(rows)))
+
+
+def test_missing_numeric_fields_are_nan_on_the_wire():
+    (row,) = decode_readings(encode_readings([{"timestamp": 0.5, "co_in": math.nan, "anomaly": False}]))
+    assert row == {"timestamp": datetime.fromtimestamp(0.5).isoformat(), "anomaly": False}
+
+
+def test_rejects_other_versions():
+    payload = bytearray(encode_readings(READINGS))
+    payload[2] = 1
+    with pytest.raises(ValueError):
+        decode_readings(bytes(payload))
+
+
+def _node_decoder(tmp_path):
+    """Command that decodes stdin with the TypeScript decoder and prints JSON, or None without a way to run it"""
+    node = shutil.which("node")
+    if node is None:
+        return None
+    typescript = os.path.join(ROOT, "node_modules", "typescript")
+    if os.path.isdir(typescript):  # After npm install
+        options = []
+        load = f"""
+            const ts = require({json.dumps(typescript)});
+            const source = fs.readFileSync({json.dumps(TS_DECODER)}, "utf8");
+            const options = {{module: ts.ModuleKind.CommonJS, target: ts.ScriptTarget.ES2020}};
+            const module = {{exports: {{}}}};
+            new Function("module", "exports", ts.transpileModule(source, {{compilerOptions: options}}).outputText)(
+                module, module.exports);
+            return module.exports;
+        """
+    else:
+        version = subprocess.check_output([node, "--version"], text=True).strip().lstrip("v")
+        if tuple(int(part) for part in version.split(".")[:2]) < (22, 6):
+            return None
+        options = ["--experimental-strip-types", "--no-warnings"]
+        load = f"return import({json.dumps('file://' + TS_DECODER)});"
+    driver = tmp_path / "decode.cjs"
+    driver.write_text(f"""
+        const fs = require("fs");
+        const load = async () => {{ {load} }};
+        load().then(({{decodeReadings}}) => {{
+            const payload = fs.readFileSync(0);
+            const buffer = payload.buffer.slice(payload.byteOffset, payload.byteOffset + payload.length);
+            process.stdout.write(JSON.stringify(decodeReadings(buffer)));
+        }});
+    """)
+    return [node, *options, str(driver)]
+
+
+def test_typescript_decoder_matches_python(tmp_path):
+    command = _node_decoder(tmp_path)
+    if command is None:
+        pytest.skip("needs node with typescript installed (npm install) or node >= 22.6")
+    payload = encode_readings(READINGS)
+    decoded = json.loads(subprocess.run(command, input=payload, capture_output=True, check=True).stdout)
+    assert decoded == decode_readings(payload)
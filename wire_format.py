@@ -0,0 +1,133 @@
+import math
+import struct
+from datetime import datetime
+from operator import itemgetter
+
+from flask import Response, jsonify, request
+
+# Compact binary encoding of reading lists, for live frames and /history.
+#
+#   header   <2sBBI   magic b"SR", version, flags (bit 0 = records carry a seq), reading count
+#   tables   for each of LABEL_FIELDS: <H count, then count x (<H byte length + UTF-8 text)
+#   records  <q8fBHHH epoch-ms timestamp, NUMERIC_FIELDS as float32, flag bits (bit 0 = anomaly),
+#            then one label-table code per LABEL_FIELDS entry (MISSING if the reading has none),
+#            then with the seq flag a <q per-device sequence number (-1 if the reading has none)
+#
+# Numeric fields a reading doesn't carry (e.g. trimmed by a metrics subscription) are NaN.
+# A reading is 47 bytes (55 with a seq) instead of roughly 250 as JSON. Version 2 added anomaly_score.
+
+MIMETYPE = "application/x-sensor-readings"
+MAGIC = b"SR"
+VERSION = 2
+NUMERIC_FIELDS = ("co_in", "co_out", "efficiency", "predicted_efficiency", "voltage", "current", "power",
+                  "anomaly_score")
+LABEL_FIELDS = ("recommendation", "device_id", "vehicle")
+MISSING = 0xFFFF
+ANOMALY = 0x01
+HAS_SEQ = 0x01
+
+HEADER = struct.Struct("<2sBBI")
+RECORD = struct.Struct("<q%dfB%dH" % (len(NUMERIC_FIELDS), len(LABEL_FIELDS)))
+SEQ = struct.Struct("<q")
+_LENGTH = struct.Struct("<H")
+
+
+def _epoch_ms(ts):
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts).timestamp()
+    return int(round(ts * 1000))
+
+
+def encode_readings(rows):
+    """Pack a list of reading dicts into the binary layout above"""
+    tables = {field: {} for field in LABEL_FIELDS}
+    labelled = [(field, tables[field]) for field in LABEL_FIELDS]
+    numeric = itemgetter(*NUMERIC_FIELDS)
+    flags = HAS_SEQ if any("seq" in row for row in rows) else 0
+    size = RECORD.size + (SEQ.size if flags & HAS_SEQ else 0)
+    records = bytearray(size * len(rows))
+    pack_into = RECORD.pack_into
+    for i, row in enumerate(rows):
+        try:
+            values = numeric(row)
+        except KeyError:
+            values = [row.get(field) for field in NUMERIC_FIELDS]
+            values = [math.nan if v is None else v for v in values]
+        codes = []
+        for field, table in labelled:
+            value = row.get(field)
+            if value is None:
+                codes.append(MISSING)
+            else:
+                code = table.get(value)
+                if code is None:
+                    code = table[value] = len(table)
+                codes.append(code)
+        pack_into(records, i * size, _epoch_ms(row["timestamp"]), *values,
+                  ANOMALY if row.get("anomaly") else 0, *codes)
+        if flags & HAS_SEQ:
+            SEQ.pack_into(records, i * size + RECORD.size, row.get("seq", -1))
+
+    out = bytearray(HEADER.pack(MAGIC, VERSION, flags, len(rows)))
+    for field in LABEL_FIELDS:
+        table = tables[field]
+        if len(table) >= MISSING:
+            raise ValueError(f"Too many distinct {field} values for the binary format")
+        out += _LENGTH.pack(len(table))
+        for text in table:
+            encoded = text.encode("utf-8")
+            out += _LENGTH.pack(len(encoded)) + encoded
+    out += records
+    return bytes(out)
+
+
+def decode_readings(payload):
+    """Inverse of encode_readings(); timestamps come back as local ISO strings"""
+    magic, version, flags, count = HEADER.unpack_from(payload, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} sensor readings payload")
+    offset = HEADER.size
+    tables = {}
+    for field in LABEL_FIELDS:
+        (n,) = _LENGTH.unpack_from(payload, offset)
+        offset += _LENGTH.size
+        table = []
+        for _ in range(n):
+            (length,) = _LENGTH.unpack_from(payload, offset)
+            offset += _LENGTH.size
+            table.append(bytes(payload[offset:offset + length]).decode("utf-8"))
+            offset += length
+        tables[field] = table
+
+    size = RECORD.size + (SEQ.size if flags & HAS_SEQ else 0)
+    rows = []
+    for i in range(count):
+        record = RECORD.unpack_from(payload, offset + i * size)
+        row = {"timestamp": datetime.fromtimestamp(record[0] / 1000).isoformat()}
+        for field, value in zip(NUMERIC_FIELDS, record[1:]):
+            if not math.isnan(value):
+                row[field] = value
+        row["anomaly"] = bool(record[1 + len(NUMERIC_FIELDS)] & ANOMALY)
+        for field, code in zip(LABEL_FIELDS, record[2 + len(NUMERIC_FIELDS):]):
+            if code != MISSING:
+                row[field] = tables[field][code]
+        if flags & HAS_SEQ:
+            (seq,) = SEQ.unpack_from(payload, offset + i * size + RECORD.size)
+            if seq >= 0:
+                row["seq"] = seq
+        rows.append(row)
+    return rows
+
+
+def wants_binary():
+    """True if the current request opted into the binary format (?wire=binary or an Accept header)"""
+    if request.args.get("wire") == "binary":
+        return True
+    return request.accept_mimetypes.best_match(["application/json", MIMETYPE]) == MIMETYPE
+
+
+def readings_response(rows):
+    """A list of readings as JSON, or binary when the client asked for it"""
+    if wants_binary():
+        return Response(encode_readings(rows), mimetype=MIMETYPE)
+    return jsonify(rows)